@@ -1,14 +1,15 @@
-from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
 
+from mongo_client import get_client
+
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB = os.getenv("MONGO_DB")
 MONGO_COLL = os.getenv("MONGO_COLL")
 
-client = MongoClient(MONGO_URI)
+client = get_client(MONGO_URI)
 db = client[MONGO_DB]
 coll = db[MONGO_COLL]
 
@@ -46,3 +47,23 @@ def fetch_by_ids(ids):
     Fetch documents by MongoDB ObjectIds (from FAISS results).
     """
     return list(coll.find({"_id": {"$in": ids}}))
+
+def iter_materials(query=None, projection=None, batch_size=1000):
+    """
+    Stream documents from a server-side cursor, batch_size documents per round trip.
+    """
+    return coll.find(query or {}, projection).batch_size(batch_size)
+
+def fetch_updated_since(watermark=None, projection=None, batch_size=1000):
+    """
+    Stream documents whose audit.updated_at is at or after the watermark,
+    oldest first. Boundary documents are re-read; upserting them is idempotent.
+    """
+    query = {"audit.updated_at": {"$gte": watermark}} if watermark else {}
+    return iter_materials(query, projection, batch_size).sort("audit.updated_at", 1)
+
+def fetch_all_ids():
+    """
+    Fetch every document _id (index-only projection), for pruning deleted materials.
+    """
+    return [d["_id"] for d in coll.find({}, {"_id": 1})]
@@ -1,5 +1,4 @@
 import os
-import pandas as pd
 import numpy as np
 import faiss
 import openai
@@ -7,47 +6,79 @@ import streamlit as st
 from dotenv import load_dotenv
 
 from embeddings.embedder import get_embedding
-from filters import filter_by_exact_fields
+from live_index import LiveIndex
+from search import materialize_hits
+from query_cache import QueryCache
+from metrics import METRICS, span
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
 @st.cache_resource(show_spinner=False)
-def load_index_and_metadata():
-    df = pd.read_pickle("materials_metadata.pkl")
-    index = faiss.read_index("faiss_index.bin")
-    return index, df
+def get_live_index():
+    # Memory-mapped, so this returns in well under a second; the watcher
+    # thread swaps in each new build's snapshot as it is published.
+    return LiveIndex().start()
 
-index, df = load_index_and_metadata()
+@st.cache_resource(show_spinner=False)
+def get_query_cache():
+    return QueryCache()
+
+# One snapshot for the whole script run, so rows always refer to its store.
+snapshot = get_live_index().current
+searcher, store = snapshot.searcher, snapshot.store
+query_cache = get_query_cache()
+query_cache.bind(snapshot.version, snapshot.embed_model)
 
 st.set_page_config(page_title="Material Bot", layout="wide")
 st.title("🎯 Smart Material Selector")
 
+# Sidebar facets, with counts from the precomputed facet index.
+FACETS = {
+    "family_name": "Color family",
+    "finish": "Finish",
+    "segment_types": "Segments",
+    "tags": "Tags",
+    "material_brand_name": "Brand",
+}
+# Demo defaults: require "Neutral Gray" and finish="Flat".
+FACET_DEFAULTS = {"family_name": ["Neutral Gray"], "finish": ["Flat"]}
+
+fidx = searcher.filter_index
+selected = {f: st.session_state.get(f"facet_{f}", FACET_DEFAULTS.get(f, [])) for f in FACETS}
+counts = fidx.facet_counts({f: v for f, v in selected.items() if v}, list(FACETS))
+st.sidebar.header("Filters")
+for field, label in FACETS.items():
+    if field not in counts:
+        continue
+    # A stable option list keeps the widget's selection across reruns; counts go in the labels.
+    options = sorted((v for v in counts[field] if v != ""), key=str)
+    st.sidebar.multiselect(label, options, default=[v for v in selected[field] if v in counts[field]],
+                           format_func=lambda v, f=field: f"{v} ({counts[f].get(v, 0)})", key=f"facet_{field}")
+strict_filters = {f: st.session_state[f"facet_{f}"] for f in FACETS if st.session_state.get(f"facet_{f}")}
+st.sidebar.caption(f"{fidx.count(strict_filters)} of {fidx.num_rows} materials match.")
+
 user_query = st.text_input("Search your material by description:", "Find cool gray paint for wood siding")
 
 if user_query:
     with st.spinner("Embedding and searching..."):
-        q_vec = get_embedding(user_query)[None, :]
-        faiss.normalize_L2(q_vec)
-        D, I = index.search(q_vec, 20)
-
-        results = []
-        for idx in I[0]:
-            row = df.iloc[idx].to_dict()
-            row["score"] = float(D[0][list(I[0]).index(idx)])
-            results.append(row)
-
-        # Apply strict match filters (demo): e.g., require "Gray", finish="Flat"
-        strict_filters = {
-            "family_name": ["Neutral Gray"],
-            "finish": ["Flat"]
-        }
-        filtered = filter_by_exact_fields(results, strict_filters)
+        with span("search.total"):
+            cached = query_cache.get_results(user_query, strict_filters, 20, snapshot.version)
+            if cached is None:
+                # BM25 and vector results fused; exact sku/hex/title queries skip embedding.
+                D, I = searcher.search([user_query], 20, filters=strict_filters,
+                                       embed_fn=lambda qs: np.stack([query_cache.embedding(q, lambda t: get_embedding(t, model=snapshot.embed_model)) for q in qs]))
+                query_cache.put_results(user_query, strict_filters, 20, snapshot.version, D, I)
+            else:
+                D, I = cached
+
+            filtered = materialize_hits(store, D[0], I[0], leftover_filters=searcher.filter_index.unindexed(strict_filters))
 
         st.subheader(f"Top {len(filtered)} Results (Strict Match):")
-        for item in filtered:
-            st.markdown(f"### {item['title']} ({item['material_brand_name']})")
-            st.markdown(f"- Family: {item['family_name']}, Finish: {item['finish']}, Score: {item['score']:.3f}")
+        for rank, item in enumerate(filtered, 1):
+            st.markdown(f"### {rank}. {item['title']} ({item['material_brand_name']})")
+            # Reciprocal-rank-fusion score of the BM25 and vector ranks, not a cosine similarity.
+            st.markdown(f"- Family: {item['family_name']}, Finish: {item['finish']}, RRF score: {item['score']:.4f}")
             st.markdown(f"- VOC: {item['voc_level']} g/L, Price: ${item['price_per_sqft']}/ft²")
             st.markdown(f"- Tags: `{', '.join(item.get('tags', []))}`")
             st.markdown(f"<div style='background-color:{item['hex']}; width:40px; height:20px'></div>", unsafe_allow_html=True)
@@ -55,3 +86,8 @@ if user_query:
 
         if not filtered:
             st.warning("No exact match found. Try relaxing filters.")
+
+        with st.expander("Search timings"):
+            stages = METRICS.to_dict()["histograms"].get("stage_seconds", [])
+            st.table([{"stage": h["labels"].get("stage"), "calls": h["count"], "mean ms": round(h["mean"] * 1000, 2),
+                       "p99 ≤ ms": h["p99_le"] * 1000} for h in stages if h["labels"].get("stage", "").startswith(("search", "embed"))])
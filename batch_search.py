@@ -0,0 +1,229 @@
+"""
+Offline batch search over a JSONL file of queries.
+
+    python batch_search.py queries.jsonl --out results.jsonl --k 20
+
+Each input line is {"query": "...", "k": 20, "filters": {"finish": ["Flat"]},
+"fields": [...], "id": ...}; only "query" is required, and a bare JSON string
+is read as the query. Each output line is {"id", "query", "results": [...]},
+in input order, or {"id", "error"} for a line that couldn't be read or whose
+filters aren't {field: [values]} (a single string value is accepted). "id"
+defaults to the line number.
+
+Queries are read in batches: the batch's distinct query texts are embedded
+together (cached, concurrent and rate limited, as in embeddings.batch), then
+each distinct filter set is searched once over the stacked query matrix, with
+filters applied as row bitmaps inside the index. The next batch is read and
+embedded while the current one is searched. Ranking is the app's and the
+service's (BM25 + vector fusion) unless --vector-only, so a replay of
+production queries is comparable with what users saw.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, IO, Iterable, Iterator, List, Optional
+
+import numpy as np
+import faiss
+from dotenv import load_dotenv
+
+from embeddings.batch import embed_texts
+from filters import normalize_filters
+from index_store import INDEX_DIR, current_snapshot
+from live_index import Snapshot, open_snapshot
+from metrics import METRICS, span, inc
+from query_cache import normalize_query, freeze_filters
+from search import RESULT_FIELDS, materialize_hits
+
+load_dotenv()
+
+BATCH_QUERY_SIZE = int(os.getenv("BATCH_QUERY_SIZE", "1024"))
+BATCH_DEFAULT_FIELDS = ["mongo_id"] + RESULT_FIELDS
+
+
+def read_queries(lines: Iterable[str], k: int, fields: List[str]) -> Iterator[Dict]:
+    """
+    One dict per non-blank line: id, query, k, filters and fields, or id and
+    error for a line that isn't valid JSON or has malformed filters.
+    """
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        item = None
+        try:
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"query": item}
+            yield {
+                "id": item.get("id", line_no),
+                "query": str(item["query"]),
+                "k": max(1, int(item.get("k") or k)),
+                "filters": normalize_filters(item.get("filters") or None),
+                "fields": item.get("fields") or fields,
+            }
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            item_id = item.get("id", line_no) if isinstance(item, dict) else line_no
+            yield {"id": item_id, "error": f"{e.__class__.__name__}: {e}"}
+
+
+class BatchRunner:
+    """
+    Embeds and searches batches of parsed queries against one snapshot.
+    `embed_fn(texts, model)` overrides the embedding API, as in embed_texts.
+    """
+
+    def __init__(self, snapshot: Snapshot, vector_only: bool = False,
+                 embed_fn: Optional[Callable[[List[str], str], np.ndarray]] = None):
+        self.snapshot = snapshot
+        self.searcher = snapshot.searcher
+        self.vector_only = vector_only
+        self.model = snapshot.embed_model
+        self.embed_fn = embed_fn
+        self.embedded = 0
+        self.skipped_embeddings = 0
+
+    def _embed(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """
+        {normalized text: unit vector} for the distinct texts. The first text
+        seen for each normalized form is what gets embedded.
+        """
+        originals: Dict[str, str] = {}
+        for t in texts:
+            originals.setdefault(normalize_query(t), t)
+        if not originals:
+            return {}
+        keys = list(originals)
+        vecs = np.ascontiguousarray(embed_texts(list(originals.values()), model=self.model, embed_fn=self.embed_fn,
+                                                verbose=False), dtype=np.float32)
+        faiss.normalize_L2(vecs)
+        self.embedded += len(keys)
+        return dict(zip(keys, vecs))
+
+    def embed(self, batch: List[Dict]) -> Dict[str, np.ndarray]:
+        """
+        Embeddings for a batch; in hybrid mode queries equal to a sku, hex or
+        title are answered lexically and not embedded.
+        """
+        queries = [q["query"] for q in batch if "error" not in q]
+        if not self.vector_only:
+            lexical = self.searcher.lexical
+            semantic = [q for q in queries if not len(lexical.exact(q))]
+            self.skipped_embeddings += len(queries) - len(semantic)
+            queries = semantic
+        with span("batch.embed"):
+            return self._embed(queries)
+
+    def search(self, batch: List[Dict], vectors: Dict[str, np.ndarray]) -> List[Dict]:
+        """
+        Output records for a batch, in batch order.
+        """
+        def lookup(texts: List[str]) -> np.ndarray:
+            missing = [t for t in texts if normalize_query(t) not in vectors]
+            if missing:
+                vectors.update(self._embed(missing))
+            return np.stack([vectors[normalize_query(t)] for t in texts])
+
+        out: List[Optional[Dict]] = [None] * len(batch)
+        groups: Dict[tuple, List[int]] = {}
+        for i, q in enumerate(batch):
+            if "error" in q:
+                out[i] = q
+            else:
+                groups.setdefault(freeze_filters(q["filters"]), []).append(i)
+
+        fidx = self.searcher.filter_index
+        for members in groups.values():
+            k = max(batch[i]["k"] for i in members)
+            filters = batch[members[0]]["filters"]
+            texts = [batch[i]["query"] for i in members]
+            with span("batch.search"):
+                if self.vector_only:
+                    D, I = self.searcher.searcher.search(lookup(texts), k, filters=filters, queries=texts)
+                else:
+                    D, I = self.searcher.search(texts, k, filters, embed_fn=lookup)
+            leftover = fidx.unindexed(filters) if (filters and fidx) else {}
+            for j, i in enumerate(members):
+                q = batch[i]
+                out[i] = {
+                    "id": q["id"],
+                    "query": q["query"],
+                    "results": materialize_hits(self.snapshot.store, D[j, :q["k"]], I[j, :q["k"]],
+                                                q["fields"], leftover),
+                }
+        inc("batch_queries", len(batch))
+        return out
+
+
+def run(lines: Iterable[str], out: IO[str], runner: BatchRunner, k: int = 20,
+        fields: List[str] = BATCH_DEFAULT_FIELDS, batch_size: int = BATCH_QUERY_SIZE, log: IO[str] = sys.stdout) -> Dict:
+    """
+    Streams results for every line to `out`; returns counts and queries/sec.
+    """
+    queries = read_queries(lines, k, fields)
+    batches = iter(lambda: list(itertools.islice(queries, batch_size)), [])
+    done = errors = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-embed") as pool:
+        batch = next(batches, None)
+        pending = pool.submit(runner.embed, batch) if batch else None
+        while batch:
+            vectors = pending.result()
+            # Read and embed the next batch while this one is searched.
+            following = next(batches, None)
+            pending = pool.submit(runner.embed, following) if following else None
+            records = runner.search(batch, vectors)
+            out.write("".join(json.dumps(r, default=str) + "\n" for r in records))
+            out.flush()
+            done += len(batch)
+            errors += sum(1 for r in records if "error" in r)
+            print(f"   • {done} queries ({done / (time.perf_counter() - start):.0f}/s)", file=log)
+            batch = following
+    elapsed = time.perf_counter() - start
+    return {
+        "queries": done,
+        "errors": errors,
+        "embedded": runner.embedded,
+        "skipped_embeddings": runner.skipped_embeddings,
+        "seconds": round(elapsed, 3),
+        "queries_per_sec": round(done / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a JSONL file of searches against the current index")
+    parser.add_argument("input", help='JSONL of {"query", "k", "filters", "fields", "id"} ("-" for stdin)')
+    parser.add_argument("--out", default="-", help="output JSONL (default: stdout)")
+    parser.add_argument("--k", type=int, default=20, help="results per query when a line doesn't set k")
+    parser.add_argument("--fields", help="comma-separated metadata fields per hit when a line doesn't set fields")
+    parser.add_argument("--batch-size", type=int, default=BATCH_QUERY_SIZE, help="queries embedded and searched together")
+    parser.add_argument("--vector-only", action="store_true", help="rank by vector similarity only, without BM25 fusion")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--metrics", help="write stage timings and counters here (.prom for Prometheus text, else JSON)")
+    args = parser.parse_args()
+
+    log = sys.stderr if args.out == "-" else sys.stdout
+    print("▶️  Loading index and metadata...", file=log)
+    snapshot = open_snapshot(current_snapshot(args.index_dir))
+    print(f"   {snapshot.searcher.ntotal} materials, index version {snapshot.version}.", file=log)
+    runner = BatchRunner(snapshot, vector_only=args.vector_only)
+    fields = args.fields.split(",") if args.fields else BATCH_DEFAULT_FIELDS
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    dst = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        with span("batch.total"):
+            stats = run(src, dst, runner, k=args.k, fields=fields, batch_size=args.batch_size, log=log)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    print(f"✅  {stats['queries']} queries in {stats['seconds']:.1f}s ({stats['queries_per_sec']:.0f} queries/s); "
+          f"{stats['errors']} unreadable, {stats['embedded']} texts embedded, "
+          f"{stats['skipped_embeddings']} answered lexically.", file=log)
+    if args.metrics:
+        METRICS.dump(args.metrics)
@@ -0,0 +1,298 @@
+"""
+Build and query benchmark on a synthetic catalog, for sizes the real
+collection hasn't reached yet.
+
+    python -m benchmarks.catalog --n 10000 --n 100000 --n 1000000 --json bench.json
+    python -m benchmarks.catalog --n 100000 --compare bench.json
+
+Materials follow the nested Mongo schema that build_index.flatten_material()
+flattens, and are embedded offline by a deterministic fake embedder, so runs
+are comparable. Each catalog size runs in its own process so peak RSS is
+reported per size.
+"""
+import os
+
+# Offline runs: no rate limit, and don't fill the on-disk embedding cache.
+os.environ["EMBED_RPS"] = "0"
+os.environ["EMBED_CACHE_PATH"] = ""
+# build_index imports the Mongo query engine; its client is lazy and never connects here.
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("MONGO_COLL", "materials")
+
+import io
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+import contextlib
+from typing import Callable, Dict, Iterator, List
+
+import numpy as np
+
+from build_index import load_env, full_build
+from color_index import ColorIndex
+from embeddings.fake_server import fake_vector
+from filters import apply_color_threshold, filter_by_exact_fields
+from index_store import current_snapshot, load_color_index, INDEX_FILE
+from live_index import open_snapshot
+
+FAMILIES = ["Neutral Gray", "White", "Off White", "Blue", "Green", "Beige", "Red", "Yellow", "Black", "Brown"]
+FINISHES = ["Flat", "Matte", "Eggshell", "Satin", "Semi-Gloss", "Gloss"]
+CATEGORIES = ["Exterior Paint", "Interior Paint", "Roofing", "Siding", "Decking", "Trim"]
+BRANDS = ["Benjamin Moore", "Sherwin-Williams", "Behr", "PPG", "Valspar", "GAF", "James Hardie", "Trex"]
+STYLES = ["Classic", "Modern", "Coastal", "Farmhouse", "Industrial"]
+UNDERTONES = ["warm", "cool", "neutral", "green", "blue", "red", "yellow"]
+COATINGS = ["acrylic", "latex", "oil", "elastomeric", "alkyd"]
+TAGS = ["exterior", "interior", "premium", "zero-voc", "matte", "durable", "washable", "mildew-resistant", "low-odor"]
+SEGMENTS = ["WL", "RF", "TR", "DR", "GD", "SD"]
+SUBSTRATES = ["wood", "masonry", "stucco", "drywall", "metal", "vinyl"]
+REGIONS = ["US-NE", "US-SE", "US-MW", "US-SW", "US-W", "CA"]
+CERTIFICATIONS = ["GREENGUARD", "LEED", "MPI", "Green Seal"]
+ADJECTIVES = ["soft", "deep", "pale", "bright", "muted", "dusty", "rich", "cool", "warm", "quiet"]
+NOUNS = ["harbor", "stone", "meadow", "linen", "slate", "fern", "sand", "ember", "mist", "cedar"]
+
+
+def synthetic_material(i: int, rng: random.Random) -> Dict:
+    """
+    One raw material document in the nested Mongo shape.
+    """
+    lab = [rng.uniform(5, 98), rng.uniform(-60, 60), rng.uniform(-60, 60)]
+    name = f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS).title()}"
+    return {
+        "_id": f"syn{i:08d}",
+        "title": f"{name} {i}",
+        "slug": f"{name.lower().replace(' ', '-')}-{i}",
+        "material_category_name": rng.choice(CATEGORIES),
+        "material_brand_name": rng.choice(BRANDS),
+        "material_style_name": rng.choice(STYLES),
+        "sku": f"SKU-{i:07d}",
+        "color": {
+            "hex": "#%06X" % rng.randrange(1 << 24),
+            "rgb": [rng.randrange(256) for _ in range(3)],
+            "lab": lab,
+            "lrv": round(lab[0] * 0.9, 1),
+            "family_id": float(rng.randrange(len(FAMILIES))),
+            "family_name": rng.choice(FAMILIES),
+            "primary_undertone": rng.choice(UNDERTONES),
+            "secondary_undertone": rng.choice(UNDERTONES),
+            "warmth_score": round(rng.uniform(-1, 1), 2),
+        },
+        "finish": rng.choice(FINISHES),
+        "coating_type": rng.choice(COATINGS),
+        "certifications": rng.sample(CERTIFICATIONS, rng.randrange(3)),
+        "tags": rng.sample(TAGS, rng.randrange(1, 4)),
+        "performance": {
+            "voc_level": float(rng.randrange(0, 100)),
+            "mildew_resistant": rng.random() < 0.5,
+            "uv_resistance_years": float(rng.randrange(1, 20)),
+            "adhesion_rating_psi": float(rng.randrange(100, 800)),
+        },
+        "application": {
+            "recommended_substrates": rng.sample(SUBSTRATES, rng.randrange(1, 4)),
+            "coverage_sqft_per_gal": float(rng.randrange(250, 450)),
+        },
+        "pricing": {"per_gallon": round(rng.uniform(20, 90), 2), "per_sqft": round(rng.uniform(0.1, 3), 2)},
+        "logistics": {
+            "in_stock": rng.random() < 0.8,
+            "lead_time_days": float(rng.randrange(0, 30)),
+            "region_availability": rng.sample(REGIONS, rng.randrange(1, 4)),
+            "container_sizes": rng.sample(["quart", "gallon", "5-gallon"], rng.randrange(1, 3)),
+        },
+        "description": f"A {rng.choice(ADJECTIVES)} {rng.choice(FAMILIES).lower()} {rng.choice(FINISHES).lower()} "
+                       f"finish for {rng.choice(SUBSTRATES)}, {rng.choice(TAGS)}.",
+        "image_url": f"https://example.com/materials/{i}.jpg",
+        "segment_types": rng.sample(SEGMENTS, rng.randrange(1, 3)),
+        "audit": {"created_at": "2025-01-01T00:00:00Z", "updated_at": "2025-06-01T00:00:00Z"},
+    }
+
+
+def synthetic_catalog(n: int, seed: int = 0) -> Iterator[Dict]:
+    rng = random.Random(seed)
+    for i in range(n):
+        yield synthetic_material(i, rng)
+
+
+class FakeEmbedder:
+    """
+    Deterministic offline embedder: the normalized sum of fixed random vectors
+    for the text's hashed word buckets, so texts that share words land near
+    each other, as with a real model. Memory is constant in the catalog size.
+    """
+
+    def __init__(self, dim: int = 256, buckets: int = 4096):
+        self.dim = dim
+        self.buckets = buckets
+        self.table = np.stack([fake_vector(str(b), "bench", dim) for b in range(buckets)])
+
+    def embed_one(self, text: str) -> np.ndarray:
+        ids = [zlib.crc32(w.encode("utf-8")) % self.buckets for w in text.lower().split()]
+        vec = self.table[ids].sum(axis=0) if ids else self.table[0].copy()
+        return vec / max(float(np.linalg.norm(vec)), 1e-12)
+
+    def __call__(self, texts: List[str], model: str = "") -> np.ndarray:
+        return np.stack([self.embed_one(t) for t in texts]).astype(np.float32)
+
+
+def synthetic_queries(nq: int, seed: int = 1) -> List[Dict]:
+    rng = random.Random(seed)
+    return [{
+        "text": f"{rng.choice(ADJECTIVES)} {rng.choice(FAMILIES).lower()} {rng.choice(FINISHES).lower()} "
+                f"{rng.choice(CATEGORIES).lower()} for {rng.choice(SUBSTRATES)}",
+        "filters": {"family_name": [rng.choice(FAMILIES)], "finish": [rng.choice(FINISHES)]},
+        "lab": [rng.uniform(20, 90), rng.uniform(-40, 40), rng.uniform(-40, 40)],
+    } for _ in range(nq)]
+
+
+def timed(fn: Callable, args_list: List) -> Dict:
+    latencies = []
+    for args in args_list:
+        t = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - t)
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+def run(n: int, dim: int = 256, nq: int = 200, k: int = 20, spec: str = "Flat",
+        scan_rows: int = 100000, verbose: bool = False) -> Dict:
+    embedder = FakeEmbedder(dim)
+    config = load_env()
+    config["INDEX_SPEC"] = spec
+    with tempfile.TemporaryDirectory(prefix="bench_catalog_") as out:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+            full_build(config, docs=synthetic_catalog(n), embed_fn=embedder, base_dir=out)
+        build_s = time.perf_counter() - start
+        build_rss = peak_rss_mb()
+        path = current_snapshot(out)
+        index_mb = os.path.getsize(os.path.join(path, INDEX_FILE)) / 2 ** 20
+
+        # What a starting app or service pays before its first query.
+        start = time.perf_counter()
+        snapshot = open_snapshot(path)
+        open_ms = (time.perf_counter() - start) * 1000
+        hybrid, store = snapshot.searcher, snapshot.store
+        searcher = hybrid.searcher
+        colors: ColorIndex = load_color_index(store, path)
+        queries = synthetic_queries(nq)
+        vecs = embedder([q["text"] for q in queries])
+
+        # The in-memory paths scan materialized rows; cap them so 1M runs stay bounded.
+        rows = np.arange(min(len(store), scan_rows))
+        candidates = store.records(rows, ["family_name", "finish", "lab"])
+        few = queries[:max(1, nq // 10)]
+        results = {
+            "vector_search": timed(lambda i: searcher.search(vecs[i:i + 1], k), [(i,) for i in range(nq)]),
+            "vector_search_filtered": timed(lambda i: searcher.search(vecs[i:i + 1], k, filters=queries[i]["filters"]),
+                                            [(i,) for i in range(nq)]),
+            "hybrid_search": timed(lambda q: hybrid.search([q["text"]], k, embed_fn=embedder), [(q,) for q in queries]),
+            "filter_index_mask": timed(lambda q: searcher.filter_index.mask(q["filters"]), [(q,) for q in queries]),
+            "facet_counts": timed(lambda q: searcher.filter_index.facet_counts(q["filters"]), [(q,) for q in queries]),
+            "filter_by_exact_fields": timed(lambda q: filter_by_exact_fields(candidates, q["filters"]), [(q,) for q in few]),
+            "color_index_within": timed(lambda q: colors.within(q["lab"], 10.0), [(q,) for q in queries]),
+            "apply_color_threshold": timed(lambda q: apply_color_threshold(q["lab"], candidates, 10.0), [(q,) for q in few]),
+        }
+        hybrid.close()
+
+    return {
+        "n": n,
+        "dim": dim,
+        "spec": spec,
+        "k": k,
+        "scan_rows": len(rows),
+        "build": {
+            "seconds": round(build_s, 2),
+            "materials_per_sec": round(n / max(build_s, 1e-9), 1),
+            "index_mb": round(index_mb, 2),
+            "peak_rss_mb": build_rss,
+            "open_ms": round(open_ms, 1),
+        },
+        "queries": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(n: int, args) -> Dict:
+    """
+    Runs one size in a fresh interpreter, so its peak RSS isn't inflated by earlier sizes.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".json") as tmp:
+        subprocess.run([sys.executable, "-m", "benchmarks.catalog", "--n", str(n), "--dim", str(args.dim),
+                        "--queries", str(args.queries), "--k", str(args.k), "--spec", args.spec,
+                        "--scan-rows", str(args.scan_rows), "--json", tmp.name, "--quiet"], check=True)
+        return json.load(open(tmp.name))["results"][0]
+
+
+def print_result(r: Dict):
+    b = r["build"]
+    print(f"▶️  n={r['n']}  dim={r['dim']}  spec={r['spec']}")
+    print(f"   build {b['seconds']}s ({b['materials_per_sec']:.0f} materials/s), index {b['index_mb']} MB, "
+          f"peak RSS {b['peak_rss_mb']} MB after build, {r['peak_rss_mb']} MB overall, "
+          f"snapshot opened in {b.get('open_ms', 0)} ms")
+    print(f"   {'operation':<26}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, t in r["queries"].items():
+        print(f"   {name:<26}{t['p50_ms']:>10.3f}{t['p99_ms']:>10.3f}")
+
+
+def compare(old: Dict, new: List[Dict], threshold: float = 1.2):
+    """
+    Prints new/old ratios for each size present in both runs; > threshold is flagged.
+    """
+    previous = {r["n"]: r for r in old["results"]}
+    for r in new:
+        before = previous.get(r["n"])
+        if before is None:
+            continue
+        print(f"▶️  n={r['n']} vs previous run")
+        pairs = [("build seconds", before["build"]["seconds"], r["build"]["seconds"]),
+                 ("peak RSS MB", before["peak_rss_mb"], r["peak_rss_mb"])]
+        pairs += [(f"{name} p50 ms", before["queries"][name]["p50_ms"], t["p50_ms"])
+                  for name, t in r["queries"].items() if name in before["queries"]]
+        for label, a, b in pairs:
+            ratio = b / a if a else float("inf")
+            flag = "  ⚠️  slower" if ratio > threshold else ""
+            print(f"   {label:<34}{a:>10.3f} -> {b:<10.3f} x{ratio:.2f}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic-catalog build and query benchmark")
+    parser.add_argument("--n", type=int, action="append", help="catalog size (repeatable; default 10000)")
+    parser.add_argument("--dim", type=int, default=256, help="fake embedding dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--spec", default="Flat", help="FAISS index_factory string")
+    parser.add_argument("--scan-rows", type=int, default=100000,
+                        help="rows materialized for the in-memory filter / color scans")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="previous --json output to compare against")
+    parser.add_argument("--verbose", action="store_true", help="show build progress")
+    parser.add_argument("--quiet", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = args.n or [10000]
+    if len(sizes) == 1:
+        results = [run(sizes[0], args.dim, args.queries, args.k, args.spec, args.scan_rows, args.verbose)]
+    else:
+        results = [run_isolated(n, args) for n in sizes]
+    if not args.quiet:
+        for r in results:
+            print_result(r)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results}, f, indent=2)
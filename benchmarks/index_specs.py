@@ -0,0 +1,157 @@
+"""
+Compare FAISS index specs on recall@k against the exact Flat baseline,
+single-query p50/p99 latency, build time and serialized size.
+
+    python -m benchmarks.index_specs --n 100000 --dim 1536
+    python -m benchmarks.index_specs --from-index faiss_index.bin \\
+        --spec Flat --spec "IVF256,Flat@nprobe=8" --spec "IVF256,Flat@nprobe=32" --spec "HNSW32@efSearch=64"
+
+A spec is a FAISS index_factory string, optionally followed by @key=value
+search parameters (nprobe for IVF, efSearch for HNSW). @dim=N indexes only the
+first N dimensions and @rescore=R reranks k*R candidates exactly from the
+full-precision vectors, as build_index.py --truncate-dim / --rescore do.
+@shards=S splits the rows into S shards searched in parallel (--shard-size);
+"match" is the fraction of queries whose top k equals the unsharded spec's.
+
+    python -m benchmarks.index_specs --spec Flat --spec "SQ8@rescore=4" --spec "SQ8@dim=768@rescore=4"
+    python -m benchmarks.index_specs --spec Flat --spec "Flat@shards=4" --spec "SQ8@shards=4"
+
+size MB is the index alone; rescoring reads the full vectors from a
+memory-mapped file, so they are not resident.
+"""
+import argparse
+import json
+import math
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+import faiss
+
+from index_store import new_index, train_index
+from search import Searcher, truncate_embeddings
+
+
+def parse_spec(text: str) -> Tuple[str, Dict[str, int]]:
+    spec, *params = text.split("@")
+    return spec, {k: int(v) for k, v in (p.split("=", 1) for p in params)}
+
+
+def unsharded(text: str) -> str:
+    spec, params = parse_spec(text)
+    params.pop("shards", None)
+    return "@".join([spec] + [f"{k}={v}" for k, v in params.items()])
+
+
+def default_specs(n: int) -> List[str]:
+    nlist = max(16, int(4 * math.sqrt(n)))
+    return [
+        "Flat",
+        f"IVF{nlist},Flat@nprobe=8",
+        f"IVF{nlist},Flat@nprobe=32",
+        "HNSW32@efSearch=64",
+        "HNSW32@efSearch=128",
+        f"IVF{nlist},PQ64@nprobe=32",
+        "SQ8",
+        "SQ8@rescore=4",
+        "SQfp16@dim=768@rescore=4",
+        "SQ8@dim=768@rescore=4",
+    ]
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """
+    Clustered unit vectors, closer to real embedding geometry than uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    x = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(x)
+    return x
+
+
+def vectors_from_index(path: str) -> np.ndarray:
+    index = faiss.read_index(path)
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    return base.reconstruct_n(0, base.ntotal)
+
+
+def make_queries(x: np.ndarray, nq: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # Perturbations of about half a unit vector, so neighbours aren't trivially the seed item.
+    q = x[rng.integers(0, len(x), nq)] + 0.5 * rng.standard_normal((nq, x.shape[1])).astype(np.float32) / math.sqrt(x.shape[1])
+    faiss.normalize_L2(q)
+    return q
+
+
+def bench_spec(text: str, x: np.ndarray, q: np.ndarray, k: int, truth: np.ndarray) -> Dict:
+    spec, params = parse_spec(text)
+    xd = truncate_embeddings(x, params.pop("dim", 0))
+    num_shards = params.pop("shards", 1)
+    start = time.perf_counter()
+    index = new_index(xd.shape[1], spec)
+    train_index(index, xd)
+    # Every shard is a copy of the trained empty index, as build_index.ChunkIndexer makes them.
+    shards = [faiss.clone_index(index) for _ in range(num_shards)]
+    for shard, rows in zip(shards, np.array_split(np.arange(len(x), dtype=np.int64), num_shards)):
+        shard.add_with_ids(xd[rows], rows)
+    build_s = time.perf_counter() - start
+    searcher = Searcher(shards if num_shards > 1 else shards[0], search_params=params,
+                        vectors=x if params.get("rescore") else None)
+
+    latencies = []
+    found = np.empty((len(q), k), dtype=np.int64)
+    for i in range(len(q)):
+        t = time.perf_counter()
+        _, rows = searcher.search(q[i:i + 1], k)
+        latencies.append(time.perf_counter() - t)
+        found[i] = rows[0]
+    searcher.close()
+    recall = np.mean([len(np.intersect1d(found[i], truth[i])) / k for i in range(len(q))])
+    return {
+        "spec": text,
+        "recall_at_k": round(float(recall), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        "build_s": round(build_s, 2),
+        "size_mb": round(sum(len(faiss.serialize_index(s)) for s in shards) / 2 ** 20, 2),
+        "found": found,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall/latency benchmark for FAISS index specs")
+    parser.add_argument("--from-index", help="take vectors from an existing Flat index file")
+    parser.add_argument("--n", type=int, default=50000, help="synthetic catalog size")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--spec", action="append", help="index spec to test (repeatable)")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    x = vectors_from_index(args.from_index) if args.from_index else synthetic_vectors(args.n, args.dim)
+    q = make_queries(x, args.queries)
+    k = min(args.k, len(x))
+    exact = faiss.IndexFlatIP(x.shape[1])
+    exact.add(x)
+    _, truth = exact.search(q, k)
+
+    print(f"▶️  {len(x)} vectors x {x.shape[1]} dims, {len(q)} queries, k={k}")
+    print(f"{'spec':<34}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}{'build s':>10}{'size MB':>10}{'match':>8}")
+    results, found = [], {}
+    for text in args.spec or default_specs(len(x)):
+        r = bench_spec(text, x, q, k, truth)
+        found[text] = r.pop("found")
+        base = unsharded(text)
+        if base != text:
+            if base not in found:
+                found[base] = bench_spec(base, x, q, k, truth)["found"]
+            r["match"] = round(float(np.mean(np.all(found[text] == found[base], axis=1))), 4)
+        results.append(r)
+        match = f"{r['match']:>8.4f}" if "match" in r else ""
+        print(f"{r['spec']:<34}{r['recall_at_k']:>10.4f}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['build_s']:>10.2f}{r['size_mb']:>10.2f}{match}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"n": len(x), "dim": int(x.shape[1]), "k": k, "results": results}, f, indent=2)
@@ -1,24 +1,136 @@
 import os
 import time
-import pickle
-from typing import List, Dict
+import queue
+import shutil
+import argparse
+import itertools
+import threading
+from contextlib import nullcontext
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 
-import pandas as pd
 import numpy as np
 import faiss
 from dotenv import load_dotenv
 
-from api.query_engine import fetch_filtered_materials
-from embeddings.embedder import get_embedding
+from api.query_engine import iter_materials, fetch_updated_since, fetch_all_ids
+from embeddings.backends import model_id, split_model_id
+from embeddings.batch import embed_texts
+from color_index import ColorIndex
+from filter_index import FilterIndex
+from lexical_index import LexicalIndex
+from partition_index import build_partitions
+from metrics import METRICS, span, inc
+from search import truncate_embeddings
+from index_store import (
+    INDEX_DIR, vector_id_for, read_manifest, write_manifest, new_index,
+    current_snapshot, new_snapshot, publish_snapshot, verify_snapshot,
+    load_shards, save_shards, load_metadata, write_metadata, save_filter_index, save_color_index,
+    save_lexical_index, VectorWriter, load_vectors,
+    train_index, supports_incremental,
+)
 
 
 def load_env():
     load_dotenv()
     return {
-        "EMBED_MODEL": os.getenv("EMBED_MODEL", "text-embedding-3-small"),
+        # Backend-qualified, e.g. "text-embedding-3-small" or "hashing:char3-5-512" (embeddings/backends.py).
+        "EMBED_MODEL": model_id(os.getenv("EMBED_BACKEND", "openai"), os.getenv("EMBED_MODEL")),
+        "INDEX_SPEC": os.getenv("INDEX_SPEC", "Flat"),
+        "SEARCH_PARAMS": {},
+        "CHUNK_SIZE": int(os.getenv("BUILD_CHUNK_SIZE", "2000")),
+        "TRAIN_SIZE": int(os.getenv("BUILD_TRAIN_SIZE", "50000")),
+        # 0 keeps every embedding dimension in the index.
+        "TRUNCATE_DIM": int(os.getenv("INDEX_TRUNCATE_DIM", "0")),
+        # > 0 writes full-precision vectors.f32 and rescores k * RESCORE candidates.
+        "RESCORE": int(os.getenv("INDEX_RESCORE", "0")),
+        # > 0 splits the index into shards of this many rows, searched in parallel.
+        "SHARD_SIZE": int(os.getenv("INDEX_SHARD_SIZE", "0")),
+        # Metadata fields to write per-value partition indexes for; empty disables them.
+        "PARTITION_FIELDS": [f for f in os.getenv("INDEX_PARTITION_FIELDS",
+                                                  "material_category_name,segment_types").split(",") if f],
+        # Values on fewer rows are searched through the main index with a filter.
+        "PARTITION_MIN_ROWS": int(os.getenv("INDEX_PARTITION_MIN_ROWS", "1000")),
     }
 
 
+def manifest_search_params(config: Dict, previous: Optional[Dict] = None) -> Dict:
+    params = dict(config["SEARCH_PARAMS"] or previous or {})
+    params.pop("rescore", None)
+    if config["RESCORE"]:
+        params["rescore"] = config["RESCORE"]
+    return params
+
+
+# Only the fields flatten_material() and is_deleted() read.
+INDEX_PROJECTION = {
+    field: 1 for field in (
+        "title", "slug", "material_category_name", "material_brand_name", "material_style_name",
+        "sku", "color", "finish", "coating_type", "certifications", "tags", "performance",
+        "application", "pricing", "logistics", "description", "image_url", "segment_types",
+        "audit", "is_deleted", "deleted",
+    )
+}
+
+
+def flatten_material(d: Dict) -> Dict:
+    """
+    Flatten a nested Mongo material document into one metadata row.
+    """
+    color = d.get("color") or {}
+    performance = d.get("performance") or {}
+    application = d.get("application") or {}
+    pricing = d.get("pricing") or {}
+    logistics = d.get("logistics") or {}
+    audit = d.get("audit") or {}
+    return {
+        "vector_id":              vector_id_for(d["_id"]),
+        "mongo_id":               str(d["_id"]),
+        "title":                  d.get("title", ""),
+        "slug":                   d.get("slug", ""),
+        "material_category_name": d.get("material_category_name", ""),
+        "material_brand_name":    d.get("material_brand_name", ""),
+        "material_style_name":    d.get("material_style_name", ""),
+        "sku":                    d.get("sku", ""),
+        "hex":                    color.get("hex", ""),
+        "rgb":                    color.get("rgb", []),
+        "lab":                    color.get("lab", []),
+        "lrv":                    color.get("lrv", None),
+        "family_id":              color.get("family_id", None),
+        "family_name":            color.get("family_name", ""),
+        "primary_undertone":      color.get("primary_undertone", ""),
+        "secondary_undertone":    color.get("secondary_undertone", ""),
+        "warmth_score":           color.get("warmth_score", None),
+        "finish":                 d.get("finish", ""),
+        "coating_type":           d.get("coating_type", ""),
+        "certifications":         d.get("certifications", []),
+        "tags":                   d.get("tags", []),
+        "voc_level":              performance.get("voc_level", None),
+        "mildew_resistant":       performance.get("mildew_resistant", None),
+        "uv_resistance_years":    performance.get("uv_resistance_years", None),
+        "adhesion_rating_psi":    performance.get("adhesion_rating_psi", None),
+        "recommended_substrates": application.get("recommended_substrates", []),
+        "coverage_sqft_per_gal":  application.get("coverage_sqft_per_gal", None),
+        "price_per_gallon":       pricing.get("per_gallon", None),
+        "price_per_sqft":         pricing.get("per_sqft", None),
+        "in_stock":               logistics.get("in_stock", None),
+        "lead_time_days":         logistics.get("lead_time_days", None),
+        "region_availability":    logistics.get("region_availability", []),
+        "container_sizes":        logistics.get("container_sizes", []),
+        "description":            d.get("description", ""),
+        "image_url":              d.get("image_url", ""),
+        "segment_types":          d.get("segment_types", []),
+        "created_at":             audit.get("created_at", ""),
+        "updated_at":             audit.get("updated_at", ""),
+    }
+
+
+def is_deleted(d: Dict) -> bool:
+    """
+    Soft-deleted documents are removed from the index on incremental runs.
+    """
+    return bool(d.get("is_deleted") or d.get("deleted") or (d.get("audit") or {}).get("deleted_at"))
+
+
 def build_search_text(record: Dict) -> str:
     parts = [
         f"TITLE: {record.get('title', '')}",
@@ -37,37 +149,401 @@ def build_search_text(record: Dict) -> str:
     return " || ".join(parts)
 
 
-def chunkify(lst: List, size: int):
-    for i in range(0, len(lst), size):
-        yield lst[i:i + size]
+def chunkify(items: Iterable, size: int) -> Iterator[List]:
+    it = iter(items)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
 
 
-if __name__ == "__main__":
-    config = load_env()
+def prefetch(chunks: Iterable, depth: int = 1, stage: str = "build.fetch") -> Iterator:
+    """
+    Pulls the next `depth` items on a background thread, so fetching chunk N+1
+    from Mongo overlaps with embedding chunk N. Each pull is timed as `stage`.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=depth)
+    done = object()
 
-    print("▶️  Fetching materials from MongoDB using smart filters...")
-    all_docs = fetch_filtered_materials(limit=10000)
-    print(f"   Retrieved {len(all_docs)} materials.")
+    def worker():
+        try:
+            it = iter(chunks)
+            while True:
+                with span(stage):
+                    chunk = next(it, done)
+                q.put(chunk)
+                if chunk is done:
+                    return
+        except BaseException as e:
+            q.put(e)
 
-    # Build flattened metadata
-    df = pd.DataFrame(all_docs)
-    df["search_text"] = df.apply(lambda row: build_search_text(row.to_dict()), axis=1)
+    threading.Thread(target=worker, daemon=True).start()
+    while True:
+        item = q.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
 
-    print("▶️  Generating embeddings...")
-    all_texts = df["search_text"].tolist()
-    all_embeddings = []
-    for text in all_texts:
-        vec = get_embedding(text)
-        all_embeddings.append(vec)
-        time.sleep(0.25)  # throttle
 
-    embeddings = np.stack(all_embeddings)
+@span("build.embed")
+def embed_records(records: List[Dict], config: Dict, verbose: bool = True, embed_fn=None) -> np.ndarray:
+    for r in records:
+        r["search_text"] = build_search_text(r)
+    embeddings = embed_texts([r["search_text"] for r in records], model=config["EMBED_MODEL"],
+                             embed_fn=embed_fn, verbose=verbose)
     faiss.normalize_L2(embeddings)
-    index = faiss.IndexFlatIP(embeddings.shape[1])
-    index.add(embeddings)
+    return embeddings
+
+
+def max_updated_at(records: List[Dict], default=None):
+    stamps = [r["updated_at"] for r in records if r.get("updated_at")]
+    return max(stamps + ([default] if default else []), default=None)
+
+
+class ChunkIndexer:
+    """
+    Adds embedded chunks to a new index in arrival order. Specs that need
+    training hold chunks back until `train_size` vectors have arrived (or the
+    stream ends), train on those, then flush them; only that sample is buffered.
+    With `truncate_dim` the index holds only that many leading dimensions.
+
+    With `shard_size`, rows fill shards of that many vectors one after another;
+    every shard starts as a copy of the same trained empty index, so all shards
+    (and partitions) share one quantizer. Pass `shards` to keep appending to an
+    existing index.
+    """
+
+    def __init__(self, spec: str, train_size: int, truncate_dim: int = 0, shard_size: int = 0,
+                 shards: Optional[List[faiss.Index]] = None):
+        self.spec = spec
+        self.train_size = train_size
+        self.truncate_dim = truncate_dim
+        self.shard_size = shard_size
+        self.shards: List[faiss.Index] = list(shards or [])
+        self.dim = None
+        self._empty = None
+        self._pending: List = []
+
+    @property
+    def index(self) -> Optional[faiss.Index]:
+        return self.shards[-1] if self.shards else None
+
+    @property
+    def ntotal(self) -> int:
+        return sum(s.ntotal for s in self.shards)
+
+    def add(self, embeddings: np.ndarray, records: List[Dict]) -> List[Tuple[np.ndarray, List[Dict]]]:
+        """
+        Returns the (full embeddings, records) chunks that are now in the index, in index order.
+        """
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        if not self.shards:
+            self.shards.append(new_index(min(self.truncate_dim or self.dim, self.dim), self.spec))
+        self._pending.append((embeddings, records))
+        if not self.index.is_trained and sum(len(r) for _, r in self._pending) < self.train_size:
+            return []
+        return self.flush()
+
+    def flush(self) -> List[Tuple[np.ndarray, List[Dict]]]:
+        if not self._pending:
+            return []
+        d = self.index.d
+        if not self.index.is_trained:
+            with span("build.train"):
+                train_index(self.index, truncate_embeddings(np.vstack([e for e, _ in self._pending]), d))
+        if self._empty is None and not self.index.ntotal:
+            self._empty = faiss.clone_index(self.index)
+        with span("build.index_add"):
+            for embeddings, records in self._pending:
+                self._add(truncate_embeddings(embeddings, d), np.array([r["vector_id"] for r in records], dtype=np.int64))
+        flushed, self._pending = self._pending, []
+        return flushed
+
+    def empty(self) -> faiss.Index:
+        """
+        A trained, empty index of the spec (copied before the first add, or
+        from the smallest shard when appending to an existing index).
+        """
+        if self._empty is None:
+            self._empty = faiss.clone_index(min(self.shards, key=lambda s: s.ntotal))
+            self._empty.reset()
+        return self._empty
+
+    def _add(self, vectors: np.ndarray, ids: np.ndarray):
+        while len(ids):
+            if self.shard_size and self.index.ntotal >= self.shard_size:
+                self.shards.append(faiss.clone_index(self.empty()))
+            room = self.shard_size - self.index.ntotal if self.shard_size else len(ids)
+            self.index.add_with_ids(vectors[:room], ids[:room])
+            vectors, ids = vectors[room:], ids[room:]
+
+
+def write_partitions(config: Dict, indexer: ChunkIndexer, fidx: FilterIndex, store, snapshot: str) -> List[Dict]:
+    """
+    Per-value partition indexes for config["PARTITION_FIELDS"], built from the
+    snapshot's full-precision vectors when it has them, else from the index.
+    """
+    if not config["PARTITION_FIELDS"]:
+        return []
+    with span("build.partitions"):
+        vectors = load_vectors(indexer.dim, snapshot) if config["RESCORE"] else None
+        partitions = build_partitions(indexer.shards, indexer.empty(), fidx, store.vector_ids, snapshot,
+                                      config["PARTITION_FIELDS"], config["PARTITION_MIN_ROWS"], vectors)
+    print(f"   • {len(partitions)} partition indexes ({', '.join(config['PARTITION_FIELDS'])})")
+    return partitions
+
+
+def full_build(config: Dict, docs: Optional[Iterable[Dict]] = None, embed_fn=None, base_dir: str = INDEX_DIR):
+    """
+    Streams `docs` (default: the whole Mongo collection) through embedding into
+    a new index. `embed_fn` overrides the embedding API, as in embed_texts.
+    """
+    if docs is None:
+        print("▶️  Streaming materials from MongoDB...")
+        docs = iter_materials(projection=INDEX_PROJECTION, batch_size=config["CHUNK_SIZE"])
+    indexer = ChunkIndexer(config["INDEX_SPEC"], config["TRAIN_SIZE"], config["TRUNCATE_DIM"], config["SHARD_SIZE"])
+    watermark = None
+    start = time.perf_counter()
+
+    chunks = prefetch(chunkify(docs, config["CHUNK_SIZE"]))
+    first = next(chunks, None)
+    if first is None:
+        print("   No materials found; nothing to build.")
+        return
+    snapshot, version = new_snapshot(base_dir)
+
+    def indexed_chunks():
+        nonlocal watermark
+        for chunk in itertools.chain([first], chunks):
+            with span("build.flatten"):
+                records = [flatten_material(d) for d in chunk if not is_deleted(d)]
+            inc("materials_indexed", len(records))
+            inc("materials_skipped_deleted", len(chunk) - len(records))
+            if not records:
+                continue
+            embeddings = embed_records(records, config, verbose=False, embed_fn=embed_fn)
+            watermark = max_updated_at(records, default=watermark)
+            for full, ready in indexer.add(embeddings, records):
+                if vectors:
+                    vectors.append(full)
+                yield ready
+            if indexer.ntotal:
+                rate = indexer.ntotal / (time.perf_counter() - start)
+                print(f"   • {indexer.ntotal} materials indexed ({rate:.0f}/s)")
+        for full, ready in indexer.flush():
+            if vectors:
+                vectors.append(full)
+            yield ready
+
+    print(f"▶️  Embedding and indexing into {config['INDEX_SPEC']} in chunks of {config['CHUNK_SIZE']}...")
+    with (VectorWriter(snapshot) if config["RESCORE"] else nullcontext()) as vectors:
+        store = write_metadata(indexed_chunks(), snapshot)
+    if indexer.index is None:
+        print("   Every material is soft-deleted; nothing to index.")
+        shutil.rmtree(snapshot, ignore_errors=True)
+        return
 
     print("▶️  Saving index and metadata...")
-    faiss.write_index(index, "faiss_index.bin")
-    df.to_pickle("materials_metadata.pkl")
+    with span("build.save_index"):
+        save_shards(indexer.shards, snapshot)
+    fidx = FilterIndex.build(store)
+    with span("build.filter_index"):
+        save_filter_index(fidx, snapshot)
+    with span("build.color_index"):
+        save_color_index(ColorIndex.from_store(store), snapshot)
+    with span("build.lexical_index"):
+        save_lexical_index(LexicalIndex.build(store), snapshot)
+    partitions = write_partitions(config, indexer, fidx, store, snapshot)
+    write_manifest({
+        "embed_model": config["EMBED_MODEL"],
+        "embed_backend": split_model_id(config["EMBED_MODEL"])[0],
+        "index_spec": config["INDEX_SPEC"],
+        "search_params": manifest_search_params(config),
+        "dim": indexer.dim,
+        "truncate_dim": config["TRUNCATE_DIM"],
+        "shard_size": config["SHARD_SIZE"],
+        "shards": len(indexer.shards),
+        "partitions": partitions,
+        "count": indexer.ntotal,
+        "watermark": watermark,
+    }, snapshot, version)
+    published = publish_snapshot(snapshot, base_dir)
+    print(f"✅  Build complete: {indexer.ntotal} materials in {published}.")
+
+
+def incremental_build(config: Dict, prune: bool = False, base_dir: str = INDEX_DIR):
+    """
+    Re-embeds materials changed since the current snapshot's watermark and
+    publishes the result as a new snapshot; the current one is only read.
+    """
+    source = current_snapshot(base_dir)
+    manifest = read_manifest(source)
+    if (not manifest or manifest.get("embed_model") != config["EMBED_MODEL"]
+            or manifest.get("index_spec", "Flat") != config["INDEX_SPEC"]
+            or manifest.get("truncate_dim", 0) != config["TRUNCATE_DIM"]
+            or manifest.get("shard_size", 0) != config["SHARD_SIZE"]):
+        print("   No compatible manifest found; running a full build.")
+        return full_build(config, base_dir=base_dir)
+    shards = load_shards(source, manifest)
+    if not all(supports_incremental(shard) for shard in shards):
+        print(f"   {config['INDEX_SPEC']} index can't be updated in place; running a full build.")
+        return full_build(config, base_dir=base_dir)
+    store = load_metadata(source)
+    dim = manifest.get("dim") or shards[0].d
+    old_vectors = load_vectors(dim, source) if config["RESCORE"] else None
+    if config["RESCORE"] and (old_vectors is None or len(old_vectors) != len(store)):
+        print("   No full-precision vectors to rescore from; running a full build.")
+        return full_build(config, base_dir=base_dir)
 
-    print("✅  Build complete: faiss_index.bin & materials_metadata.pkl saved.")
+    watermark = manifest.get("watermark")
+    print(f"▶️  Scanning materials updated since {watermark}...")
+    # First pass reads ids and delete flags only, so the index can be compacted
+    # before any changed vectors are appended. It also sets the new watermark:
+    # anything edited after it has a later updated_at, so the next run reads it again.
+    changed_ids, removed_ids = set(), set()
+    new_watermark = watermark
+    for d in fetch_updated_since(watermark, {"audit": 1, "is_deleted": 1, "deleted": 1}, config["CHUNK_SIZE"]):
+        (removed_ids if is_deleted(d) else changed_ids).add(vector_id_for(d["_id"]))
+        stamp = (d.get("audit") or {}).get("updated_at")
+        if stamp and (new_watermark is None or stamp > new_watermark):
+            new_watermark = stamp
+    if prune:
+        current = np.array([vector_id_for(i) for i in fetch_all_ids()], dtype=np.int64)
+        removed_ids |= set(store.vector_ids[~np.isin(store.vector_ids, current)].tolist())
+    print(f"   {len(changed_ids)} changed, {len(removed_ids)} removed.")
+
+    stale = np.fromiter(removed_ids | changed_ids, dtype=np.int64)
+    # Kept rows stay in order and changed rows are appended to the last shard,
+    # mirroring what remove_ids/add_with_ids do to positions in the index.
+    kept_rows = np.flatnonzero(~np.isin(store.vector_ids, stale))
+    if len(stale):
+        for shard in shards:
+            shard.remove_ids(stale)
+    # Emptied shards hold no rows, so dropping them leaves positions unchanged;
+    # the last shard stays as the one new rows are appended to.
+    shards = [shard for shard in shards[:-1] if shard.ntotal] + shards[-1:]
+    indexer = ChunkIndexer(config["INDEX_SPEC"], config["TRAIN_SIZE"], config["TRUNCATE_DIM"],
+                           config["SHARD_SIZE"], shards=shards)
+    indexer.dim = int(dim)
+
+    def changed_chunks():
+        docs = fetch_updated_since(watermark, INDEX_PROJECTION, config["CHUNK_SIZE"])
+        for chunk in prefetch(chunkify(docs, config["CHUNK_SIZE"])):
+            # Documents edited after the first pass wait for the next run, so
+            # no vector id is ever added twice.
+            with span("build.flatten"):
+                records = [flatten_material(d) for d in chunk
+                           if not is_deleted(d) and vector_id_for(d["_id"]) in changed_ids]
+            inc("materials_indexed", len(records))
+            if not records:
+                continue
+            embeddings = embed_records(records, config, verbose=False)
+            indexer.add(embeddings, records)
+            if vectors:
+                vectors.append(embeddings)
+            print(f"   • {indexer.ntotal} materials indexed")
+            yield records
+
+    if changed_ids:
+        print("▶️  Generating embeddings...")
+    snapshot, version = new_snapshot(base_dir)
+    with (VectorWriter(snapshot) if config["RESCORE"] else nullcontext()) as vectors:
+        if vectors:
+            for rows in chunkify(kept_rows, config["CHUNK_SIZE"]):
+                vectors.append(old_vectors[rows])
+        store = write_metadata(itertools.chain(store.iter_records(kept_rows), changed_chunks()), snapshot)
+    print("▶️  Saving index and metadata...")
+    with span("build.save_index"):
+        save_shards(indexer.shards, snapshot)
+    fidx = FilterIndex.build(store)
+    with span("build.filter_index"):
+        save_filter_index(fidx, snapshot)
+    with span("build.color_index"):
+        save_color_index(ColorIndex.from_store(store), snapshot)
+    with span("build.lexical_index"):
+        save_lexical_index(LexicalIndex.build(store), snapshot)
+    partitions = write_partitions(config, indexer, fidx, store, snapshot)
+    write_manifest({
+        "embed_model": config["EMBED_MODEL"],
+        "embed_backend": split_model_id(config["EMBED_MODEL"])[0],
+        "index_spec": config["INDEX_SPEC"],
+        "search_params": manifest_search_params(config, manifest.get("search_params")),
+        "dim": int(dim),
+        "truncate_dim": config["TRUNCATE_DIM"],
+        "shard_size": config["SHARD_SIZE"],
+        "shards": len(indexer.shards),
+        "partitions": partitions,
+        "count": indexer.ntotal,
+        "watermark": new_watermark,
+    }, snapshot, version)
+    published = publish_snapshot(snapshot, base_dir)
+    print(f"✅  Incremental update complete: {indexer.ntotal} materials indexed in {published}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the FAISS materials index")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-embed materials updated since the last build's watermark")
+    parser.add_argument("--prune", action="store_true",
+                        help="with --incremental, also drop materials no longer in MongoDB")
+    parser.add_argument("--embed-backend", choices=["openai", "hashing", "transformer"],
+                        help="embedding backend for this build (recorded in the manifest and used for queries)")
+    parser.add_argument("--embed-model", help='model within the backend, e.g. "char3-5-512" for hashing')
+    parser.add_argument("--index-spec",
+                        help='FAISS index_factory string: "Flat", "IVF1024,Flat", "HNSW32", "IVF1024,PQ64", ...')
+    parser.add_argument("--nprobe", type=int, help="IVF lists probed per query")
+    parser.add_argument("--ef-search", type=int, help="HNSW search beam width")
+    parser.add_argument("--truncate-dim", type=int,
+                        help="index only the first N embedding dimensions (re-normalized)")
+    parser.add_argument("--shard-size", type=int,
+                        help="split the index into shards of N materials, searched in parallel")
+    parser.add_argument("--rescore", type=int,
+                        help="keep full-precision vectors.f32 and rescore N*k candidates from the index exactly")
+    parser.add_argument("--partition-fields",
+                        help='comma-separated fields to write per-value partition indexes for ("" for none)')
+    parser.add_argument("--partition-min-rows", type=int, help="smallest value that gets its own partition")
+    parser.add_argument("--verify", action="store_true",
+                        help="check the current snapshot's files against its manifest checksums, then exit")
+    parser.add_argument("--metrics", help="write stage timings and counters here (.prom for Prometheus text, else JSON)")
+    args = parser.parse_args()
+
+    if args.verify:
+        snapshot = current_snapshot()
+        problems = verify_snapshot(snapshot, deep=True)
+        for problem in problems:
+            print(f"   • {problem}")
+        print(f"{'❌' if problems else '✅'}  {snapshot}: {len(problems)} problem(s).")
+        raise SystemExit(1 if problems else 0)
+
+    config = load_env()
+    if args.embed_backend:
+        config["EMBED_MODEL"] = model_id(args.embed_backend, args.embed_model)
+    elif args.embed_model:
+        config["EMBED_MODEL"] = model_id(split_model_id(config["EMBED_MODEL"])[0], args.embed_model)
+    if args.index_spec:
+        config["INDEX_SPEC"] = args.index_spec
+    if args.nprobe:
+        config["SEARCH_PARAMS"]["nprobe"] = args.nprobe
+    if args.ef_search:
+        config["SEARCH_PARAMS"]["efSearch"] = args.ef_search
+    if args.truncate_dim is not None:
+        config["TRUNCATE_DIM"] = args.truncate_dim
+    if args.shard_size is not None:
+        config["SHARD_SIZE"] = args.shard_size
+    if args.rescore is not None:
+        config["RESCORE"] = args.rescore
+    if args.partition_fields is not None:
+        config["PARTITION_FIELDS"] = [f for f in args.partition_fields.split(",") if f]
+    if args.partition_min_rows is not None:
+        config["PARTITION_MIN_ROWS"] = args.partition_min_rows
+    with span("build.total", mode="incremental" if args.incremental else "full"):
+        if args.incremental:
+            incremental_build(config, prune=args.prune)
+        else:
+            full_build(config)
+    if args.metrics:
+        METRICS.dump(args.metrics)
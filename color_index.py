@@ -0,0 +1,229 @@
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+# CIEDE2000's lightness term alone bounds it from below: dE00 >= |dL| / S_L, and
+# S_L never exceeds ~1.7475 over L in [0, 100]. Radius queries under dE00 can
+# therefore prefilter on an L slab of this many times the radius.
+_DE2000_L_SLAB = 1.75
+
+LabLike = Union[str, Iterable[float]]
+
+
+def hex_to_lab(hexes) -> np.ndarray:
+    """
+    Converts one '#RRGGBB' / '#RGB' string (-> shape (3,)) or a list of them
+    (-> shape (n, 3)) from sRGB to CIE LAB (D65).
+    """
+    single = isinstance(hexes, str)
+    codes = [hexes] if single else list(hexes)
+    rgb = np.empty((len(codes), 3), dtype=np.float64)
+    for i, code in enumerate(codes):
+        h = code.lstrip("#")
+        if len(h) == 3:
+            h = "".join(c * 2 for c in h)
+        rgb[i] = [int(h[j:j + 2], 16) for j in (0, 2, 4)]
+    lab = srgb_to_lab(rgb)
+    return lab[0] if single else lab
+
+
+def srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """
+    Vectorized sRGB (0-255, shape (n, 3)) to CIE LAB (D65).
+    """
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    m = np.array([[0.4124564, 0.3575761, 0.1804375],
+                  [0.2126729, 0.7151522, 0.0721750],
+                  [0.0193339, 0.1191920, 0.9503041]])
+    xyz = c @ m.T / np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+def delta_e_76(lab1, lab2) -> np.ndarray:
+    """
+    Euclidean Delta-E between broadcastable (..., 3) LAB arrays.
+    """
+    diff = np.asarray(lab1, dtype=np.float64) - np.asarray(lab2, dtype=np.float64)
+    return np.sqrt(np.einsum("...i,...i->...", diff, diff))
+
+
+def delta_e_2000(lab1, lab2) -> np.ndarray:
+    """
+    CIEDE2000 Delta-E between broadcastable (..., 3) LAB arrays (kL = kC = kH = 1).
+    """
+    lab1 = np.asarray(lab1, dtype=np.float64)
+    lab2 = np.asarray(lab2, dtype=np.float64)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    c_bar7 = ((np.hypot(a1, b1) + np.hypot(a2, b2)) / 2) ** 7
+    g = 0.5 * (1 - np.sqrt(c_bar7 / (c_bar7 + 25.0 ** 7)))
+    a1p, a2p = (1 + g) * a1, (1 + g) * a2
+    c1p, c2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+    chroma_zero = (c1p * c2p) == 0
+
+    dLp = L2 - L1
+    dCp = c2p - c1p
+    dhp = h2p - h1p
+    dhp = np.where(dhp > 180, dhp - 360, np.where(dhp < -180, dhp + 360, dhp))
+    dhp = np.where(chroma_zero, 0.0, dhp)
+    dHp = 2 * np.sqrt(c1p * c2p) * np.sin(np.radians(dhp / 2))
+
+    L_bar = (L1 + L2) / 2
+    c_barp = (c1p + c2p) / 2
+    h_sum = h1p + h2p
+    h_barp = np.where(
+        chroma_zero, h_sum,
+        np.where(np.abs(h1p - h2p) <= 180, h_sum / 2,
+                 np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2)),
+    )
+    t = (1 - 0.17 * np.cos(np.radians(h_barp - 30)) + 0.24 * np.cos(np.radians(2 * h_barp))
+         + 0.32 * np.cos(np.radians(3 * h_barp + 6)) - 0.20 * np.cos(np.radians(4 * h_barp - 63)))
+    d_theta = 30 * np.exp(-(((h_barp - 275) / 25) ** 2))
+    c_barp7 = c_barp ** 7
+    r_c = 2 * np.sqrt(c_barp7 / (c_barp7 + 25.0 ** 7))
+    s_l = 1 + 0.015 * (L_bar - 50) ** 2 / np.sqrt(20 + (L_bar - 50) ** 2)
+    s_c = 1 + 0.045 * c_barp
+    s_h = 1 + 0.015 * c_barp * t
+    r_t = -np.sin(np.radians(2 * d_theta)) * r_c
+
+    tl, tc, th = dLp / s_l, dCp / s_c, dHp / s_h
+    return np.sqrt(np.maximum(tl ** 2 + tc ** 2 + th ** 2 + r_t * tc * th, 0.0))
+
+
+DELTA_E = {"76": delta_e_76, "2000": delta_e_2000}
+
+
+def _as_lab(color: LabLike) -> np.ndarray:
+    return hex_to_lab(color) if isinstance(color, str) else np.asarray(color, dtype=np.float64)
+
+
+class ColorIndex:
+    """
+    All catalog LAB values in one contiguous float32 matrix, bucketed into a
+    uniform grid of `cell`-sized cubes. Delta-E 76 queries visit only the cells
+    the query sphere touches; CIEDE2000 queries scan an L-sorted slab.
+    `rows` maps matrix positions back to metadata rows.
+    """
+
+    def __init__(self, labs: np.ndarray, rows: np.ndarray, cell: float = 8.0):
+        labs = np.asarray(labs, dtype=np.float32).reshape(-1, 3)
+        rows = np.asarray(rows, dtype=np.int64)
+        self.cell = float(cell)
+        keys = self._cell_keys(np.floor(labs / self.cell).astype(np.int64))
+        order = np.argsort(keys, kind="stable")
+        self.labs = np.ascontiguousarray(labs[order])
+        self.rows = rows[order]
+        self._keys, self._starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+        self._ends = self._starts + counts
+        self._l_order = np.argsort(self.labs[:, 0], kind="stable")
+        self._l_sorted = self.labs[self._l_order, 0]
+
+    @classmethod
+    def from_store(cls, store, cell: float = 8.0) -> "ColorIndex":
+        """
+        Builds from a MetadataStore's `lab` column (falling back to `hex`).
+        Rows without a usable color are left out.
+        """
+        labs, rows = [], []
+        hexes = store.values("hex") if "hex" in store.columns else [None] * len(store)
+        for row, (lab, hx) in enumerate(zip(store.values("lab"), hexes)):
+            if lab is not None and len(lab) == 3:
+                labs.append(lab)
+            elif hx and len(hx.lstrip("#")) in (3, 6):
+                try:
+                    labs.append(hex_to_lab(hx))
+                except ValueError:
+                    continue
+            else:
+                continue
+            rows.append(row)
+        return cls(np.asarray(labs, dtype=np.float32).reshape(-1, 3), np.asarray(rows, dtype=np.int64), cell)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @staticmethod
+    def _cell_keys(cells: np.ndarray) -> np.ndarray:
+        # LAB fits comfortably in +-2^20 cells per axis.
+        c = cells + (1 << 20)
+        return (c[..., 0] << 42) | (c[..., 1] << 21) | c[..., 2]
+
+    def _grid_candidates(self, lab: np.ndarray, radius: float) -> np.ndarray:
+        lo = np.floor((lab - radius) / self.cell).astype(np.int64)
+        hi = np.floor((lab + radius) / self.cell).astype(np.int64)
+        if np.prod(hi - lo + 1) > len(self._keys):
+            return np.arange(len(self.rows))
+        axes = [np.arange(lo[i], hi[i] + 1) for i in range(3)]
+        cells = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+        keys = self._cell_keys(cells)
+        pos = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        # An absent key lands on the next cell, which may be queried too; keep exact hits.
+        pos = pos[self._keys[pos] == keys]
+        if not len(pos):
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(self._starts[p], self._ends[p]) for p in pos])
+
+    def _slab_candidates(self, lab: np.ndarray, radius: float) -> np.ndarray:
+        lo = np.searchsorted(self._l_sorted, lab[0] - _DE2000_L_SLAB * radius, side="left")
+        hi = np.searchsorted(self._l_sorted, lab[0] + _DE2000_L_SLAB * radius, side="right")
+        return self._l_order[lo:hi]
+
+    def _within(self, lab: np.ndarray, max_delta_e: float, metric: str) -> Tuple[np.ndarray, np.ndarray]:
+        cand = self._grid_candidates(lab, max_delta_e) if metric == "76" else self._slab_candidates(lab, max_delta_e)
+        dist = DELTA_E[metric](self.labs[cand], lab)
+        keep = dist <= max_delta_e
+        cand, dist = cand[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return cand[order], dist[order]
+
+    def within(self, color: LabLike, max_delta_e: float, metric: str = "76") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        All materials within max_delta_e of color (hex or LAB).
+        Returns (rows, distances) sorted by distance.
+        """
+        pos, dist = self._within(_as_lab(color), max_delta_e, metric)
+        return self.rows[pos], dist
+
+    def nearest(self, color: LabLike, k: int = 10, metric: str = "76") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k materials closest to color (hex or LAB), nearest first.
+        Grows a Delta-E 76 radius query until it holds k hits. For CIEDE2000, the
+        worst dE00 among those k bounds the true k-th distance, so one dE00 radius
+        query at that bound is exact.
+        """
+        lab = _as_lab(color)
+        k = min(k, len(self))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        radius = self.cell
+        while True:
+            pos, dist = self._within(lab, radius, "76")
+            if len(pos) >= k or radius > 1000:
+                break
+            radius *= 2
+        if metric != "76":
+            bound = float(DELTA_E[metric](self.labs[pos[:k]], lab).max())
+            pos, dist = self._within(lab, bound, metric)
+        return self.rows[pos[:k]], dist[:k]
+
+    def match_palette(self, colors: List[LabLike], k: int = 5, max_delta_e: Optional[float] = None,
+                      metric: str = "76") -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Nearest (or within-threshold, if max_delta_e is given) matches per palette color.
+        """
+        if max_delta_e is None:
+            return [self.nearest(c, k, metric) for c in colors]
+        return [self.within(c, max_delta_e, metric) for c in colors]
+
+    def save(self, path: str):
+        np.savez(path, labs=self.labs, rows=self.rows, cell=np.float64(self.cell))
+
+    @classmethod
+    def load(cls, path: str) -> "ColorIndex":
+        data = np.load(path)
+        return cls(data["labs"], data["rows"], float(data["cell"]))
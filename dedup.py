@@ -0,0 +1,337 @@
+"""
+Near-duplicate detection without pairwise comparison.
+
+Candidate pairs come from two near-linear sources:
+  * MinHash signatures over normalized title / description shingles, bucketed
+    by LSH bands, verified by estimated Jaccard similarity;
+  * batched range search over the embeddings (inner product >= threshold),
+    through an IVF index once the catalog is too large for exact search.
+Pairs whose LAB colors differ by more than a Delta-E threshold are dropped,
+so one product line in different colors is not merged. Surviving pairs are
+joined into clusters with union-find.
+
+    python dedup.py                # dedup the built index, write duplicate_cluster back to Mongo
+    python dedup.py --dry-run      # report clusters only
+"""
+import os
+import re
+import zlib
+import argparse
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import faiss
+from dotenv import load_dotenv
+from pymongo import UpdateMany
+
+from color_index import delta_e_76
+from metrics import span, inc
+
+load_dotenv()
+
+DEDUP_JACCARD = float(os.getenv("DEDUP_JACCARD", "0.8"))
+DEDUP_COSINE = float(os.getenv("DEDUP_COSINE", "0.97"))
+DEDUP_DELTA_E = float(os.getenv("DEDUP_DELTA_E", "3.0"))
+DEDUP_FIELD = "duplicate_cluster"
+
+NUM_PERM = 64
+BANDS = 16
+# LSH buckets larger than this are boilerplate (e.g. an empty description) and are skipped.
+MAX_BUCKET = 200
+# Above this many vectors, range search goes through an IVF index instead of exact search.
+EXACT_RANGE_MAX = 10000
+RANGE_BATCH = 1024
+
+# Universal hashes (a * x + b) mod p; with p < 2^31 the products stay inside uint64.
+_PRIME = (1 << 31) - 1
+_perm_rng = np.random.default_rng(1)
+_PERM_A = _perm_rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_PERM_B = _perm_rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _perm_rng.integers(1, 1 << 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+
+
+def normalize_text(text) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9 ]", " ", str(text or "").lower())).strip()
+
+
+def shingles(title, description="") -> np.ndarray:
+    """
+    Hashed shingles: character 4-grams of the title (robust to typos and
+    spacing) and word bigrams of the description.
+    """
+    t = normalize_text(title)
+    words = normalize_text(description).split()
+    grams = {t[i:i + 4] for i in range(max(1, len(t) - 3))} if t else set()
+    grams |= {"\x00" + a + " " + b for a, b in zip(words, words[1:])}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) % _PRIME for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash_signatures(shingle_sets: List[np.ndarray], budget: int = 100000) -> np.ndarray:
+    """
+    (n, NUM_PERM) uint64 MinHash signatures, computed a batch of documents at a
+    time with one vectorized hash + segmented min per batch. Empty documents
+    get a signature that matches nothing.
+    """
+    n = len(shingle_sets)
+    sigs = np.full((n, NUM_PERM), np.iinfo(np.uint64).max, dtype=np.uint64)
+    start = 0
+    while start < n:
+        end, total = start, 0
+        while end < n and (end == start or total + len(shingle_sets[end]) <= budget):
+            total += len(shingle_sets[end])
+            end += 1
+        batch = shingle_sets[start:end]
+        sizes = np.array([len(s) for s in batch])
+        nonempty = np.flatnonzero(sizes)
+        if len(nonempty):
+            x = np.concatenate([batch[i] for i in nonempty])
+            h = (x[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) % _PRIME
+            offsets = np.concatenate([[0], np.cumsum(sizes[nonempty])[:-1]])
+            sigs[start + nonempty] = np.minimum.reduceat(h, offsets, axis=0)
+        start = end
+    return sigs
+
+
+def lsh_pairs(sigs: np.ndarray, bands: int = BANDS, max_bucket: int = MAX_BUCKET) -> np.ndarray:
+    """
+    Candidate pairs (i < j) that share at least one LSH band bucket.
+    """
+    n = len(sigs)
+    r = sigs.shape[1] // bands
+    empty = (sigs == np.iinfo(np.uint64).max).all(axis=1)
+    triu: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    found = []
+    for b in range(bands):
+        # One uint64 key per band (wrapping multiply-add); rare collisions only add candidates.
+        keys = (sigs[:, b * r:(b + 1) * r] * _BAND_MIX[:r]).sum(axis=1, dtype=np.uint64)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.concatenate([[0], np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1])
+        sizes = np.diff(np.append(starts, n))
+        # Most buckets hold one document; only visit the shared ones.
+        shared = (sizes >= 2) & (sizes <= max_bucket)
+        for start, size in zip(starts[shared], sizes[shared]):
+            group = np.sort(order[start:start + size])
+            if empty[group[0]]:
+                continue
+            if size not in triu:
+                triu[size] = np.triu_indices(size, 1)
+            x, y = triu[size]
+            found.append(group[x] * n + group[y])
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    codes = np.unique(np.concatenate(found).astype(np.int64))
+    return np.stack([codes // n, codes % n], axis=1)
+
+
+def text_pairs(titles: List, descriptions: List, threshold: float = DEDUP_JACCARD) -> np.ndarray:
+    with span("dedup.minhash"):
+        sigs = minhash_signatures([shingles(t, d) for t, d in zip(titles, descriptions)])
+    with span("dedup.lsh"):
+        pairs = lsh_pairs(sigs)
+    if not len(pairs):
+        return pairs
+    similarity = (sigs[pairs[:, 0]] == sigs[pairs[:, 1]]).mean(axis=1)
+    return pairs[similarity >= threshold]
+
+
+@span("dedup.range_search")
+def embedding_pairs(vectors: np.ndarray, threshold: float = DEDUP_COSINE, nprobe: int = 8) -> np.ndarray:
+    """
+    Pairs (i < j) of L2-normalized vectors with inner product >= threshold, by
+    batched range search: exact below EXACT_RANGE_MAX vectors, IVF above it.
+    """
+    x = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = x.shape
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    if n <= EXACT_RANGE_MAX:
+        index = faiss.IndexFlatIP(d)
+    else:
+        nlist = int(np.sqrt(n))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatIP(d), d, nlist, faiss.METRIC_INNER_PRODUCT)
+        sample = x[np.random.default_rng(0).choice(n, min(n, 64 * nlist), replace=False)]
+        index.train(sample)
+        index.nprobe = nprobe
+    index.add(x)
+    found = []
+    for start in range(0, n, RANGE_BATCH):
+        lims, _, ids = index.range_search(x[start:start + RANGE_BATCH], threshold)
+        queries = np.repeat(np.arange(start, start + len(lims) - 1), np.diff(lims.astype(np.int64)))
+        keep = queries < ids
+        found.append(np.stack([queries[keep], ids[keep]], axis=1))
+    return np.unique(np.concatenate(found), axis=0) if found else np.empty((0, 2), dtype=np.int64)
+
+
+def color_compatible(pairs: np.ndarray, labs: Optional[np.ndarray], max_delta_e: float = DEDUP_DELTA_E) -> np.ndarray:
+    """
+    Drops pairs whose colors are both known and further apart than max_delta_e.
+    `labs` is (n, 3) with NaN rows for unknown colors.
+    """
+    if labs is None or not len(pairs):
+        return pairs
+    a, b = labs[pairs[:, 0]], labs[pairs[:, 1]]
+    known = ~(np.isnan(a).any(axis=1) | np.isnan(b).any(axis=1))
+    ok = ~known
+    ok[known] = delta_e_76(a[known], b[known]) <= max_delta_e
+    return pairs[ok]
+
+
+def cluster_labels(n: int, pairs: np.ndarray) -> np.ndarray:
+    """
+    Union-find over pairs. Returns per-row labels: the smallest row of the
+    row's cluster, or -1 for rows with no duplicate.
+    """
+    parent = list(range(n))
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    for i, j in pairs:
+        ri, rj = find(int(i)), find(int(j))
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    labels = np.array([find(i) for i in range(n)])
+    sizes = np.bincount(labels, minlength=n)
+    labels[sizes[labels] < 2] = -1
+    return labels
+
+
+def find_duplicates(titles: List, descriptions: List, vectors: Optional[np.ndarray] = None,
+                    labs: Optional[np.ndarray] = None, jaccard: float = DEDUP_JACCARD,
+                    cosine: float = DEDUP_COSINE, max_delta_e: float = DEDUP_DELTA_E) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    Cluster labels per row (see cluster_labels) and pair counts per source.
+    """
+    n = len(titles)
+    by_text = text_pairs(titles, descriptions, jaccard)
+    by_vector = embedding_pairs(vectors, cosine) if vectors is not None else np.empty((0, 2), dtype=np.int64)
+    candidates = np.unique(np.concatenate([by_text, by_vector]), axis=0)
+    confirmed = color_compatible(candidates, labs, max_delta_e)
+    labels = cluster_labels(n, confirmed)
+    counts = {
+        "text_pairs": len(by_text),
+        "embedding_pairs": len(by_vector),
+        "color_rejected": len(candidates) - len(confirmed),
+        "clusters": len(np.unique(labels[labels >= 0])),
+        "duplicates": int((labels >= 0).sum()),
+    }
+    inc("dedup_clusters", counts["clusters"])
+    return labels, counts
+
+
+def cluster_keys(ids: List, labels: np.ndarray) -> Dict:
+    """
+    {_id: cluster key} for clustered rows. A cluster's key is the string form
+    of its smallest member _id, so keys are stable across runs.
+    """
+    members: Dict[int, List] = {}
+    for i, label in enumerate(labels):
+        if label >= 0:
+            members.setdefault(int(label), []).append(ids[i])
+    keys = {}
+    for group in members.values():
+        key = str(min(group, key=str))
+        keys.update({_id: key for _id in group})
+    return keys
+
+
+def write_clusters(col, ids: List, keys: Dict, chunk_size: int = 1000) -> int:
+    """
+    Clears DEDUP_FIELD on `ids`, then sets it to the cluster key on clustered
+    documents, one UpdateMany per cluster. Returns the number of documents flagged.
+    """
+    for start in range(0, len(ids), chunk_size):
+        col.update_many({"_id": {"$in": ids[start:start + chunk_size]}, DEDUP_FIELD: {"$exists": True}},
+                        {"$unset": {DEDUP_FIELD: ""}})
+    by_key: Dict[str, List] = {}
+    for _id, key in keys.items():
+        by_key.setdefault(key, []).append(_id)
+    ops = [UpdateMany({"_id": {"$in": members}}, {"$set": {DEDUP_FIELD: key}}) for key, members in by_key.items()]
+    for start in range(0, len(ops), chunk_size):
+        col.bulk_write(ops[start:start + chunk_size], ordered=False)
+    return len(keys)
+
+
+def _labs(values: Iterable) -> np.ndarray:
+    labs = [v if isinstance(v, (list, tuple)) and len(v) == 3 else [np.nan] * 3 for v in values]
+    return np.array(labs, dtype=np.float64).reshape(-1, 3)
+
+
+def dedup_collection(col, query: Optional[Dict] = None, embed_fn=None, **thresholds) -> Tuple[List, Dict, Dict[str, int]]:
+    """
+    Dedups the documents matching `query` from their title, description and
+    (if present) color.lab; with `embed_fn` (texts -> normalized vectors) the
+    title + description text is embedded and range-searched as well.
+    Returns (scanned _ids, {_id: cluster key}, counts); nothing is written.
+    """
+    docs = list(col.find(query or {}, {"title": 1, "description": 1, "color.lab": 1}))
+    ids = [d["_id"] for d in docs]
+    titles = [d.get("title", "") for d in docs]
+    descriptions = [d.get("description", "") for d in docs]
+    vectors = embed_fn([f"{t} || {s}" for t, s in zip(titles, descriptions)]) if (embed_fn and docs) else None
+    labels, counts = find_duplicates(titles, descriptions, vectors, _labs((d.get("color") or {}).get("lab") for d in docs),
+                                     **thresholds)
+    return ids, cluster_keys(ids, labels), counts
+
+
+def index_vectors(index: Union[faiss.Index, List[faiss.Index]]) -> np.ndarray:
+    """
+    All vectors of a built index (or its shards, in order), in metadata row order.
+    """
+    if isinstance(index, list):
+        return np.vstack([index_vectors(shard) for shard in index])
+    base = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return base.reconstruct_n(0, base.ntotal)
+
+
+def dedup_index(base_dir: Optional[str] = None, **thresholds) -> Tuple[List[str], Dict, Dict[str, int]]:
+    """
+    Dedups the built index: metadata titles / descriptions / LAB and the stored
+    embeddings. Returns (mongo ids in row order, {mongo id: cluster key}, counts).
+    """
+    from index_store import INDEX_DIR, current_snapshot, load_shards, load_metadata, load_vectors, read_manifest
+
+    base_dir = current_snapshot(base_dir or INDEX_DIR)
+    store = load_metadata(base_dir)
+    manifest = read_manifest(base_dir) or {}
+    # Prefer the full-precision vectors over a compressed or truncated index.
+    vectors = load_vectors(manifest.get("dim"), base_dir)
+    if vectors is None or len(vectors) != len(store):
+        vectors = index_vectors(load_shards(base_dir, manifest))
+    ids = store.values("mongo_id")
+    labels, counts = find_duplicates(store.values("title"), store.values("description"), vectors,
+                                     _labs(store.values("lab")), **thresholds)
+    return ids, cluster_keys(ids, labels), counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate materials in the built index")
+    parser.add_argument("--jaccard", type=float, default=DEDUP_JACCARD, help="min estimated title/description Jaccard")
+    parser.add_argument("--cosine", type=float, default=DEDUP_COSINE, help="min embedding inner product")
+    parser.add_argument("--delta-e", type=float, default=DEDUP_DELTA_E, help="max LAB Delta-E 76 within a cluster")
+    parser.add_argument("--dry-run", action="store_true", help="report clusters without writing them to MongoDB")
+    args = parser.parse_args()
+
+    print("▶️  Finding near-duplicates in the index...")
+    ids, keys, counts = dedup_index(jaccard=args.jaccard, cosine=args.cosine, max_delta_e=args.delta_e)
+    print(f"   {counts['text_pairs']} text pairs, {counts['embedding_pairs']} embedding pairs, "
+          f"{counts['color_rejected']} rejected by color.")
+    print(f"   {counts['clusters']} clusters covering {counts['duplicates']} materials.")
+    if not args.dry_run:
+        from bson import ObjectId
+        from api.query_engine import coll
+
+        def as_id(s):
+            return ObjectId(s) if ObjectId.is_valid(s) else s
+
+        flagged = write_clusters(coll, [as_id(i) for i in ids], {as_id(i): k for i, k in keys.items()})
+        print(f"✅  Wrote {DEDUP_FIELD} on {flagged} materials.")
@@ -0,0 +1,219 @@
+"""
+Embedding backends, selected by a backend-qualified model id:
+
+    text-embedding-3-small             OpenAI API (an unqualified id is always OpenAI)
+    hashing:char3-5-512                hashed character 3- to 5-grams, 512 dims, local CPU
+    transformer:<path or model name>   sentence-transformers model on local disk, optional
+
+The id is what the index manifest records as "embed_model" and what the
+embedding cache is keyed by, so a query is always embedded by the backend
+that built the index it searches. EMBED_BACKEND picks the backend for new
+builds and EMBED_MODEL the model within it.
+"""
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_MODELS = {
+    "openai": "text-embedding-3-small",
+    "hashing": "char3-5-512",
+    "transformer": "sentence-transformers/all-MiniLM-L6-v2",
+}
+EMBED_LOCAL_THREADS = int(os.getenv("EMBED_LOCAL_THREADS", str(os.cpu_count() or 1)))
+EMBED_LOCAL_BATCH = int(os.getenv("EMBED_LOCAL_BATCH", "256"))
+
+
+def model_id(backend: str, model: Optional[str] = None) -> str:
+    """
+    Backend-qualified id for a model; OpenAI ids stay unqualified, as older manifests and caches have them.
+    """
+    if backend not in DEFAULT_MODELS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(DEFAULT_MODELS)}")
+    model = model or DEFAULT_MODELS[backend]
+    if backend == "openai" or model.startswith(f"{backend}:"):
+        return model
+    return f"{backend}:{model}"
+
+
+def split_model_id(model: str):
+    """
+    (backend, model) for a model id.
+    """
+    backend, sep, name = model.partition(":")
+    if sep and backend in DEFAULT_MODELS:
+        return backend, name
+    return "openai", model
+
+
+def _unit_rows(vecs: np.ndarray) -> np.ndarray:
+    vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+    return vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+
+
+class EmbeddingBackend(ABC):
+    """
+    Maps a list of texts to an (n, dim) float32 matrix of unit rows, in input order.
+    `remote` backends are rate limited and cached; local ones are cheaper to
+    recompute than to look up.
+    """
+
+    name = ""
+    remote = False
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def model_id(self) -> str:
+        return model_id(self.name, self.model)
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        (len(texts), dim) float32 unit rows, in input order.
+        """
+
+
+class OpenAIBackend(EmbeddingBackend):
+    name = "openai"
+    remote = True
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        resp = openai.embeddings.create(model=self.model, input=list(texts))
+        return _unit_rows(np.array([d.embedding for d in sorted(resp.data, key=lambda d: d.index)], dtype=np.float32))
+
+
+class LocalBackend(EmbeddingBackend):
+    """
+    Splits large inputs into EMBED_LOCAL_BATCH-text batches embedded on a
+    shared thread pool; a query or two is embedded inline.
+    """
+
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    @classmethod
+    def pool(cls) -> ThreadPoolExecutor:
+        with LocalBackend._pool_lock:
+            if LocalBackend._pool is None:
+                LocalBackend._pool = ThreadPoolExecutor(max_workers=EMBED_LOCAL_THREADS, thread_name_prefix="embed")
+            return LocalBackend._pool
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        texts = list(texts)
+        if len(texts) <= EMBED_LOCAL_BATCH or EMBED_LOCAL_THREADS <= 1:
+            return self._embed(texts)
+        batches = [texts[i:i + EMBED_LOCAL_BATCH] for i in range(0, len(texts), EMBED_LOCAL_BATCH)]
+        return np.vstack(list(self.pool().map(self._embed, batches)))
+
+    @abstractmethod
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeds one batch on the calling thread.
+        """
+
+
+# Multipliers for the rolling n-gram hash and the final mix (splitmix64).
+_HASH_BASE = np.uint64(0x100000001B3)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+class HashingBackend(LocalBackend):
+    """
+    Signed feature hashing of lowercased character n-grams (bytes of the
+    UTF-8 text padded with spaces) into `dim` buckets. Fully vectorized over
+    the batch: no model files, no network, microseconds per query. It matches
+    on spelling rather than meaning, so it suits catalogs searched by names,
+    colors and product terms.
+    """
+
+    name = "hashing"
+
+    def __init__(self, model: str = DEFAULT_MODELS["hashing"]):
+        super().__init__(model)
+        m = re.fullmatch(r"char(\d+)-(\d+)-(\d+)", model)
+        if not m:
+            raise ValueError(f"Hashing model {model!r} should look like char3-5-512 (n-gram sizes, dimensions)")
+        self.n_min, self.n_max, self.dim = (int(g) for g in m.groups())
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        encoded = [f" {' '.join(str(t).lower().split())} ".encode("utf-8") for t in texts]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        doc = np.repeat(np.arange(len(encoded), dtype=np.int64), lengths)
+        out = np.zeros(len(encoded) * self.dim, dtype=np.float64)
+        for n in range(self.n_min, self.n_max + 1):
+            m = len(data) - n + 1
+            if m <= 0:
+                continue
+            h = np.full(m, n, dtype=np.uint64)
+            for j in range(n):
+                h = h * _HASH_BASE + data[j:j + m]
+            # Only windows that start and end in the same text.
+            inside = doc[:m] == doc[n - 1:n - 1 + m]
+            h, owner = h[inside], doc[:m][inside]
+            h = (h ^ (h >> np.uint64(30))) * _MIX_1
+            h = (h ^ (h >> np.uint64(27))) * _MIX_2
+            h ^= h >> np.uint64(31)
+            sign = np.where((h >> np.uint64(63)).astype(bool), -1.0, 1.0)
+            bucket = (h % np.uint64(self.dim)).astype(np.int64)
+            out += np.bincount(owner * self.dim + bucket, weights=sign, minlength=len(out))
+        return _unit_rows(out.reshape(len(encoded), self.dim))
+
+
+class TransformerBackend(LocalBackend):
+    """
+    A sentence-transformers model from a local path (or the Hugging Face cache),
+    run on CPU. Needs the optional sentence-transformers package.
+    """
+
+    name = "transformer"
+
+    def __init__(self, model: str = DEFAULT_MODELS["transformer"]):
+        super().__init__(model)
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("The transformer embedding backend needs sentence-transformers: "
+                              "pip install sentence-transformers") from e
+        self._model = SentenceTransformer(model, device="cpu")
+        self._lock = threading.Lock()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        # The model isn't safe to call from several threads at once; torch parallelizes each call itself.
+        with self._lock:
+            vecs = self._model.encode(texts, batch_size=EMBED_LOCAL_BATCH, convert_to_numpy=True,
+                                      normalize_embeddings=True, show_progress_bar=False)
+        return _unit_rows(vecs)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self._embed(list(texts))
+
+
+BACKENDS = {cls.name: cls for cls in (OpenAIBackend, HashingBackend, TransformerBackend)}
+
+_backends: Dict[str, EmbeddingBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(model: str) -> EmbeddingBackend:
+    """
+    The (process-wide, lazily created) backend for a model id.
+    """
+    with _backends_lock:
+        backend = _backends.get(model)
+        if backend is None:
+            name, inner = split_model_id(model)
+            backend = _backends[model] = BACKENDS[name](inner)
+        return backend
+
@@ -0,0 +1,129 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from embeddings.backends import get_backend
+from embeddings.embedder import fetch_embeddings, EMBED_MODEL
+from embeddings.cache import EmbeddingCache, get_cache
+
+load_dotenv()
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "200"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_RPS = float(os.getenv("EMBED_RPS", "5"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Refills at `rate` tokens/sec up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """
+        Blocks until `tokens` are available, then consumes them.
+        """
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _with_retries(fn: Callable, max_retries: int, backoff: float):
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            delay = backoff * (2 ** (attempt - 1)) * (1 + random.random())
+            print(f"   ⚠️  Embedding batch failed ({e.__class__.__name__}: {e}); retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def embed_texts(
+    texts: List[str],
+    model: str = EMBED_MODEL,
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_workers: int = EMBED_CONCURRENCY,
+    requests_per_sec: float = EMBED_RPS,
+    max_retries: int = EMBED_MAX_RETRIES,
+    backoff: float = 1.0,
+    embed_fn: Callable[[List[str], str], np.ndarray] = None,
+    cache: Optional[EmbeddingCache] = None,
+    verbose: bool = True,
+) -> np.ndarray:
+    """
+    Embeds texts in batches of `batch_size`, with up to `max_workers` requests in
+    flight, rate limited by a token bucket and retried with exponential backoff.
+    Texts found in the embedding cache are not re-sent; fresh vectors are written
+    back per batch. Returns an (n, dim) float32 matrix in input order.
+    """
+    if embed_fn is None and not get_backend(model).remote:
+        # Local backends are cheaper to run than to look up, and need no rate limit.
+        cache, requests_per_sec = None, 0
+    else:
+        cache = cache or get_cache()
+    embed_fn = embed_fn or (lambda batch, m: fetch_embeddings(batch, model=m))
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    start = time.perf_counter()
+    found = cache.get_many(model, texts) if cache else {}
+    missing = list(dict.fromkeys(t for t in texts if t not in found))
+    if verbose and cache:
+        print(f"   Embedding cache: {len(found)} cached, {len(missing)} to embed")
+
+    bucket = TokenBucket(requests_per_sec)
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+
+    def run(batch):
+        def call():
+            bucket.acquire()
+            return embed_fn(batch, model)
+        vecs = _with_retries(call, max_retries, backoff)
+        if cache:
+            cache.put_many(model, batch, vecs)
+        return vecs
+
+    done = completed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(run, b): i for i, b in enumerate(batches)}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            found.update(zip(batches[i], fut.result()))
+            done += len(batches[i])
+            completed += 1
+            # Batches finish out of order, so count completions rather than batch positions.
+            if verbose and (len(batches) < 10 or completed % 5 == 0 or completed == len(batches)):
+                elapsed = time.perf_counter() - start
+                print(f"   • {done}/{len(missing)} texts embedded ({done / max(elapsed, 1e-9):.1f} texts/sec)")
+
+    elapsed = time.perf_counter() - start
+    if verbose:
+        print(f"   Embedded {len(texts)} texts in {elapsed:.1f}s ({len(texts) / max(elapsed, 1e-9):.1f} texts/sec)")
+    return np.stack([found[t] for t in texts]).astype(np.float32, copy=False)
@@ -0,0 +1,130 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from metrics import inc
+
+load_dotenv()
+
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", ".embedding_cache.sqlite")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "500000"))
+
+_SQLITE_MAX_VARS = 900
+
+
+def cache_key(model: str, text: str) -> str:
+    """
+    Content address for an embedding: sha256 of (model, text).
+    """
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed (SQLite) embedding cache keyed by cache_key(model, text).
+    Least-recently-used entries are evicted once max_entries is exceeded.
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, model TEXT, dim INTEGER, vec BLOB, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+
+    def get_many(self, model: str, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Looks up texts; returns {text: vector} for the ones that are cached.
+        """
+        by_key = {cache_key(model, t): t for t in texts}
+        found = {}
+        keys = list(by_key)
+        with self._lock:
+            for i in range(0, len(keys), _SQLITE_MAX_VARS):
+                chunk = keys[i:i + _SQLITE_MAX_VARS]
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[by_key[key]] = np.frombuffer(blob, dtype=np.float32).copy()
+                if rows:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k, _ in rows]
+                    )
+            self.hits += len(found)
+            self.misses += len(by_key) - len(found)
+            inc("embedding_cache_lookups", len(found), result="hit")
+            inc("embedding_cache_lookups", len(by_key) - len(found), result="miss")
+        return found
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        return self.get_many(model, [text]).get(text)
+
+    def put_many(self, model: str, texts: List[str], vectors: np.ndarray):
+        """
+        Stores one vector per text, then evicts down to max_entries.
+        """
+        now = time.time()
+        rows = [
+            (cache_key(model, t), model, int(v.shape[0]), np.ascontiguousarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+            self._evict()
+
+    def _evict(self):
+        if not self.max_entries:
+            return
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+            )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache() -> Optional[EmbeddingCache]:
+    """
+    Process-wide cache at EMBED_CACHE_PATH; None when EMBED_CACHE_PATH is empty.
+    """
+    global _default_cache
+    if not EMBED_CACHE_PATH:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
@@ -1,18 +1,49 @@
 import openai
 import numpy as np
 import os
+from typing import List
 from dotenv import load_dotenv
 
+from embeddings.backends import get_backend, model_id
+from embeddings.cache import get_cache
+from metrics import span, inc
+
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
+# Backend-qualified model id (see embeddings/backends.py) for new builds.
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "openai")
+EMBED_MODEL = model_id(EMBED_BACKEND, os.getenv("EMBED_MODEL"))
 
 def get_embedding(text: str, model: str = EMBED_MODEL) -> np.ndarray:
     """
     Returns an L2-normalized embedding for a given input text.
     """
-    resp = openai.embeddings.create(model=model, input=[text])
-    vec = np.array(resp.data[0].embedding, dtype=np.float32)
-    normed = vec / np.linalg.norm(vec)
-    return normed
+    return get_embeddings([text], model=model)[0]
+
+def get_embeddings(texts: List[str], model: str = EMBED_MODEL) -> np.ndarray:
+    """
+    Returns an (n, dim) matrix of L2-normalized embeddings, in input order.
+    Texts already in the embedding cache are not sent to the API; local
+    backends skip the cache, since computing is cheaper than the lookup.
+    """
+    texts = list(texts)
+    cache = get_cache() if get_backend(model).remote else None
+    found = cache.get_many(model, texts) if cache else {}
+    missing = list(dict.fromkeys(t for t in texts if t not in found))
+    if missing:
+        fresh = fetch_embeddings(missing, model=model)
+        if cache:
+            cache.put_many(model, missing, fresh)
+        found.update(zip(missing, fresh))
+    return np.stack([found[t] for t in texts])
+
+def fetch_embeddings(texts: List[str], model: str = EMBED_MODEL) -> np.ndarray:
+    """
+    Embeds a list of texts in a single call to the model's backend, bypassing the cache.
+    """
+    backend = get_backend(model)
+    inc("embedding_calls", backend=backend.name)
+    inc("embedded_texts", len(texts), backend=backend.name)
+    with span("embed.api" if backend.remote else "embed.local"):
+        return backend.embed(list(texts))
@@ -0,0 +1,91 @@
+"""
+Local stand-in for the OpenAI embeddings endpoint, for exercising the build
+pipeline offline:
+
+    python -m embeddings.fake_server --port 8001 --fail-rate 0.1
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake python build_index.py
+
+Vectors are deterministic per (model, text), so repeated runs are comparable.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_vector(text: str, model: str = "", dim: int = 1536) -> np.ndarray:
+    """
+    Deterministic unit vector seeded from a hash of (model, text).
+    """
+    seed = int.from_bytes(hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def make_handler(dim: int, latency: float, fail_rate: float, fail_first: int = 0):
+    failures = {"left": fail_first}
+    lock = threading.Lock()
+
+    def inject_failure() -> bool:
+        with lock:
+            if failures["left"] > 0:
+                failures["left"] -= 1
+                return True
+        return bool(fail_rate) and random.random() < fail_rate
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/embeddings"):
+                return self._reply(404, {"error": {"message": "not found"}})
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if latency:
+                time.sleep(latency)
+            if inject_failure():
+                return self._reply(503, {"error": {"message": "injected failure", "type": "server_error"}})
+            inputs = body.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            model = body.get("model", "")
+            data = [
+                {"object": "embedding", "index": i, "embedding": fake_vector(t, model, dim).tolist()}
+                for i, t in enumerate(inputs)
+            ]
+            self._reply(200, {
+                "object": "list",
+                "data": data,
+                "model": model,
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            })
+
+        def _reply(self, status, payload):
+            raw = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI embeddings server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added per request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N requests with 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                 make_handler(args.dim, args.latency, args.fail_rate, args.fail_first))
+    print(f"▶️  Fake embeddings server on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
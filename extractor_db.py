@@ -0,0 +1,229 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from metrics import span, inc
+from utils import generate_hint, calculate_profile_strength
+
+REFERENCE_TTL_SECONDS = 300
+PAGE_SIZE = 10
+PAGE_CACHE_SIZE = 8
+
+# Only the fields the review table needs.
+PREVIEW_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "material_category_id": 1,
+    "material_brand_id": 1,
+    "material_brand_style_id": 1,
+    "segment": 1,
+    "style": 1,
+    "duplicate_cluster": 1,
+}
+
+
+def safe_slugify(value):
+    try:
+        return re.sub(r"[^a-z0-9-]", "-", str(value).lower().replace(" ", "-")).strip("-")
+    except Exception:
+        return "untitled"
+
+
+class ReferenceMaps:
+    """
+    In-memory id <-> title maps for categories, brands and styles, plus the
+    segment name -> short code map. Each collection is read in one query and
+    re-read once the maps are older than `ttl` seconds (or on refresh()).
+    """
+
+    def __init__(self, db, ttl: float = REFERENCE_TTL_SECONDS):
+        self.db = db
+        self.ttl = ttl
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.category_titles: Dict = {}
+        self.brand_titles: Dict = {}
+        self.style_titles: Dict = {}
+        self.category_ids: Dict[str, object] = {}
+        self.brand_ids: Dict[str, object] = {}
+        self.style_ids: Dict[str, object] = {}
+        self.segment_map: Dict[str, str] = {}
+
+    @staticmethod
+    def _load(col):
+        titles, ids = {}, {}
+        for doc in col.find({}, {"title": 1}):
+            titles[doc["_id"]] = doc.get("title", "")
+            ids.setdefault(doc.get("title", ""), doc["_id"])
+        return titles, ids
+
+    def refresh(self):
+        with self._lock:
+            self.category_titles, self.category_ids = self._load(self.db.material_categories)
+            self.brand_titles, self.brand_ids = self._load(self.db.material_brands)
+            self.style_titles, self.style_ids = self._load(self.db.material_brand_styles)
+            self.segment_map = {s["name"]: s["short_code"] for s in self.db.segments.find({}, {"name": 1, "short_code": 1})}
+            self._loaded_at = time.monotonic()
+
+    def current(self) -> "ReferenceMaps":
+        if time.monotonic() - self._loaded_at > self.ttl:
+            self.refresh()
+        return self
+
+    @property
+    def categories(self) -> List[str]:
+        return sorted(self.current().category_ids)
+
+    @property
+    def brands(self) -> List[str]:
+        return sorted(self.current().brand_ids)
+
+    @property
+    def styles(self) -> List[str]:
+        return sorted(self.current().style_ids)
+
+    @property
+    def segment_names(self) -> List[str]:
+        return list(self.current().segment_map)
+
+
+def build_preview_query(refs: ReferenceMaps, cat: str = "All", brand: str = "All",
+                        style: str = "All", seg: str = "All") -> Dict:
+    """
+    Mongo filter for pending materials matching the sidebar selections.
+    """
+    refs = refs.current()
+    q = {"extracted": {"$ne": True}}
+    if cat != "All" and cat in refs.category_ids:
+        q["material_category_id"] = refs.category_ids[cat]
+    if brand != "All" and brand in refs.brand_ids:
+        q["material_brand_id"] = refs.brand_ids[brand]
+    if style != "All" and style in refs.style_ids:
+        q["material_brand_style_id"] = refs.style_ids[style]
+    if seg != "All":
+        q["segment"] = {"$in": [seg]}
+    return q
+
+
+def preview_row(mat: Dict, refs: ReferenceMaps) -> Dict:
+    """
+    Review-table row for one raw material, with reference titles resolved from refs.
+    """
+    row_data = {
+        "_id": str(mat["_id"]),
+        "title": mat.get("title"),
+        "slug": safe_slugify(mat.get("title")),
+        "material_category_name": refs.category_titles.get(mat.get("material_category_id"), ""),
+        "material_brand_name": refs.brand_titles.get(mat.get("material_brand_id"), ""),
+        "material_style_name": refs.style_titles.get(mat.get("material_brand_style_id"), ""),
+        "finish": "Default",
+        "description": mat.get("description", ""),
+        "color_hex": "#FFFFFF",
+        "segment_types": [refs.segment_map.get(s, s) for s in mat.get("segment", [])],
+        "tags": mat.get("style", []),
+        "duplicate_cluster": mat.get("duplicate_cluster", ""),
+        "original_id": mat["_id"],
+        "transfer": True
+    }
+    row_data["profile_strength"] = calculate_profile_strength(row_data)
+    row_data["hints"] = generate_hint(row_data)
+    return row_data
+
+
+class PreviewPager:
+    """
+    Keyset (_id) pagination over the materials matching a preview query.
+
+    Only the requested page is read (one projected, _id-sorted query starting
+    after the previous page's last _id) and enriched; the next page is
+    prefetched on a background thread and the last `cache_pages` pages are
+    kept in an LRU, so paging costs the same at page 1 and page 10,000.
+    """
+
+    def __init__(self, materials_col, refs: ReferenceMaps, q: Dict,
+                 page_size: int = PAGE_SIZE, cache_pages: int = PAGE_CACHE_SIZE):
+        self.col = materials_col
+        self.refs = refs
+        self.q = q
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview-prefetch")
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets pages, boundaries and the count, e.g. after rows were transferred.
+        """
+        with self._lock:
+            # _bounds[n] is the last _id before page n (None: page 0 starts at the beginning).
+            self._bounds: List = [None]
+            self._cache: "OrderedDict[int, List[Dict]]" = OrderedDict()
+            self._prefetch: Dict[int, Future] = {}
+            self._total: Optional[int] = None
+
+    @property
+    def total(self) -> int:
+        if self._total is None:
+            self._total = self.col.count_documents(self.q)
+        return self._total
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-self.total // self.page_size))
+
+    def _fetch(self, after) -> List[Dict]:
+        q = self.q if after is None else {**self.q, "_id": {"$gt": after}}
+        docs = self.col.find(q, PREVIEW_PROJECTION).sort("_id", 1).limit(self.page_size)
+        refs = self.refs.current()
+        return [preview_row(mat, refs) for mat in docs]
+
+    def _after(self, n: int):
+        """
+        (found, last _id before page n). Unknown boundaries are found by walking
+        _ids only, from the furthest boundary already known.
+        """
+        missing = n + 1 - len(self._bounds)
+        if missing > 0:
+            last = self._bounds[-1]
+            q = self.q if last is None else {**self.q, "_id": {"$gt": last}}
+            ids = [d["_id"] for d in self.col.find(q, {"_id": 1}).sort("_id", 1).limit(missing * self.page_size)]
+            self._bounds.extend(ids[self.page_size - 1::self.page_size])
+        if n >= len(self._bounds):
+            return False, None
+        return True, self._bounds[n]
+
+    def page(self, n: int) -> List[Dict]:
+        """
+        Rows of page n (0-based); empty past the end.
+        """
+        with span("extractor.page"):
+            with self._lock:
+                rows = self._cache.get(n)
+                if rows is not None:
+                    self._cache.move_to_end(n)
+                future = self._prefetch.pop(n, None)
+            if rows is not None:
+                inc("preview_pages", result="cached")
+            elif future is not None:
+                rows = future.result()
+                inc("preview_pages", result="prefetched")
+            else:
+                found, after = self._after(n)
+                rows = self._fetch(after) if found else []
+                inc("preview_pages", result="fetched")
+
+            with self._lock:
+                self._cache[n] = rows
+                self._cache.move_to_end(n)
+                while len(self._cache) > self.cache_pages:
+                    self._cache.popitem(last=False)
+                if len(rows) == self.page_size:
+                    if len(self._bounds) == n + 1:
+                        self._bounds.append(rows[-1]["original_id"])
+                    if n + 1 not in self._cache and n + 1 not in self._prefetch:
+                        self._prefetch[n + 1] = self._pool.submit(self._fetch, rows[-1]["original_id"])
+            return rows
@@ -0,0 +1,156 @@
+import pickle
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Metadata columns that get posting lists; list-valued columns index each element.
+FILTER_FIELDS = [
+    "family_name",
+    "finish",
+    "material_category_name",
+    "material_brand_name",
+    "material_style_name",
+    "primary_undertone",
+    "secondary_undertone",
+    "coating_type",
+    "segment_types",
+    "tags",
+    "certifications",
+    "recommended_substrates",
+    "region_availability",
+]
+
+
+# Bits set per byte value; np.bitwise_count needs NumPy 2.
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits: np.ndarray) -> int:
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(bits).sum(dtype=np.int64))
+    return int(_POPCOUNT8[bits].sum(dtype=np.int64))
+
+
+def _is_bitmap(posting: np.ndarray) -> bool:
+    return posting.dtype == np.uint8
+
+
+class FilterIndex:
+    """
+    Per-field posting lists: {field: {value: posting}} over metadata rows.
+    Rows are metadata positions, which line up with positions in the vector index.
+
+    Each posting is stored in whichever form is smaller: a sorted int32 row
+    array for rare values, or a little-endian packed bitmap (uint8, one bit per
+    row) once a value covers more than 1/32 of the rows. Filters combine as
+    packed bitmaps, and facet counts are popcounts over them.
+    """
+
+    def __init__(self, num_rows: int, postings: Dict[str, Dict[object, np.ndarray]]):
+        self.num_rows = num_rows
+        self.postings = postings
+        self.sizes = {field: {v: (popcount(p) if _is_bitmap(p) else len(p)) for v, p in values.items()}
+                      for field, values in postings.items()}
+
+    @classmethod
+    def build(cls, store, fields: List[str] = FILTER_FIELDS) -> "FilterIndex":
+        """
+        Builds posting lists from a metadata_store.MetadataStore.
+        """
+        n = len(store)
+        postings = {}
+        for field in fields:
+            if field not in store.columns:
+                continue
+            lists: Dict[object, List[int]] = {}
+            for row, value in enumerate(store.values(field)):
+                for v in (value if isinstance(value, (list, tuple, np.ndarray)) else [value]):
+                    if v is None or (isinstance(v, float) and np.isnan(v)):
+                        continue
+                    lists.setdefault(v, []).append(row)
+            postings[field] = {v: cls._compress(np.unique(np.asarray(rows, dtype=np.int32)), n)
+                               for v, rows in lists.items()}
+        return cls(n, postings)
+
+    @staticmethod
+    def _compress(rows: np.ndarray, num_rows: int) -> np.ndarray:
+        if len(rows) * 32 <= num_rows:
+            return rows
+        mask = np.zeros(num_rows, dtype=bool)
+        mask[rows] = True
+        return np.packbits(mask, bitorder="little")
+
+    def _bits(self, posting: np.ndarray) -> np.ndarray:
+        if _is_bitmap(posting):
+            return posting
+        mask = np.zeros(self.num_rows, dtype=bool)
+        mask[posting] = True
+        return np.packbits(mask, bitorder="little")
+
+    def _count_within(self, posting: np.ndarray, bits: np.ndarray) -> int:
+        if _is_bitmap(posting):
+            return popcount(posting & bits)
+        return int(((bits[posting >> 3] >> (posting & 7).astype(np.uint8)) & 1).sum())
+
+    def indexed(self, filters: Dict) -> Dict:
+        return {k: v for k, v in filters.items() if k in self.postings}
+
+    def unindexed(self, filters: Dict) -> Dict:
+        return {k: v for k, v in filters.items() if k not in self.postings}
+
+    def bits(self, filters: Dict) -> Optional[np.ndarray]:
+        """
+        Packed row bitmap for the indexed part of `filters`, with the same semantics
+        as filters.filter_by_exact_fields: any listed value matches within a field,
+        and every field must match. Returns None when nothing constrains the rows.
+        """
+        result = None
+        for field, values in self.indexed(filters).items():
+            field_bits = np.zeros((self.num_rows + 7) // 8, dtype=np.uint8)
+            for v in values:
+                posting = self.postings[field].get(v)
+                if posting is not None:
+                    field_bits |= self._bits(posting)
+            result = field_bits if result is None else (result & field_bits)
+        return result
+
+    def mask(self, filters: Dict) -> Optional[np.ndarray]:
+        """
+        bits() as a boolean row mask.
+        """
+        bits = self.bits(filters)
+        if bits is None:
+            return None
+        return np.unpackbits(bits, count=self.num_rows, bitorder="little").view(bool)
+
+    def count(self, filters: Optional[Dict] = None) -> int:
+        bits = self.bits(filters or {})
+        return self.num_rows if bits is None else popcount(bits)
+
+    def facet_counts(self, filters: Optional[Dict] = None, fields: Optional[List[str]] = None) -> Dict[str, Dict[object, int]]:
+        """
+        {field: {value: count}} of rows matching `filters` that carry each value.
+        A field's own selection is left out of its counts (the other fields still
+        apply), so a sidebar shows how many materials each alternative would give.
+        """
+        filters = self.indexed(filters or {})
+        counts = {}
+        for field in (fields or list(self.postings)):
+            if field not in self.postings:
+                continue
+            bits = self.bits({f: v for f, v in filters.items() if f != field})
+            if bits is None:
+                counts[field] = dict(self.sizes[field])
+            else:
+                counts[field] = {v: self._count_within(p, bits) for v, p in self.postings[field].items()}
+        return counts
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump({"num_rows": self.num_rows, "postings": self.postings}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> "FilterIndex":
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        return cls(data["num_rows"], data["postings"])
@@ -1,17 +1,21 @@
 import numpy as np
-from utils import lab_distance
+from color_index import DELTA_E
 
-def apply_color_threshold(base_lab, candidates, threshold=5):
+def apply_color_threshold(base_lab, candidates, threshold=5, metric="76"):
     """
     Filters candidates based on LAB Delta-E distance from base_lab.
     Each candidate must include a 'lab' key with [L, a, b].
+    metric is "76" (Euclidean) or "2000" (CIEDE2000); distances are computed in one pass.
     """
+    if not candidates:
+        return []
+    labs = np.array([item.get("lab") or [0, 0, 0] for item in candidates], dtype=np.float64)
+    dists = DELTA_E[metric](labs, base_lab)
     results = []
-    for item in candidates:
-        dist = lab_distance(base_lab, item.get("lab", [0, 0, 0]))
-        if dist <= threshold:
-            item["delta_e"] = round(dist, 2)
-            results.append(item)
+    for i in np.flatnonzero(dists <= threshold):
+        item = candidates[i]
+        item["delta_e"] = round(float(dists[i]), 2)
+        results.append(item)
     return results
 
 def filter_by_exact_fields(candidates, filters):
@@ -29,3 +33,22 @@ def filter_by_exact_fields(candidates, filters):
                     return False
         return True
     return [i for i in candidates if match(i)]
+
+def normalize_filters(filters):
+    """
+    Validates request filters: a dict of {field: [values]}, where a single
+    string value is taken as a one-item list. Returns None for no filters and
+    raises ValueError for anything else, e.g. {"finish": 5}.
+    """
+    if filters is None:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object of {field: [values]}")
+    out = {}
+    for field, values in filters.items():
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, list) or not all(isinstance(v, (str, int, float, bool)) for v in values):
+            raise ValueError(f"filter {field!r} must be a list of values, got {values!r}")
+        out[str(field)] = values
+    return out or None
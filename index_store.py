@@ -0,0 +1,395 @@
+import os
+import json
+import shutil
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import faiss
+from dotenv import load_dotenv
+
+from color_index import ColorIndex
+from filter_index import FilterIndex
+from lexical_index import LexicalIndex
+from metadata_store import MetadataStore, MetadataWriter
+from partition_index import IndexRegistry, PartitionedSearcher
+from search import Searcher
+
+load_dotenv()
+
+INDEX_DIR = os.getenv("INDEX_DIR", ".")
+INDEX_SPEC = os.getenv("INDEX_SPEC", "Flat")
+INDEX_FILE = "faiss_index.bin"
+SHARD_FILE = "faiss_index.{:03d}.bin"
+METADATA_DIR = "materials_metadata"
+LEGACY_METADATA_FILE = "materials_metadata.pkl"
+MANIFEST_FILE = "index_manifest.json"
+FILTER_INDEX_FILE = "filter_index.pkl"
+COLOR_INDEX_FILE = "color_index.npz"
+LEXICAL_INDEX_DIR = "lexical_index"
+LEGACY_LEXICAL_INDEX_FILE = "lexical_index.npz"
+VECTORS_FILE = "vectors.f32"
+SNAPSHOTS_DIR = "snapshots"
+CURRENT_FILE = "CURRENT"
+SNAPSHOT_KEEP = int(os.getenv("INDEX_SNAPSHOT_KEEP", "3"))
+
+
+def index_path(name: str, base_dir: str = INDEX_DIR) -> str:
+    return os.path.join(base_dir, name)
+
+
+def vector_id_for(mongo_id) -> int:
+    """
+    Stable non-negative int64 FAISS id derived from a Mongo _id.
+    """
+    digest = hashlib.blake2b(str(mongo_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & 0x7FFFFFFFFFFFFFFF
+
+
+def current_snapshot(base_dir: str = INDEX_DIR) -> str:
+    """
+    Directory of the live build: the snapshot named in base_dir/CURRENT, or
+    base_dir itself for builds from before snapshots (or a snapshot dir given directly).
+    """
+    try:
+        with open(index_path(CURRENT_FILE, base_dir)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return base_dir
+    return index_path(name, base_dir) if name else base_dir
+
+
+def new_snapshot(base_dir: str = INDEX_DIR) -> Tuple[str, int]:
+    """
+    Creates an empty staging directory for the next build; returns (path, version).
+    Nothing reads it until publish_snapshot() points CURRENT at it.
+    """
+    version = int((read_manifest(current_snapshot(base_dir)) or {}).get("version", 0)) + 1
+    path = index_path(os.path.join(SNAPSHOTS_DIR, f"v{version:06d}.partial"), base_dir)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path, version
+
+
+def publish_snapshot(path: str, base_dir: str = INDEX_DIR, keep: int = SNAPSHOT_KEEP) -> str:
+    """
+    Renames a finished staging directory into place and atomically repoints
+    CURRENT at it, then deletes all but the `keep` newest snapshots. Readers
+    still holding an older snapshot keep their open and mapped files.
+    """
+    final = path[:-len(".partial")] if path.endswith(".partial") else path
+    if final != path:
+        shutil.rmtree(final, ignore_errors=True)
+        os.rename(path, final)
+    current = index_path(CURRENT_FILE, base_dir)
+    with open(current + ".tmp", "w") as f:
+        f.write(os.path.relpath(final, base_dir))
+    os.replace(current + ".tmp", current)
+
+    root = index_path(SNAPSHOTS_DIR, base_dir)
+    done = sorted(d for d in os.listdir(root) if not d.endswith(".partial"))
+    for name in done[:-keep] if keep > 0 else []:
+        if os.path.join(root, name) != final:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return final
+
+
+def file_checksums(base_dir: str) -> Dict[str, Dict]:
+    """
+    {relative path: {"bytes": size, "blake2b": hex digest}} for every file
+    under base_dir except the manifest itself.
+    """
+    checksums = {}
+    for root, _, files in os.walk(base_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, base_dir)
+            if rel == MANIFEST_FILE or rel.endswith(".tmp"):
+                continue
+            digest = hashlib.blake2b(digest_size=16)
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            checksums[rel] = {"bytes": os.path.getsize(path), "blake2b": digest.hexdigest()}
+    return dict(sorted(checksums.items()))
+
+
+def verify_snapshot(base_dir: str, deep: bool = False) -> List[str]:
+    """
+    Problems with a snapshot's files against its manifest: missing files and
+    size mismatches, plus checksum mismatches when `deep`. Empty when it's intact.
+    """
+    manifest = read_manifest(base_dir)
+    if manifest is None:
+        return [f"no {MANIFEST_FILE} in {base_dir}"]
+    problems = []
+    actual = file_checksums(base_dir) if deep else None
+    for rel, expected in (manifest.get("files") or {}).items():
+        path = os.path.join(base_dir, rel)
+        if not os.path.exists(path):
+            problems.append(f"{rel}: missing")
+        elif os.path.getsize(path) != expected["bytes"]:
+            problems.append(f"{rel}: {os.path.getsize(path)} bytes, expected {expected['bytes']}")
+        elif deep and actual[rel]["blake2b"] != expected["blake2b"]:
+            problems.append(f"{rel}: checksum mismatch")
+    return problems
+
+
+def read_manifest(base_dir: str = INDEX_DIR) -> Optional[Dict]:
+    path = index_path(MANIFEST_FILE, base_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest: Dict, base_dir: str = INDEX_DIR, version: Optional[int] = None) -> Dict:
+    """
+    Writes the manifest atomically, with the given version (default: the
+    previous one plus one) and the size and checksum of every file beside it.
+    """
+    if version is None:
+        version = int((read_manifest(base_dir) or {}).get("version", 0)) + 1
+    manifest = dict(manifest)
+    manifest["version"] = version
+    manifest["built_at"] = datetime.now(timezone.utc).isoformat()
+    manifest["files"] = file_checksums(base_dir)
+    path = index_path(MANIFEST_FILE, base_dir)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+    return manifest
+
+
+def new_index(dim: int, spec: str = INDEX_SPEC) -> faiss.Index:
+    """
+    Empty inner-product index that stores vectors under explicit ids.
+    spec is a FAISS index_factory string, e.g. "Flat", "IVF1024,Flat", "HNSW32",
+    "IVF1024,PQ64" or "SQ8".
+    """
+    return faiss.IndexIDMap2(faiss.index_factory(dim, spec, faiss.METRIC_INNER_PRODUCT))
+
+
+def train_index(index: faiss.Index, vectors: np.ndarray, max_train: int = 200000, seed: int = 0):
+    """
+    Trains IVF / PQ / SQ indexes on (a sample of) the vectors; no-op for Flat and HNSW.
+    """
+    if index.is_trained:
+        return
+    if len(vectors) > max_train:
+        vectors = vectors[np.random.default_rng(seed).choice(len(vectors), max_train, replace=False)]
+    index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+
+
+def supports_incremental(index: faiss.Index) -> bool:
+    """
+    In-place upserts need remove_ids to keep the remaining vectors in order, so
+    positions stay aligned with metadata rows. Flat-code indexes (Flat, SQ, PQ) do;
+    IVF and HNSW don't, and are rebuilt instead.
+    """
+    return (isinstance(index, faiss.IndexIDMap2)
+            and isinstance(faiss.downcast_index(index.index), faiss.IndexFlatCodes))
+
+
+def mmap_flags(spec: str) -> int:
+    """
+    faiss.read_index flags that map the stored vectors instead of reading them:
+    IVF lists open as on-disk lists, flat-code and HNSW storage as mapped arrays.
+    Mapped indexes are read-only.
+    """
+    return faiss.IO_FLAG_MMAP if "IVF" in spec else faiss.IO_FLAG_MMAP_IFC
+
+
+def load_index(base_dir: str = INDEX_DIR, flags: int = 0) -> faiss.Index:
+    return faiss.read_index(index_path(INDEX_FILE, base_dir), flags)
+
+
+def save_index(index: faiss.Index, base_dir: str = INDEX_DIR):
+    path = index_path(INDEX_FILE, base_dir)
+    faiss.write_index(index, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def load_shards(base_dir: str = INDEX_DIR, manifest: Optional[Dict] = None, mmap: bool = False) -> List[faiss.Index]:
+    """
+    The index as a list of shards over consecutive metadata rows; one shard for
+    unsharded builds. With `mmap` the vectors are mapped read-only, so opening
+    takes milliseconds whatever the catalog size.
+    """
+    manifest = manifest if manifest is not None else (read_manifest(base_dir) or {})
+    flags = mmap_flags(manifest.get("index_spec", "Flat")) if mmap else 0
+    count = int(manifest.get("shards", 1))
+    if count <= 1:
+        return [load_index(base_dir, flags)]
+    return [faiss.read_index(index_path(SHARD_FILE.format(i), base_dir), flags) for i in range(count)]
+
+
+def save_shards(shards: List[faiss.Index], base_dir: str = INDEX_DIR):
+    """
+    A single shard is saved as faiss_index.bin, as unsharded builds always were.
+    Record len(shards) as "shards" in the manifest.
+    """
+    if len(shards) == 1:
+        return save_index(shards[0], base_dir)
+    for i, shard in enumerate(shards):
+        path = index_path(SHARD_FILE.format(i), base_dir)
+        faiss.write_index(shard, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+
+def load_metadata(base_dir: str = INDEX_DIR) -> MetadataStore:
+    """
+    Opens the columnar metadata store. A pickled DataFrame from an older build is
+    read into an in-memory store instead (those builds used row positions as
+    vector ids); the next build writes it out. Nothing is written here, since
+    the app and the service call this at startup.
+    """
+    path = index_path(METADATA_DIR, base_dir)
+    if not os.path.exists(path):
+        legacy = index_path(LEGACY_METADATA_FILE, base_dir)
+        print(f"   Reading legacy metadata from {legacy}; rebuild to convert it.")
+        df = pd.read_pickle(legacy)
+        if "vector_id" not in df.columns:
+            df["vector_id"] = np.arange(len(df), dtype=np.int64)
+        return MetadataStore.from_records(df.to_dict(orient="records"))
+    return MetadataStore(path)
+
+
+def write_metadata(chunks: Iterable[List[Dict]], base_dir: str = INDEX_DIR) -> MetadataStore:
+    """
+    Writes record chunks to a fresh store, then swaps it in for the current one.
+    """
+    path = index_path(METADATA_DIR, base_dir)
+    with MetadataWriter(path + ".tmp") as writer:
+        for chunk in chunks:
+            writer.append(chunk)
+    if os.path.exists(path):
+        os.rename(path, path + ".old")
+    os.rename(path + ".tmp", path)
+    shutil.rmtree(path + ".old", ignore_errors=True)
+    return MetadataStore(path)
+
+
+def load_filter_index(store: MetadataStore, base_dir: str = INDEX_DIR) -> FilterIndex:
+    """
+    Loads the precomputed posting lists, or builds them from the store for older builds.
+    """
+    path = index_path(FILTER_INDEX_FILE, base_dir)
+    if os.path.exists(path):
+        fidx = FilterIndex.load(path)
+        if fidx.num_rows == len(store):
+            return fidx
+    return FilterIndex.build(store)
+
+
+def save_filter_index(fidx: FilterIndex, base_dir: str = INDEX_DIR):
+    path = index_path(FILTER_INDEX_FILE, base_dir)
+    fidx.save(path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def load_color_index(store: MetadataStore, base_dir: str = INDEX_DIR) -> ColorIndex:
+    """
+    Loads the LAB color index, or builds it from the store for older builds.
+    """
+    path = index_path(COLOR_INDEX_FILE, base_dir)
+    if os.path.exists(path):
+        return ColorIndex.load(path)
+    return ColorIndex.from_store(store)
+
+
+def save_color_index(cidx: ColorIndex, base_dir: str = INDEX_DIR):
+    path = index_path(COLOR_INDEX_FILE, base_dir)
+    cidx.save(path + ".tmp.npz")
+    os.replace(path + ".tmp.npz", path)
+
+
+def load_lexical_index(store: MetadataStore, base_dir: str = INDEX_DIR) -> LexicalIndex:
+    """
+    Loads the BM25 index, or builds it from the store for older builds.
+    """
+    for name in (LEXICAL_INDEX_DIR, LEGACY_LEXICAL_INDEX_FILE):
+        path = index_path(name, base_dir)
+        if os.path.exists(path):
+            lidx = LexicalIndex.load(path)
+            if lidx.num_rows == len(store):
+                return lidx
+    return LexicalIndex.build(store)
+
+
+def save_lexical_index(lidx: LexicalIndex, base_dir: str = INDEX_DIR):
+    """
+    Writes a fresh lexical_index/ directory, then swaps it in, like write_metadata.
+    """
+    path = index_path(LEXICAL_INDEX_DIR, base_dir)
+    shutil.rmtree(path + ".tmp", ignore_errors=True)
+    lidx.save(path + ".tmp")
+    if os.path.exists(path):
+        os.rename(path, path + ".old")
+    os.rename(path + ".tmp", path)
+    shutil.rmtree(path + ".old", ignore_errors=True)
+
+
+class VectorWriter:
+    """
+    Appends full-precision float32 rows, in metadata row order, to a fresh
+    vectors file and swaps it in on close, like write_metadata.
+    """
+
+    def __init__(self, base_dir: str = INDEX_DIR):
+        self.path = index_path(VECTORS_FILE, base_dir)
+        self.rows = 0
+        self._f = open(self.path + ".tmp", "wb")
+
+    def append(self, vectors: np.ndarray):
+        self._f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self.rows += len(vectors)
+
+    def close(self):
+        self._f.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def __enter__(self) -> "VectorWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._f.close()
+            os.remove(self.path + ".tmp")
+        return False
+
+
+def load_vectors(dim: int, base_dir: str = INDEX_DIR) -> Optional[np.ndarray]:
+    """
+    Memory-maps the full-precision vectors read-only; pages are read from disk
+    only for the rows that get rescored. None if the build didn't write them.
+    """
+    path = index_path(VECTORS_FILE, base_dir)
+    if not dim or not os.path.exists(path) or not os.path.getsize(path):
+        return None
+    return np.memmap(path, dtype=np.float32, mode="r", shape=(os.path.getsize(path) // (4 * dim), dim))
+
+
+def load_searcher(base_dir: str = INDEX_DIR) -> Tuple[Searcher, MetadataStore, Dict]:
+    """
+    Opens everything a query path needs from the current snapshot under
+    base_dir: (searcher, metadata store, manifest). The index, metadata and
+    vectors are memory-mapped, so pages are read on first use. Builds with
+    partitions get a PartitionedSearcher, which loads them as queries need them.
+    """
+    base_dir = current_snapshot(base_dir)
+    store = load_metadata(base_dir)
+    manifest = read_manifest(base_dir) or {}
+    params = manifest.get("search_params") or {}
+    vectors = load_vectors(manifest.get("dim"), base_dir) if params.get("rescore") else None
+    shards = load_shards(base_dir, manifest, mmap=True)
+    searcher = Searcher(shards if len(shards) > 1 else shards[0], load_filter_index(store, base_dir), params, vectors)
+    if manifest.get("partitions"):
+        registry = IndexRegistry(base_dir, manifest["partitions"], searcher.filter_index, params, vectors)
+        searcher = PartitionedSearcher(searcher, registry)
+    return searcher, store, manifest
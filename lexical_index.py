@@ -0,0 +1,186 @@
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# The metadata columns build_search_text() feeds to the embedding model.
+LEXICAL_FIELDS = [
+    "title",
+    "material_brand_name",
+    "material_category_name",
+    "material_style_name",
+    "sku",
+    "hex",
+    "family_name",
+    "finish",
+    "primary_undertone",
+    "secondary_undertone",
+    "tags",
+    "segment_types",
+    "description",
+]
+
+# Columns whose whole value identifies a material; a query equal to one of
+# them is answered lexically, without an embedding round trip.
+EXACT_FIELDS = ["sku", "hex", "title"]
+
+# Arrays saved by LexicalIndex.save(), one .npy file each.
+_ARRAYS = ["num_rows", "terms", "offsets", "rows", "weights", "exact_keys", "exact_offsets", "exact_rows"]
+
+_TOKEN_RE = re.compile(r"#?[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[-_./]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens. Compound tokens such as "SW-7015" or "#A1B2C3" are
+    kept whole and also split into their parts, so both spellings match.
+    """
+    tokens = []
+    for tok in _TOKEN_RE.findall(str(text).lower()):
+        tokens.append(tok)
+        if tok.startswith("#"):
+            tok = tok[1:]
+            tokens.append(tok)
+        parts = _SPLIT_RE.split(tok)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p)
+    return tokens
+
+
+def exact_key(value) -> str:
+    return re.sub(r"\s+", " ", str(value).strip().lower()).lstrip("#")
+
+
+def _csr(lists: Dict[str, List[int]]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    keys = sorted(lists)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(lists[t]) for t in keys])
+    rows = np.fromiter((r for t in keys for r in lists[t]), dtype=np.int32, count=int(offsets[-1]))
+    return keys, offsets, rows
+
+
+def _find(keys: np.ndarray, key: str) -> int:
+    """
+    Position of `key` in the sorted array `keys`, or -1.
+    """
+    i = int(np.searchsorted(keys, key))
+    return i if i < len(keys) and keys[i] == key else -1
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over metadata rows, in CSR form: term -> (rows, weights),
+    where each weight is the term's precomputed BM25 contribution for that row.
+    Rows are metadata positions, like FilterIndex and the vector index. Terms
+    and exact keys are sorted arrays searched by bisection, so a loaded index
+    can stay memory-mapped.
+    """
+
+    def __init__(self, num_rows: int, terms: Sequence[str], offsets: np.ndarray, rows: np.ndarray,
+                 weights: np.ndarray, exact_keys: Sequence[str], exact_offsets: np.ndarray, exact_rows: np.ndarray):
+        self.num_rows = num_rows
+        self.terms = np.asarray(terms, dtype=str)
+        self.offsets = offsets
+        self.rows = rows
+        self.weights = weights
+        self.exact_keys = np.asarray(exact_keys, dtype=str)
+        self.exact_offsets = exact_offsets
+        self.exact_rows = exact_rows
+
+    @classmethod
+    def build(cls, store, fields: List[str] = LEXICAL_FIELDS, k1: float = 1.2, b: float = 0.75) -> "LexicalIndex":
+        """
+        Builds the index from a metadata_store.MetadataStore.
+        """
+        n = len(store)
+        fields = [f for f in fields if f in store.columns]
+        columns = [store.values(f) for f in fields]
+        postings: Dict[str, List[int]] = {}
+        freqs: Dict[str, List[int]] = {}
+        doc_len = np.zeros(n, dtype=np.float32)
+        for row in range(n):
+            counts: Dict[str, int] = {}
+            for col in columns:
+                value = col[row]
+                for v in (value if isinstance(value, (list, tuple, np.ndarray)) else [value]):
+                    if v is None or (isinstance(v, float) and np.isnan(v)):
+                        continue
+                    for tok in tokenize(v):
+                        counts[tok] = counts.get(tok, 0) + 1
+            doc_len[row] = sum(counts.values())
+            for tok, tf in counts.items():
+                postings.setdefault(tok, []).append(row)
+                freqs.setdefault(tok, []).append(tf)
+
+        terms, offsets, rows = _csr(postings)
+        tf = np.fromiter((f for t in terms for f in freqs[t]), dtype=np.float32, count=len(rows))
+        df = np.diff(offsets).astype(np.float32)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        avgdl = float(doc_len.mean()) if n else 1.0
+        norm = k1 * (1 - b + b * doc_len / max(avgdl, 1e-9))
+        weights = (np.repeat(idf, np.diff(offsets)) * tf * (k1 + 1) / (tf + norm[rows])).astype(np.float32)
+
+        exact: Dict[str, List[int]] = {}
+        for field in EXACT_FIELDS:
+            if field not in store.columns:
+                continue
+            for row, value in enumerate(store.values(field)):
+                if isinstance(value, str) and value.strip():
+                    exact.setdefault(exact_key(value), []).append(row)
+        exact = {key: sorted(set(r)) for key, r in exact.items()}
+        exact_keys, exact_offsets, exact_rows = _csr(exact)
+        return cls(n, terms, offsets, rows, weights, exact_keys, exact_offsets, exact_rows)
+
+    def exact(self, query: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Rows whose sku, hex or title equals the query (case- and space-insensitive).
+        """
+        i = _find(self.exact_keys, exact_key(query))
+        if i < 0:
+            return np.empty(0, dtype=np.int64)
+        rows = self.exact_rows[self.exact_offsets[i]:self.exact_offsets[i + 1]].astype(np.int64)
+        return rows[mask[rows]] if mask is not None else rows
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows by BM25 score as (scores, rows), best first; only rows that
+        contain at least one query term (and pass `mask`) are returned.
+        """
+        ids = [i for i in (_find(self.terms, t) for t in dict.fromkeys(tokenize(query))) if i >= 0]
+        if not ids:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        rows = np.concatenate([self.rows[self.offsets[i]:self.offsets[i + 1]] for i in ids])
+        weights = np.concatenate([self.weights[self.offsets[i]:self.offsets[i + 1]] for i in ids])
+        if mask is not None:
+            keep = mask[rows]
+            rows, weights = rows[keep], weights[keep]
+        uniq, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights).astype(np.float32)
+        if len(uniq) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            uniq, scores = uniq[top], scores[top]
+        order = np.lexsort((uniq, -scores))
+        return scores[order], uniq[order].astype(np.int64)
+
+    def save(self, path: str):
+        """
+        Writes each array to its own .npy file in the directory `path`.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), np.asarray(getattr(self, name)))
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        """
+        Memory-maps the arrays written by save(), so opening costs the same at
+        any size. A single .npz from an older build is read whole.
+        """
+        if path.endswith(".npz"):
+            data = np.load(path)
+        else:
+            data = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in _ARRAYS}
+        return cls(int(data["num_rows"]), data["terms"], data["offsets"], data["rows"],
+                   data["weights"], data["exact_keys"], data["exact_offsets"], data["exact_rows"])
@@ -0,0 +1,120 @@
+"""
+The index as seen by long-running readers (the app and the search service).
+
+    live = LiveIndex().start()
+    snapshot = live.current       # take it once per request...
+    scores, rows = snapshot.searcher.search(...)
+    hits = materialize_hits(snapshot.store, scores[0], rows[0])   # ...and use it throughout
+
+A daemon thread polls INDEX_DIR/CURRENT. When a build publishes a new
+snapshot it is opened (memory-mapped, so in milliseconds) and swapped in with
+a single attribute assignment: requests already holding the old snapshot
+finish on it and nothing waits on a lock.
+"""
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from embeddings.embedder import EMBED_MODEL
+from index_store import INDEX_DIR, current_snapshot, load_searcher, load_lexical_index, verify_snapshot
+from metrics import span, inc
+from search import HybridSearcher
+
+load_dotenv()
+
+INDEX_POLL_SECONDS = float(os.getenv("INDEX_POLL_SECONDS", "5"))
+
+
+class Snapshot:
+    """
+    One build's searcher, metadata store and manifest, opened together.
+    """
+
+    __slots__ = ("path", "searcher", "store", "manifest")
+
+    def __init__(self, path: str, searcher, store, manifest: Dict):
+        self.path = path
+        self.searcher = searcher
+        self.store = store
+        self.manifest = manifest
+
+    @property
+    def version(self) -> Optional[int]:
+        return self.manifest.get("version")
+
+    @property
+    def embed_model(self) -> str:
+        """
+        The model id the index was built with; queries must be embedded with it.
+        """
+        return self.manifest.get("embed_model") or EMBED_MODEL
+
+
+def open_snapshot(path: str) -> Snapshot:
+    searcher, store, manifest = load_searcher(path)
+    snapshot = Snapshot(path, HybridSearcher(searcher, load_lexical_index(store, path)), store, manifest)
+    if snapshot.embed_model != EMBED_MODEL:
+        print(f"   ⚠️  {path} was built with {snapshot.embed_model}; embedding queries with it, not {EMBED_MODEL}.")
+    return snapshot
+
+
+class LiveIndex:
+    """
+    Holds the current Snapshot and replaces it when CURRENT moves. Snapshots
+    whose files don't match their manifest are not swapped in.
+    """
+
+    def __init__(self, base_dir: str = INDEX_DIR, opener: Callable[[str], Snapshot] = open_snapshot,
+                 interval: float = INDEX_POLL_SECONDS):
+        self.base_dir = base_dir
+        self.opener = opener
+        self.interval = interval
+        self.swaps = 0
+        self.listeners: List[Callable[[Snapshot], None]] = []
+        self._rejected = None
+        self._stop = threading.Event()
+        self._thread = None
+        with span("index.open"):
+            self.current = opener(current_snapshot(base_dir))
+
+    def refresh(self) -> bool:
+        """
+        Swaps in the snapshot CURRENT points to, if it changed. Returns whether it did.
+        """
+        path = current_snapshot(self.base_dir)
+        if path in (self.current.path, self._rejected):
+            return False
+        problems = verify_snapshot(path)
+        if problems:
+            print(f"   ⚠️  Not loading {path}: {'; '.join(problems)}")
+            inc("index_swap_errors")
+            self._rejected = path
+            return False
+        with span("index.open"):
+            snapshot = self.opener(path)
+        self.current = snapshot
+        self.swaps += 1
+        inc("index_swaps")
+        for listener in self.listeners:
+            listener(snapshot)
+        print(f"▶️  Swapped in index version {snapshot.version} from {path}.")
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                inc("index_swap_errors")
+                print(f"   ⚠️  Index reload failed ({e.__class__.__name__}: {e}); keeping version {self.current.version}")
+
+    def start(self) -> "LiveIndex":
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._watch, name="index-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
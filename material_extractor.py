@@ -3,11 +3,14 @@ import json
 import re
 import streamlit as st
 import pandas as pd
-from pymongo import MongoClient
-from datetime import datetime
 from dotenv import load_dotenv
-from utils import lab_distance, generate_hint, calculate_profile_strength
-from stats import get_material_stats  # NEW IMPORT
+from utils import lab_distance, generate_hint
+from stats import get_material_stats, invalidate_material_stats
+from mongo_client import get_client
+from extractor_db import PreviewPager, ReferenceMaps, build_preview_query, safe_slugify
+from dedup import DEDUP_JACCARD, dedup_collection, write_clusters
+from embeddings.batch import embed_texts
+from transfer import TransferWorker, create_job, resumable_jobs
 
 
 # Safe import for ColorColumn if available
@@ -22,7 +25,7 @@ MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME", "dzinly_db_ai")
 
 # --- DB Setup ---
-client = MongoClient(MONGO_URI)
+client = get_client(MONGO_URI)
 db = client[DB_NAME]
 materials_col = db.materials
 materials_new_col = db.materials_new
@@ -31,23 +34,27 @@ styles_col = db.material_brand_styles
 categories_col = db.material_categories
 segments_col = db.segments
 
-# --- Utility ---
-def safe_slugify(value):
-    try:
-        return re.sub(r"[^a-z0-9-]", "-", str(value).lower().replace(" ", "-")).strip("-")
-    except:
-        return "untitled"
-
 # --- Streamlit UI Setup ---
 st.set_page_config(layout="wide")
 st.title("🧱 Material Extractor Dashboard")
 
-# --- Fetch Static Metadata ---
-categories = sorted([x['title'] for x in categories_col.find()])
-brands = sorted([x['title'] for x in brands_col.find()])
-styles = sorted([x['title'] for x in styles_col.find()])
-segment_map = {s['name']: s['short_code'] for s in segments_col.find()}
-segment_names = list(segment_map.keys())
+# --- Fetch Static Metadata (cached id <-> title maps, refreshed every few minutes) ---
+@st.cache_resource(show_spinner=False)
+def get_reference_maps():
+    return ReferenceMaps(db)
+
+refs = get_reference_maps().current()
+categories = refs.categories
+brands = refs.brands
+styles = refs.styles
+segment_names = refs.segment_names
+
+# Background transfer workers, shared across reruns and sessions.
+@st.cache_resource(show_spinner=False)
+def get_transfer_workers():
+    return {}
+
+transfer_workers = get_transfer_workers()
 
 # --- Sidebar Controls ---
 with st.sidebar:
@@ -56,6 +63,16 @@ with st.sidebar:
     st.metric("Total Materials", stats["total"])
     st.metric("Transferred", stats["transferred"])
     st.metric("Pending", stats["pending"])
+    if stats.get("by_category"):
+        with st.expander("By category / brand"):
+            cat_titles = {str(k): v for k, v in refs.category_titles.items()}
+            brand_titles = {str(k): v for k, v in refs.brand_titles.items()}
+            st.dataframe(pd.DataFrame([
+                {"Category": cat_titles.get(k, k), **v} for k, v in stats["by_category"].items()
+            ]), hide_index=True)
+            st.dataframe(pd.DataFrame([
+                {"Brand": brand_titles.get(k, k), **v} for k, v in stats["by_brand"].items()
+            ]), hide_index=True)
 
     st.divider()
     st.subheader("🔍 Filter Extraction")
@@ -63,47 +80,14 @@ with st.sidebar:
     brand = st.selectbox("Brand", ["All"] + brands)
     style = st.selectbox("Style", ["All"] + styles)
     seg = st.selectbox("Segment", ["All"] + segment_names)
-    limit = st.slider("Preview Limit", 10, 500, 100)
+    page_size = st.select_slider("Rows per page", [10, 25, 50, 100], 10)
 
     if st.button("🔎 Fetch Materials"):
-        q = {"extracted": {"$ne": True}}
-        if cat != "All":
-            cat_doc = categories_col.find_one({"title": cat})
-            if cat_doc: q["material_category_id"] = cat_doc["_id"]
-        if brand != "All":
-            brand_doc = brands_col.find_one({"title": brand})
-            if brand_doc: q["material_brand_id"] = brand_doc["_id"]
-        if style != "All":
-            style_doc = styles_col.find_one({"title": style})
-            if style_doc: q["material_brand_style_id"] = style_doc["_id"]
-        if seg != "All":
-            q["segment"] = {"$in": [seg]}
-
-        st.session_state.preview_data = []
-        for mat in materials_col.find(q).limit(limit):
-            cat_obj = categories_col.find_one({"_id": mat.get("material_category_id")})
-            brand_obj = brands_col.find_one({"_id": mat.get("material_brand_id")})
-            style_obj = styles_col.find_one({"_id": mat.get("material_brand_style_id")})
-            segments = [segment_map.get(s, s) for s in mat.get("segment", [])]
-
-            row_data = {
-                "_id": str(mat["_id"]),
-                "title": mat.get("title"),
-                "slug": safe_slugify(mat.get("title")),
-                "material_category_name": cat_obj.get("title") if cat_obj else "",
-                "material_brand_name": brand_obj.get("title") if brand_obj else "",
-                "material_style_name": style_obj.get("title") if style_obj else "",
-                "finish": "Default",
-                "description": mat.get("description", ""),
-                "color_hex": "#FFFFFF",
-                "segment_types": segments,
-                "tags": mat.get("style", []),
-                "original_id": mat["_id"],
-                "transfer": True
-            }
-            row_data["profile_strength"] = calculate_profile_strength(row_data)
-            row_data["hints"] = generate_hint(row_data)
-            st.session_state.preview_data.append(row_data)
+        q = build_preview_query(refs, cat, brand, style, seg)
+        st.session_state.pager = PreviewPager(materials_col, refs, q, page_size)
+        st.session_state.page_no = 1
+        # Rows queued under the previous filters are not part of this review.
+        st.session_state.reviewed = {}
 
 # --- Smart Tools ---
 st.divider()
@@ -115,8 +99,28 @@ with st.expander("🎨 Color Suggestion by Segment", expanded=False):
     st.info("Coming soon: Color hex suggestions based on segment type")
     st.toggle("Enable Auto Color", disabled=True)
 with st.expander("🔁 Duplicate Detection", expanded=False):
-    st.info("Coming soon: Will flag duplicate titles/styles")
-    st.button("Check Duplicates", disabled=True)
+    st.caption("Groups near-identical titles/descriptions (MinHash/LSH) and, optionally, near-identical "
+               "embeddings; materials whose colors differ are never grouped.")
+    dedup_scope = st.radio("Scope", ["Current filters", "All pending"], horizontal=True)
+    dedup_jaccard = st.slider("Text similarity", 0.5, 1.0, DEDUP_JACCARD, 0.05)
+    dedup_embeddings = st.checkbox("Also compare embeddings (uses the embedding cache / API)")
+    if st.button("Check Duplicates"):
+        if dedup_scope == "Current filters":
+            dq = build_preview_query(refs, cat, brand, style, seg)
+        else:
+            dq = {"extracted": {"$ne": True}}
+        with st.spinner("Finding duplicates..."):
+            embed_fn = (lambda texts: embed_texts(texts, verbose=False)) if dedup_embeddings else None
+            ids, dup_keys, dup_counts = dedup_collection(materials_col, dq, embed_fn=embed_fn, jaccard=dedup_jaccard)
+            write_clusters(materials_col, ids, dup_keys)
+        st.success(f"{dup_counts['clusters']} duplicate groups covering {dup_counts['duplicates']} "
+                   f"of {len(ids)} materials.")
+        # Re-read pages so the table shows the new groups, and flag rows already edited.
+        if "pager" in st.session_state:
+            st.session_state.pager.reset()
+        for row in st.session_state.get("reviewed", {}).values():
+            row["duplicate_cluster"] = dup_keys.get(row["original_id"], "")
+            row["hints"] = generate_hint(row)
 with st.expander("🧰 Bulk Fix Mode", expanded=False):
     st.info("Coming soon: Fix all empty values in 1 click")
     st.button("Run Bulk Fix", disabled=True)
@@ -126,62 +130,79 @@ fullscreen = st.toggle("🖥️ Expand Table View", value=False)
 main_container = st.container() if fullscreen else st.expander("🛠 Step 3: Review & Transfer Materials", expanded=True)
 
 with main_container:
-    if "preview_data" in st.session_state:
-        df_all = pd.DataFrame(st.session_state.preview_data)
-        st.caption(f"{len(df_all)} materials ready to review")
+    if "pager" in st.session_state:
+        pager = st.session_state.pager
+        # Rows queued for transfer, with the reviewer's edits, by _id: rows edited
+        # in the table and pages added with the button below, nothing merely viewed.
+        reviewed = st.session_state.setdefault("reviewed", {})
+        st.caption(f"{pager.total} materials ready to review")
 
-        page_size = 10
-        page = st.number_input("Page #", 1, (len(df_all) - 1) // page_size + 1)
-        paged = df_all.iloc[(page-1)*page_size : page*page_size]
+        st.session_state.page_no = min(st.session_state.get("page_no", 1), pager.pages)
+        page = st.number_input("Page #", 1, pager.pages, key="page_no")
+        paged = pd.DataFrame([reviewed.get(row["_id"], row) for row in pager.page(page - 1)])
 
         edited_df = st.data_editor(
             paged,
             column_config={
                 "profile_strength": st.column_config.ProgressColumn("Profile %", format="%d%%", min_value=0, max_value=100),
                 "color_hex": ColorColumn("Color Swatch") if ColorColumn else st.column_config.TextColumn("Color Hex"),
-                "hints": st.column_config.TextColumn("QA Notes")
+                "hints": st.column_config.TextColumn("QA Notes"),
+                "duplicate_cluster": st.column_config.TextColumn("Duplicate group"),
             },
             use_container_width=True,
             hide_index=True,
-            disabled=["_id", "title", "slug", "material_brand_name", "material_category_name", "material_style_name", "segment_types", "hints"]
+            disabled=["_id", "title", "slug", "material_brand_name", "material_category_name", "material_style_name", "segment_types", "hints", "duplicate_cluster"]
         )
 
-        if st.button("✅ Confirm Transfer"):
-            inserted, skipped = 0, 0
-            for row in edited_df.to_dict(orient="records"):
-                if not row.get("transfer", True):
-                    skipped += 1
-                    continue
-                doc = {
-                    "title": row["title"],
-                    "slug": row["slug"],
-                    "material_category_name": row["material_category_name"],
-                    "material_brand_name": row["material_brand_name"],
-                    "material_style_name": row["material_style_name"],
-                    "sku": "AUTO-GEN",
-                    "color": {
-                        "hex": row.get("color_hex", "#FFFFFF"),
-                        "rgb": [255, 255, 255],
-                        "lab": [100, 0, 0],
-                        "lrv": 85,
-                        "family_id": 1,
-                        "family_name": "White",
-                        "primary_undertone": "Neutral",
-                        "secondary_undertone": "Neutral",
-                        "warmth_score": 0
-                    },
-                    "finish": row["finish"],
-                    "description": row["description"],
-                    "segment_types": row["segment_types"],
-                    "tags": row["tags"],
-                    "profile_strength": row["profile_strength"],
-                    "audit": {
-                        "created_at": datetime.utcnow().isoformat(),
-                        "updated_at": datetime.utcnow().isoformat()
-                    }
-                }
-                materials_new_col.insert_one(doc)
-                materials_col.update_one({"_id": row["original_id"]}, {"$set": {"extracted": True}})
-                inserted += 1
-
-            st.success(f"Inserted: {inserted} | Skipped: {skipped}")
\ No newline at end of file
+        shown = {row["_id"]: json.dumps(row, default=str) for row in paged.to_dict(orient="records")}
+        rows = edited_df.to_dict(orient="records")
+        for row in rows:
+            if row["_id"] in reviewed or json.dumps(row, default=str) != shown[row["_id"]]:
+                reviewed[row["_id"]] = row
+        if st.button("➕ Add this page to the transfer"):
+            reviewed.update((row["_id"], row) for row in rows)
+
+        queued = sum(1 for row in reviewed.values() if row.get("transfer", True))
+        if st.button(f"✅ Confirm Transfer ({queued} queued)", disabled=not queued):
+            job_id = create_job(db, reviewed.values())
+            transfer_workers[job_id] = TransferWorker(db, job_id).start()
+            st.session_state.transfer_job = job_id
+
+    # --- Transfer progress (the job runs on a background thread and survives reruns) ---
+    @st.fragment(run_every=0.5)
+    def transfer_progress(worker):
+        # Redraws only this block while the worker runs; the page stays usable.
+        p = worker.progress()
+        st.progress(p["fraction"], text=f"Transferred {p['done']} / {p['total']} ({p['rate']:.0f}/s)")
+        if not worker.is_alive():
+            st.rerun()
+
+    job_id = st.session_state.get("transfer_job")
+    worker = transfer_workers.get(job_id)
+    if worker is not None and worker.is_alive():
+        transfer_progress(worker)
+    elif worker is not None:
+        del st.session_state["transfer_job"]
+        invalidate_material_stats()
+        p = worker.progress()
+        job = worker.job or {}
+        st.progress(p["fraction"], text=f"Transferred {p['done']} / {p['total']}")
+        if p["error"]:
+            st.error(f"Transfer stopped after {p['done']} of {p['total']}: {p['error']}. It can be resumed below.")
+        else:
+            st.success(f"Inserted: {job.get('inserted', 0)} | Already transferred: {job.get('existing', 0)} "
+                       f"| Skipped: {job.get('skipped', 0)}")
+            # Transferred rows leave the pending query, so page boundaries move.
+            st.session_state.reviewed = {k: r for k, r in st.session_state.get("reviewed", {}).items()
+                                         if not r.get("transfer", True)}
+            if "pager" in st.session_state:
+                st.session_state.pager.reset()
+
+    for job in resumable_jobs(db):
+        if job["_id"] in transfer_workers and transfer_workers[job["_id"]].is_alive():
+            continue
+        label = f"🔁 Resume transfer started {job['created_at'][:19]} ({job['done']} / {job['total']} done)"
+        if st.button(label, key=f"resume-{job['_id']}"):
+            transfer_workers[job["_id"]] = TransferWorker(db, job["_id"]).start()
+            st.session_state.transfer_job = job["_id"]
+            st.rerun()
@@ -0,0 +1,280 @@
+import os
+import json
+import shutil
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+SCHEMA_FILE = "schema.json"
+
+# Storage kind per known metadata column; unknown columns are inferred.
+# Fixed-width kinds live in one raw array per column; "str" and "json" are
+# variable-length: a byte heap plus an int64 offsets array.
+METADATA_SCHEMA = {
+    "vector_id": "int64",
+    "mongo_id": "str",
+    "title": "str",
+    "slug": "str",
+    "material_category_name": "str",
+    "material_brand_name": "str",
+    "material_style_name": "str",
+    "sku": "str",
+    "hex": "str",
+    "rgb": "json",
+    "lab": "json",
+    "lrv": "float",
+    "family_id": "float",
+    "family_name": "str",
+    "primary_undertone": "str",
+    "secondary_undertone": "str",
+    "warmth_score": "float",
+    "finish": "str",
+    "coating_type": "str",
+    "certifications": "json",
+    "tags": "json",
+    "voc_level": "float",
+    "mildew_resistant": "bool",
+    "uv_resistance_years": "float",
+    "adhesion_rating_psi": "float",
+    "recommended_substrates": "json",
+    "coverage_sqft_per_gal": "float",
+    "price_per_gallon": "float",
+    "price_per_sqft": "float",
+    "in_stock": "bool",
+    "lead_time_days": "float",
+    "region_availability": "json",
+    "container_sizes": "json",
+    "description": "str",
+    "image_url": "str",
+    "segment_types": "json",
+    "created_at": "str",
+    "updated_at": "str",
+    "search_text": "str",
+}
+
+_FIXED_DTYPES = {"int64": np.int64, "float": np.float64, "bool": np.int8}
+
+
+def _infer_kind(value) -> str:
+    if isinstance(value, (bool, np.bool_)):
+        return "bool"
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return "float"
+    if isinstance(value, str):
+        return "str"
+    return "json"
+
+
+def _encode_fixed(kind: str, values: List) -> np.ndarray:
+    if kind == "bool":
+        return np.array([-1 if v is None else int(bool(v)) for v in values], dtype=np.int8)
+    if kind == "float":
+        return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    return np.array([0 if v is None else int(v) for v in values], dtype=np.int64)
+
+
+def _encode_varlen(kind: str, value) -> bytes:
+    if kind == "str":
+        missing = value is None or (isinstance(value, float) and np.isnan(value))
+        return ("" if missing else str(value)).encode("utf-8")
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    return json.dumps(value, default=str, ensure_ascii=False).encode("utf-8")
+
+
+class MetadataWriter:
+    """
+    Appends metadata rows to a columnar store directory, one chunk at a time.
+    Use as a context manager; the schema is written on close.
+    """
+
+    def __init__(self, path: str, schema: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.schema = dict(schema or {})
+        self.num_rows = 0
+        self._files = {}
+        self._offsets = {}
+        self._heap_end = {}
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+
+    def _open(self, name: str, kind: str):
+        self.schema[name] = kind
+        if kind in _FIXED_DTYPES:
+            self._files[name] = open(os.path.join(self.path, f"{name}.bin"), "wb")
+            if self.num_rows:
+                _encode_fixed(kind, [None] * self.num_rows).tofile(self._files[name])
+        else:
+            self._files[name] = open(os.path.join(self.path, f"{name}.data"), "wb")
+            self._offsets[name] = open(os.path.join(self.path, f"{name}.offsets"), "wb")
+            np.zeros(self.num_rows + 1, dtype=np.int64).tofile(self._offsets[name])
+            self._heap_end[name] = 0
+
+    def append(self, records: List[Dict]):
+        if not records:
+            return
+        for name in records[0]:
+            if name not in self._files:
+                kind = self.schema.get(name) or METADATA_SCHEMA.get(name)
+                if kind is None:
+                    sample = next((r.get(name) for r in records if r.get(name) is not None), None)
+                    kind = _infer_kind(sample) if sample is not None else "json"
+                self._open(name, kind)
+        for name, f in self._files.items():
+            kind = self.schema[name]
+            values = [r.get(name) for r in records]
+            if kind in _FIXED_DTYPES:
+                _encode_fixed(kind, values).tofile(f)
+            else:
+                blobs = [_encode_varlen(kind, v) for v in values]
+                f.write(b"".join(blobs))
+                ends = self._heap_end[name] + np.cumsum([len(b) for b in blobs], dtype=np.int64)
+                ends.tofile(self._offsets[name])
+                self._heap_end[name] = int(ends[-1])
+        self.num_rows += len(records)
+
+    def close(self):
+        for f in list(self._files.values()) + list(self._offsets.values()):
+            f.close()
+        with open(os.path.join(self.path, SCHEMA_FILE), "w") as f:
+            json.dump({"num_rows": self.num_rows, "columns": self.schema}, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MetadataStore:
+    """
+    Read side of the columnar store. Columns are memory-mapped on first use, so
+    opening is O(1) and gathering k rows only touches the pages those rows live on.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, SCHEMA_FILE)) as f:
+            schema = json.load(f)
+        self.num_rows = int(schema["num_rows"])
+        self.schema: Dict[str, str] = schema["columns"]
+        self._cols = {}
+        self._id_order = None
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "MetadataStore":
+        """
+        In-memory store over a list of records, encoded as MetadataWriter would
+        write them; nothing touches disk.
+        """
+        store = cls.__new__(cls)
+        store.path = None
+        store.num_rows = len(records)
+        store.schema = {}
+        store._cols = {}
+        store._id_order = None
+        for name in dict.fromkeys(name for r in records for name in r):
+            values = [r.get(name) for r in records]
+            kind = METADATA_SCHEMA.get(name)
+            if kind is None:
+                sample = next((v for v in values if v is not None), None)
+                kind = _infer_kind(sample) if sample is not None else "json"
+            store.schema[name] = kind
+            if kind in _FIXED_DTYPES:
+                store._cols[name] = (_encode_fixed(kind, values), None)
+            else:
+                blobs = [_encode_varlen(kind, v) for v in values]
+                offsets = np.concatenate([[0], np.cumsum([len(b) for b in blobs], dtype=np.int64)]).astype(np.int64)
+                store._cols[name] = (np.frombuffer(b"".join(blobs), dtype=np.uint8), offsets)
+        return store
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.schema)
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def _column(self, name: str):
+        if name not in self._cols:
+            kind = self.schema[name]
+            if self.num_rows == 0:
+                self._cols[name] = (np.zeros(0, dtype=_FIXED_DTYPES.get(kind, np.uint8)), np.zeros(1, dtype=np.int64))
+            elif kind in _FIXED_DTYPES:
+                self._cols[name] = (np.memmap(os.path.join(self.path, f"{name}.bin"), dtype=_FIXED_DTYPES[kind], mode="r"), None)
+            else:
+                data_path = os.path.join(self.path, f"{name}.data")
+                data = (np.memmap(data_path, dtype=np.uint8, mode="r")
+                        if os.path.getsize(data_path) else np.zeros(0, dtype=np.uint8))
+                offsets = np.memmap(os.path.join(self.path, f"{name}.offsets"), dtype=np.int64, mode="r")
+                self._cols[name] = (data, offsets)
+        return self._cols[name]
+
+    def _decode(self, name: str, rows: np.ndarray) -> List:
+        kind = self.schema[name]
+        values, offsets = self._column(name)
+        if kind in _FIXED_DTYPES:
+            picked = np.asarray(values[rows])
+            if kind == "float":
+                return [None if np.isnan(v) else v for v in picked.tolist()]
+            if kind == "bool":
+                return [None if v < 0 else bool(v) for v in picked.tolist()]
+            return picked.tolist()
+        starts, ends = offsets[rows], offsets[rows + 1]
+        out = []
+        for a, b in zip(starts.tolist(), ends.tolist()):
+            raw = values[a:b].tobytes().decode("utf-8")
+            out.append(raw if kind == "str" else (json.loads(raw) if raw else None))
+        return out
+
+    def gather(self, rows: Iterable[int], columns: Optional[List[str]] = None) -> Dict[str, List]:
+        """
+        Column-wise values for a batch of row positions: {column: [value per row]}.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        return {name: self._decode(name, rows) for name in (columns or self.columns) if name in self.schema}
+
+    def records(self, rows: Iterable[int], columns: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Row-wise dicts for a batch of row positions, in the given order.
+        """
+        cols = self.gather(rows, columns)
+        return [dict(zip(cols, vals)) for vals in zip(*cols.values())] if cols else []
+
+    def values(self, name: str) -> List:
+        """
+        Every value of one column, decoded (O(n); for build-time passes).
+        """
+        return self._decode(name, np.arange(self.num_rows, dtype=np.int64))
+
+    def array(self, name: str) -> np.ndarray:
+        """
+        Memory-mapped array of a fixed-width column.
+        """
+        return self._column(name)[0]
+
+    @property
+    def vector_ids(self) -> np.ndarray:
+        return self.array("vector_id")
+
+    def rows_for_ids(self, ids: Iterable[int]) -> np.ndarray:
+        """
+        Row positions for vector ids (-1 where unknown).
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if self._id_order is None:
+            self._id_order = np.argsort(self.vector_ids, kind="stable")
+        if not self.num_rows:
+            return np.full(len(ids), -1, dtype=np.int64)
+        sorted_ids = self.vector_ids[self._id_order]
+        pos = np.minimum(np.searchsorted(sorted_ids, ids), self.num_rows - 1)
+        return np.where(sorted_ids[pos] == ids, self._id_order[pos], -1)
+
+    def iter_records(self, rows: Optional[np.ndarray] = None, chunk_size: int = 10000):
+        """
+        Yields lists of row dicts over `rows` (default: all rows), chunk by chunk.
+        """
+        rows = np.arange(self.num_rows, dtype=np.int64) if rows is None else np.asarray(rows, dtype=np.int64)
+        for i in range(0, len(rows), chunk_size):
+            yield self.records(rows[i:i + chunk_size])
@@ -0,0 +1,225 @@
+"""
+In-process timing spans, counters and histograms, exported as Prometheus
+text or JSON.
+
+    with span("search.vector"):
+        ...
+
+    @span("build.embed")
+    def embed(...): ...
+
+    inc("embedding_calls")
+
+Every span observes its duration into the `stage_seconds` histogram under a
+`stage` label. A span costs two perf_counter() calls and one lock, so it is
+cheap enough to leave on; set METRICS_ENABLED=0 to turn recording off.
+"""
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") not in ("0", "false", "False", "")
+METRICS_NAMESPACE = "material_bot"
+
+# Seconds; covers sub-millisecond index lookups up to multi-minute build stages.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def count_buckets(limit: int) -> Tuple[float, ...]:
+    """
+    Bounds for histograms of counts (batch sizes, ...): 1, 2, 4, ... up to and including `limit`.
+    """
+    bounds = []
+    b = 1
+    while b < limit:
+        bounds.append(float(b))
+        b *= 2
+    return tuple(bounds) + (float(max(limit, 1)),)
+
+
+def _labels(labels: Dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, as Prometheus expects.
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-quantile (an over-estimate within one bucket).
+        """
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Span:
+    """
+    Times a block (context manager) or every call of a function (decorator).
+    """
+
+    __slots__ = ("registry", "stage", "labels", "_start")
+
+    def __init__(self, registry: "Metrics", stage: str, labels: Dict):
+        self.registry = registry
+        self.stage = stage
+        self.labels = labels
+        self._start = 0.0
+
+    def __enter__(self) -> "Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.registry.enabled:
+            self.registry.observe("stage_seconds", time.perf_counter() - self._start, stage=self.stage, **self.labels)
+            if exc_type is not None:
+                self.registry.inc("stage_errors", stage=self.stage, **self.labels)
+        return False
+
+    def __call__(self, fn):
+        registry, stage, labels = self.registry, self.stage, self.labels
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Span(registry, stage, labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and histograms keyed by (name, labels).
+    """
+
+    def __init__(self, namespace: str = METRICS_NAMESPACE, buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 enabled: bool = METRICS_ENABLED):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage: str, **labels) -> Span:
+        return Span(self, stage, labels)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = _labels(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Optional[Sequence[float]] = None, **labels):
+        """
+        Records `value` in the histogram `name`. `buckets` sets the bounds of a
+        series that isn't seconds (default: the registry's); it applies when
+        the series is first observed.
+        """
+        if not self.enabled:
+            return
+        key = _labels(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(buckets or self.buckets)
+            hist.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                full = f"{self.namespace}_{name}_total"
+                lines.append(f"# TYPE {full} counter")
+                lines.extend(f"{full}{_format_labels(key)} {value:g}" for key, value in sorted(series.items()))
+            for name, series in sorted(self.histograms.items()):
+                full = f"{self.namespace}_{name}"
+                lines.append(f"# TYPE {full} histogram")
+                for key, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(hist.bounds, hist.counts):
+                        cumulative += n
+                        lines.append(f"{full}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{full}_bucket{_format_labels(key, ('le', '+Inf'))} {hist.count}")
+                    lines.append(f"{full}_sum{_format_labels(key)} {hist.sum:.6f}")
+                    lines.append(f"{full}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict:
+        """
+        Counters, plus count / sum / mean / approximate p50 and p99 per histogram series.
+        """
+        with self._lock:
+            counters = {name: [{"labels": dict(key), "value": value} for key, value in sorted(series.items())]
+                        for name, series in sorted(self.counters.items())}
+            histograms = {name: [{
+                "labels": dict(key),
+                "count": hist.count,
+                "sum": round(hist.sum, 6),
+                "mean": round(hist.sum / hist.count, 6) if hist.count else 0.0,
+                "p50_le": hist.quantile(0.5),
+                "p99_le": hist.quantile(0.99),
+            } for key, hist in sorted(series.items())] for name, series in sorted(self.histograms.items())}
+        return {"counters": counters, "histograms": histograms}
+
+    def dump(self, path: str):
+        """
+        Writes Prometheus text for *.prom paths (node_exporter textfile format), JSON otherwise.
+        """
+        text = self.to_prometheus() if path.endswith(".prom") else json.dumps(self.to_dict(), indent=2)
+        with open(path + ".tmp", "w") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+
+METRICS = Metrics()
+span = METRICS.span
+inc = METRICS.inc
+observe = METRICS.observe
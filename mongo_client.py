@@ -0,0 +1,26 @@
+import os
+import threading
+from typing import Dict, Optional
+
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+
+_clients: Dict[str, MongoClient] = {}
+_lock = threading.Lock()
+
+
+def get_client(uri: Optional[str] = None) -> MongoClient:
+    """
+    One pooled MongoClient per URI for the whole process. MongoClient is
+    thread-safe and keeps its own connection pool, so callers share it instead
+    of opening a new client per call.
+    """
+    uri = uri or os.getenv("MONGO_URI") or "mongodb://localhost:27017"
+    with _lock:
+        if uri not in _clients:
+            _clients[uri] = MongoClient(uri, maxPoolSize=MONGO_MAX_POOL_SIZE)
+        return _clients[uri]
@@ -0,0 +1,263 @@
+"""
+Per-partition vector indexes: one small index per material_category_name /
+segment_types value, written into the snapshot next to the main index.
+
+    searcher = PartitionedSearcher(main_searcher, IndexRegistry(snapshot_dir, manifest))
+    scores, rows = searcher.search(q_vecs, k, filters, queries=texts)
+
+A query filtered to categories (or segments) that all have partitions is run
+only against those partitions, with the same results as the main index.
+Everything else searches the main index. With INDEX_ROUTE_QUERIES=1, a query
+that names a partition value ("exterior siding paint") is also routed to it,
+falling back to the main index only if the partitions hold fewer than k
+matches; that restricts it to the named category, so it is off by default.
+Partitions are read on first use and kept resident under an LRU byte budget.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import faiss
+from dotenv import load_dotenv
+
+from lexical_index import tokenize
+from metrics import span, inc
+from search import Searcher, truncate_embeddings, top_k
+
+load_dotenv()
+
+PARTITIONS_DIR = "partitions"
+PARTITION_FILE = "p{:04d}.bin"
+PARTITION_ROWS_FILE = "p{:04d}.rows.npy"
+PARTITION_BLOCK = 65536
+PARTITION_BUDGET_MB = float(os.getenv("INDEX_PARTITION_BUDGET_MB", "256"))
+ROUTE_QUERIES = os.getenv("INDEX_ROUTE_QUERIES", "0") not in ("0", "false", "False", "")
+
+
+def partition_rows(filter_index, field: str, min_rows: int) -> Dict[object, np.ndarray]:
+    """
+    {value: sorted metadata rows} for every value of `field` on at least `min_rows` rows.
+    """
+    sizes = filter_index.sizes.get(field, {})
+    return {v: np.flatnonzero(filter_index.mask({field: [v]})).astype(np.int64)
+            for v, n in sizes.items() if v != "" and n >= max(min_rows, 1)}
+
+
+def _row_vectors(shards: List[faiss.Index], offsets: np.ndarray, rows: np.ndarray, d: int,
+                 vectors: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Index-width vectors for sorted rows: from the full-precision file when
+    there is one, else decoded from the main index.
+    """
+    if vectors is not None:
+        return truncate_embeddings(np.asarray(vectors[rows], dtype=np.float32), d)
+    out = np.empty((len(rows), d), dtype=np.float32)
+    shard_of = np.searchsorted(offsets, rows, side="right") - 1
+    for i in np.unique(shard_of):
+        base = faiss.downcast_index(shards[i].index) if isinstance(shards[i], faiss.IndexIDMap2) else shards[i]
+        take = shard_of == i
+        out[take] = base.reconstruct_batch(rows[take] - offsets[i])
+    return out
+
+
+def build_partitions(shards: List[faiss.Index], empty: faiss.Index, filter_index, vector_ids: np.ndarray,
+                     base_dir: str, fields: Sequence[str], min_rows: int,
+                     vectors: Optional[np.ndarray] = None) -> List[Dict]:
+    """
+    Writes one index per (field, value) partition under base_dir/partitions and
+    returns their manifest entries. Each starts as a copy of `empty` (the main
+    index's trained, empty index), so it shares its quantizer, and is built and
+    saved one at a time.
+    """
+    offsets = np.cumsum([0] + [s.ntotal for s in shards])
+    for shard in shards:
+        ivf = faiss.try_extract_index_ivf(shard)
+        if ivf is not None and vectors is None:
+            ivf.make_direct_map()
+    os.makedirs(os.path.join(base_dir, PARTITIONS_DIR), exist_ok=True)
+    entries = []
+    for field in fields:
+        for value, rows in sorted(partition_rows(filter_index, field, min_rows).items(), key=lambda kv: str(kv[0])):
+            n = len(entries)
+            index = faiss.clone_index(empty)
+            for start in range(0, len(rows), PARTITION_BLOCK):
+                block = rows[start:start + PARTITION_BLOCK]
+                index.add_with_ids(_row_vectors(shards, offsets, block, empty.d, vectors), vector_ids[block])
+            index_rel = os.path.join(PARTITIONS_DIR, PARTITION_FILE.format(n))
+            rows_rel = os.path.join(PARTITIONS_DIR, PARTITION_ROWS_FILE.format(n))
+            faiss.write_index(index, os.path.join(base_dir, index_rel))
+            np.save(os.path.join(base_dir, rows_rel), rows)
+            entries.append({
+                "field": field,
+                "value": value,
+                "rows": len(rows),
+                "index_file": index_rel,
+                "rows_file": rows_rel,
+                "bytes": os.path.getsize(os.path.join(base_dir, index_rel)) + rows.nbytes,
+            })
+            inc("partitions_built")
+    return entries
+
+
+class IndexRegistry:
+    """
+    The partitions of one snapshot, loaded on demand. Loaded partitions are
+    kept in memory in least-recently-used order and the oldest are dropped
+    once their total size passes `budget_mb` (the partition in use is always kept).
+    """
+
+    def __init__(self, base_dir: str, entries: List[Dict], filter_index=None, search_params: Optional[Dict] = None,
+                 vectors: Optional[np.ndarray] = None, budget_mb: float = PARTITION_BUDGET_MB):
+        self.base_dir = base_dir
+        self.entries = {(e["field"], e["value"]): e for e in entries}
+        self.fields = list(dict.fromkeys(e["field"] for e in entries))
+        self.filter_index = filter_index
+        self.search_params = search_params
+        self.vectors = vectors
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.loads = 0
+        self.evictions = 0
+        self._resident: "OrderedDict[Tuple, Searcher]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Value tokens per partition, for routing on the query text.
+        self._terms = {key: set(tokenize(key[1])) for key in self.entries}
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(self.entries[key]["bytes"] for key in self._resident)
+
+    def _load(self, key: Tuple) -> Searcher:
+        entry = self.entries[key]
+        with span("partition.load"):
+            index = faiss.read_index(os.path.join(self.base_dir, entry["index_file"]))
+            rows = np.load(os.path.join(self.base_dir, entry["rows_file"]))
+        return Searcher(index, self.filter_index, self.search_params, self.vectors, rows=rows)
+
+    def get(self, key: Tuple) -> Searcher:
+        with self._lock:
+            searcher = self._resident.get(key)
+            if searcher is not None:
+                self._resident.move_to_end(key)
+                inc("partition_lookups", result="resident")
+                return searcher
+        searcher = self._load(key)
+        inc("partition_lookups", result="loaded")
+        with self._lock:
+            searcher = self._resident.setdefault(key, searcher)
+            self._resident.move_to_end(key)
+            self.loads += 1
+            while len(self._resident) > 1 and self.resident_bytes > self.budget:
+                self._resident.popitem(last=False)
+                self.evictions += 1
+                inc("partition_evictions")
+        return searcher
+
+    def route(self, filters: Optional[Dict] = None, query: Optional[str] = None) -> Tuple[List[Tuple], bool]:
+        """
+        (partition keys, exact) for a query. Exact routes come from filters on a
+        partitioned field, every value of which has a partition; inexact ones
+        from partition values named in the query text. ([], False) means the main index.
+        """
+        for field in self.fields:
+            values = (filters or {}).get(field)
+            if values and all((field, v) in self.entries for v in values):
+                return [(field, v) for v in values], True
+        if query and ROUTE_QUERIES:
+            tokens = set(tokenize(query))
+            for field in self.fields:
+                keys = [key for key, terms in self._terms.items()
+                        if key[0] == field and terms and terms <= tokens]
+                if keys:
+                    return sorted(keys, key=str), False
+        return [], False
+
+    def stats(self) -> Dict:
+        return {
+            "partitions": len(self.entries),
+            "resident": len(self._resident),
+            "resident_mb": round(self.resident_bytes / (1024 * 1024), 1),
+            "budget_mb": round(self.budget / (1024 * 1024), 1),
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+def _drop_repeats(rows: np.ndarray) -> np.ndarray:
+    """
+    rows with every repeat of a row within a query set to -1 (a material can
+    be in several segment partitions).
+    """
+    order = np.argsort(rows, axis=1, kind="stable")
+    ranked = np.take_along_axis(rows, order, axis=1)
+    repeat = np.zeros(ranked.shape, dtype=bool)
+    repeat[:, 1:] = (ranked[:, 1:] == ranked[:, :-1]) & (ranked[:, 1:] >= 0)
+    out = np.empty_like(rows)
+    np.put_along_axis(out, order, np.where(repeat, -1, ranked), axis=1)
+    return out
+
+
+class PartitionedSearcher:
+    """
+    Searcher that routes each query to the relevant partitions of an
+    IndexRegistry and searches them in parallel, merging their top-k lists;
+    queries with no route use the main `searcher`.
+    """
+
+    def __init__(self, searcher: Searcher, registry: IndexRegistry):
+        self.searcher = searcher
+        self.registry = registry
+        self.filter_index = searcher.filter_index
+        self.fallbacks = 0
+        self._pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="partition")
+
+    @property
+    def ntotal(self) -> int:
+        return self.searcher.ntotal
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        self.searcher.close()
+
+    def search(self, q_vecs: np.ndarray, k: int, filters: Optional[Dict] = None,
+               queries: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Same contract as Searcher.search; `queries` (the query texts) enables text routing.
+        """
+        q_vecs = np.ascontiguousarray(q_vecs, dtype=np.float32)
+        texts = list(queries) if queries is not None else [None] * len(q_vecs)
+        groups: Dict[Tuple, List[int]] = {}
+        for i, text in enumerate(texts):
+            keys, exact = self.registry.route(filters, text)
+            groups.setdefault((tuple(keys), exact), []).append(i)
+
+        scores = np.full((len(q_vecs), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(q_vecs), k), -1, dtype=np.int64)
+        for (keys, exact), members in groups.items():
+            if not keys:
+                scores[members], rows[members] = self.searcher.search(q_vecs[members], k, filters)
+                continue
+            inc("partition_routes", kind="filter" if exact else "query")
+            s, r = self._fan_out(keys, q_vecs[members], k, filters)
+            if not exact:
+                # A guessed route must not cost results: short lists go to the main index.
+                short = (r < 0).any(axis=1)
+                if short.any():
+                    self.fallbacks += int(short.sum())
+                    inc("partition_fallbacks", int(short.sum()))
+                    s[short], r[short] = self.searcher.search(q_vecs[members][short], k, filters)
+            scores[members], rows[members] = s, r
+        return scores, rows
+
+    def _fan_out(self, keys: Sequence[Tuple], q_vecs: np.ndarray, k: int,
+                 filters: Optional[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        searchers = [self.registry.get(key) for key in keys]
+        if len(searchers) == 1:
+            with span("search.partition"):
+                return searchers[0].search(q_vecs, k, filters)
+        with span("search.partition", fanout="true"):
+            results = list(self._pool.map(lambda s: s.search(q_vecs, k, filters), searchers))
+        with span("search.merge"):
+            return top_k(np.hstack([s for s, _ in results]), _drop_repeats(np.hstack([r for _, r in results])), k)
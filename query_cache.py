@@ -0,0 +1,121 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from metrics import inc
+
+load_dotenv()
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU map whose entries also expire `ttl` seconds after insertion.
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+def freeze_filters(filters: Optional[Dict]) -> Tuple:
+    return tuple(sorted((k, tuple(sorted(map(str, v)))) for k, v in (filters or {}).items()))
+
+
+class QueryCache:
+    """
+    Two tiers: normalized query text -> embedding, and
+    (query, filters, k, index version) -> ranked (scores, rows).
+    Callers pass the version of the snapshot they searched, since rows refer
+    to positions in that snapshot and readers may hold different ones.
+    Binding a different index version drops the result tier; binding a
+    different embedding model drops the embedding tier too.
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.embeddings = TTLCache(maxsize, ttl)
+        self.results = TTLCache(maxsize, ttl)
+        self.index_version = None
+        self.embed_model = None
+
+    def bind(self, index_version, embed_model: Optional[str] = None):
+        if index_version != self.index_version:
+            self.results.clear()
+            self.index_version = index_version
+        if embed_model != self.embed_model:
+            self.embeddings.clear()
+            self.embed_model = embed_model
+
+    def embedding(self, query: str, embed_fn: Callable[[str], np.ndarray]) -> np.ndarray:
+        key = normalize_query(query)
+        vec = self.embeddings.get(key)
+        inc("query_cache_lookups", tier="embedding", result="miss" if vec is None else "hit")
+        if vec is None:
+            # The normalized text is only the key; the model sees what was typed.
+            vec = embed_fn(query)
+            self.embeddings.put(key, vec)
+        return vec
+
+    def _result_key(self, query: str, filters: Optional[Dict], k: int, index_version) -> Tuple:
+        return (normalize_query(query), freeze_filters(filters), k, index_version)
+
+    def get_results(self, query: str, filters: Optional[Dict], k: int, index_version):
+        cached = self.results.get(self._result_key(query, filters, k, index_version))
+        inc("query_cache_lookups", tier="results", result="miss" if cached is None else "hit")
+        return cached
+
+    def put_results(self, query: str, filters: Optional[Dict], k: int, index_version,
+                    scores: np.ndarray, rows: np.ndarray):
+        self.results.put(self._result_key(query, filters, k, index_version), (scores, rows))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "embedding_hits": self.embeddings.hits,
+            "embedding_misses": self.embeddings.misses,
+            "result_hits": self.results.hits,
+            "result_misses": self.results.misses,
+        }
@@ -0,0 +1,311 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import faiss
+
+from filter_index import FilterIndex
+from filters import filter_by_exact_fields
+from lexical_index import LexicalIndex
+from metrics import span, inc
+
+# Metadata columns shown for each hit unless a caller asks for others.
+RESULT_FIELDS = [
+    "title", "material_brand_name", "family_name", "finish",
+    "voc_level", "price_per_sqft", "tags", "hex",
+]
+
+# Reciprocal rank fusion constant and the candidates taken from each side.
+RRF_K = 60
+HYBRID_DEPTH = 100
+
+# With full-precision vectors attached, the compressed index returns
+# k * RESCORE_FACTOR candidates, which are then rescored exactly.
+RESCORE_FACTOR = 4
+# Candidate vectors gathered per rescoring step (queries * shortlist depth).
+RESCORE_BLOCK = 4096
+
+
+def truncate_embeddings(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """
+    The first `dim` components of each row, re-normalized to unit length.
+    text-embedding-3 models are trained so that such prefixes stay usable
+    embeddings. Rows no wider than `dim` are returned unchanged.
+    """
+    if not dim or vectors.shape[1] <= dim:
+        return vectors
+    out = np.array(vectors[:, :dim], dtype=np.float32, order="C")
+    faiss.normalize_L2(out)
+    return out
+
+
+def top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Best k candidates per query by score, ties broken by the lower row; -1
+    slots (score -inf) sort last.
+    """
+    valid = rows >= 0
+    scores = np.where(valid, scores, -np.inf).astype(np.float32)
+    order = np.lexsort((np.where(valid, rows, np.iinfo(np.int64).max), -scores), axis=-1)[:, :k]
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+
+def shard_bits(bits: np.ndarray, offset: int, n: int) -> np.ndarray:
+    """
+    Rows [offset, offset + n) of a packed little-endian row bitmap, re-based to 0.
+    """
+    if offset % 8 == 0:
+        return np.ascontiguousarray(bits[offset // 8:(offset + n + 7) // 8])
+    return np.packbits(np.unpackbits(bits, count=offset + n, bitorder="little")[offset:], bitorder="little")
+
+
+class Searcher:
+    """
+    Vector search over metadata rows. Filters are resolved to a bitmap over the
+    eligible rows before scoring, so only matching vectors are ever ranked and a
+    filtered query still returns up to k results.
+
+    `index` may be a list of shards holding consecutive row ranges. Shards are
+    searched in parallel on a thread pool (FAISS releases the GIL) and their
+    top-k lists merged by score, ties broken by row, so for Flat and flat-code
+    specs the result is the same as searching one index over all rows.
+
+    When `vectors` holds the full-precision embeddings in row order (usually a
+    memory-mapped file), the index may be compressed (SQ8, SQfp16, PQ) and/or
+    dimension-truncated: it then only shortlists k * rescore candidates, and
+    those are ranked by their exact inner product with the full query.
+
+    With `rows` (sorted metadata rows), the index holds only those rows, in
+    that order: filters and results are translated, so it searches like the
+    full index restricted to them (this is how partitions are searched).
+    """
+
+    def __init__(self, index: Union[faiss.Index, Sequence[faiss.Index]], filter_index: Optional[FilterIndex] = None,
+                 search_params: Optional[Dict] = None, vectors: Optional[np.ndarray] = None,
+                 rows: Optional[np.ndarray] = None):
+        self.index = index
+        self.filter_index = filter_index
+        self.vectors = vectors
+        self.rows = rows
+        shards = list(index) if isinstance(index, (list, tuple)) else [index]
+        # Metadata rows are positions in the wrapped index, shard after shard.
+        self.bases = [faiss.downcast_index(s.index) if isinstance(s, (faiss.IndexIDMap, faiss.IndexIDMap2)) else s
+                      for s in shards]
+        self.base = self.bases[0]
+        self.offsets = np.cumsum([0] + [b.ntotal for b in self.bases])
+        self._pool = (ThreadPoolExecutor(max_workers=min(len(self.bases), os.cpu_count() or 1),
+                                         thread_name_prefix="shard")
+                      if len(self.bases) > 1 else None)
+        self.search_params = dict(search_params or {})
+        self.rescore = int(self.search_params.get("rescore") or RESCORE_FACTOR)
+        self._apply_search_params()
+
+    def _apply_search_params(self):
+        for base in self.bases:
+            ivf = faiss.try_extract_index_ivf(base)
+            if ivf is not None and "nprobe" in self.search_params:
+                ivf.nprobe = int(self.search_params["nprobe"])
+            if hasattr(base, "hnsw") and "efSearch" in self.search_params:
+                base.hnsw.efSearch = int(self.search_params["efSearch"])
+
+    @staticmethod
+    def _params(base: faiss.Index, sel) -> faiss.SearchParameters:
+        """
+        Search parameters of the type the base index expects, carrying the selector.
+        """
+        ivf = faiss.try_extract_index_ivf(base)
+        if ivf is not None:
+            return faiss.SearchParametersIVF(sel=sel, nprobe=ivf.nprobe)
+        if hasattr(base, "hnsw"):
+            return faiss.SearchParametersHNSW(sel=sel, efSearch=base.hnsw.efSearch)
+        return faiss.SearchParameters(sel=sel)
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.offsets[-1])
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    def search(self, q_vecs: np.ndarray, k: int, filters: Optional[Dict] = None,
+               queries: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (scores, rows), both shaped (len(q_vecs), k). Missing slots have row -1.
+        Queries wider than the index are truncated for the first pass. `queries`
+        (the query texts) is only used by searchers that route on it.
+        """
+        q_vecs = np.ascontiguousarray(q_vecs, dtype=np.float32)
+        if q_vecs.shape[1] < self.base.d:
+            raise ValueError(f"Query vectors have {q_vecs.shape[1]} dimensions but the index has {self.base.d}; "
+                             "embed queries with the model in the index manifest (embed_model)")
+        inc("vector_queries", len(q_vecs))
+        first = truncate_embeddings(q_vecs, self.base.d)
+        if self.vectors is None:
+            return self._first_pass(first, k, filters)
+        depth = max(k, min(k * self.rescore, self.ntotal))
+        _, rows = self._first_pass(first, depth, filters)
+        with span("search.rescore"):
+            return self._rescore(q_vecs, rows, k)
+
+    def _first_pass(self, q_vecs: np.ndarray, k: int, filters: Optional[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        with span("search.filter_mask"):
+            bitmap = self.filter_index.bits(filters) if (filters and self.filter_index) else None
+            if bitmap is not None and self.rows is not None:
+                bitmap = np.packbits((bitmap[self.rows >> 3] >> (self.rows & 7).astype(np.uint8)) & 1,
+                                     bitorder="little")
+        if bitmap is not None and not bitmap.any():
+            return (np.full((len(q_vecs), k), -np.inf, dtype=np.float32),
+                    np.full((len(q_vecs), k), -1, dtype=np.int64))
+        labels = {"filtered": "true"} if bitmap is not None else {}
+        if self._pool is None:
+            with span("search.vector", **labels):
+                scores, rows = self._search_shard(0, q_vecs, k, bitmap)
+        else:
+            with span("search.vector", sharded="true", **labels):
+                results = list(self._pool.map(lambda i: self._search_shard(i, q_vecs, k, bitmap),
+                                              range(len(self.bases))))
+            with span("search.merge"):
+                scores = np.hstack([s for s, _ in results])
+                rows = np.hstack([np.where(r >= 0, r + offset, -1) for (_, r), offset in zip(results, self.offsets)])
+                scores, rows = top_k(scores, rows, k)
+        if self.rows is not None:
+            rows = np.where(rows >= 0, self.rows[np.maximum(rows, 0)], -1)
+        return scores, rows
+
+    def _search_shard(self, i: int, q_vecs: np.ndarray, k: int,
+                      bitmap: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        base = self.bases[i]
+        if bitmap is None:
+            return base.search(q_vecs, k)
+        bits = shard_bits(bitmap, int(self.offsets[i]), base.ntotal)
+        if not bits.any():
+            return (np.full((len(q_vecs), k), -np.inf, dtype=np.float32),
+                    np.full((len(q_vecs), k), -1, dtype=np.int64))
+        sel = faiss.IDSelectorBitmap(len(bits), faiss.swig_ptr(bits))
+        return base.search(q_vecs, k, params=self._params(base, sel))
+
+    def _rescore(self, q_vecs: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact inner products for the shortlisted rows, top k per query, ties broken by row.
+        Each query is scored against its own shortlist only, RESCORE_BLOCK
+        candidates at a time.
+        """
+        exact = np.full(rows.shape, -np.inf, dtype=np.float32)
+        step = max(1, RESCORE_BLOCK // max(1, rows.shape[1]))
+        for start in range(0, len(rows), step):
+            block = rows[start:start + step]
+            valid = block >= 0
+            uniq = np.unique(block[valid])
+            if not len(uniq):
+                continue
+            inc("rescored_vectors", len(uniq))
+            # Sorted rows read the memory-mapped file front to back.
+            vecs = np.asarray(self.vectors[uniq], dtype=np.float32)
+            cand = vecs[np.searchsorted(uniq, np.where(valid, block, uniq[0]))]
+            exact[start:start + step] = np.einsum("qd,qkd->qk", q_vecs[start:start + step], cand)
+        return top_k(exact, rows, k)
+
+
+def rrf_fuse(rankings: Sequence[np.ndarray], k: int, rrf_k: int = RRF_K) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reciprocal rank fusion of ranked row lists (-1 entries ignored). Returns
+    (scores, rows) of length k, ties broken by row; missing slots have row -1.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(int(r) for r in ranking):
+            if row >= 0:
+                fused[row] = fused.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:k]
+    scores = np.full(k, -np.inf, dtype=np.float32)
+    rows = np.full(k, -1, dtype=np.int64)
+    if best:
+        rows[:len(best)] = [r for r, _ in best]
+        scores[:len(best)] = [s for _, s in best]
+    return scores, rows
+
+
+class HybridSearcher:
+    """
+    BM25 + vector retrieval fused with reciprocal rank fusion. The lexical side
+    runs on a worker thread while the queries are embedded and vector-searched.
+    Queries equal to a material's sku, hex or title are answered from the
+    lexical index alone and never embedded.
+    """
+
+    def __init__(self, searcher: Searcher, lexical: LexicalIndex, depth: int = HYBRID_DEPTH, rrf_k: int = RRF_K):
+        self.searcher = searcher
+        self.lexical = lexical
+        self.filter_index = searcher.filter_index
+        self.depth = depth
+        self.rrf_k = rrf_k
+        self.skipped_embeddings = 0
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lexical")
+
+    @property
+    def ntotal(self) -> int:
+        return self.searcher.ntotal
+
+    @span("search.lexical")
+    def _lexical_search(self, queries: Sequence[str], depth: int, mask: Optional[np.ndarray]) -> List[np.ndarray]:
+        return [self.lexical.search(q, depth, mask)[1] for q in queries]
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        self.searcher.close()
+
+    def search(self, queries: Sequence[str], k: int, filters: Optional[Dict] = None,
+               embed_fn: Callable[[List[str]], np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (scores, rows) shaped (len(queries), k), like Searcher.search.
+        `embed_fn` maps a list of query strings to a matrix of embeddings.
+        """
+        mask = self.filter_index.mask(filters) if (filters and self.filter_index) else None
+        depth = max(k, self.depth)
+        lexical = self._pool.submit(self._lexical_search, queries, depth, mask)
+        exact = [self.lexical.exact(q, mask) for q in queries]
+        semantic = [i for i, rows in enumerate(exact) if not len(rows)]
+        self.skipped_embeddings += len(queries) - len(semantic)
+        inc("embeddings_skipped", len(queries) - len(semantic))
+
+        vector_rows = {}
+        if semantic:
+            with span("search.embed"):
+                vecs = np.ascontiguousarray(embed_fn([queries[i] for i in semantic]), dtype=np.float32)
+            faiss.normalize_L2(vecs)
+            _, rows = self.searcher.search(vecs, depth, filters=filters, queries=[queries[i] for i in semantic])
+            vector_rows = dict(zip(semantic, rows))
+
+        lexical_results = lexical.result()
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        rows = np.empty((len(queries), k), dtype=np.int64)
+        with span("search.fuse"):
+            for i, lexical_rows in enumerate(lexical_results):
+                if i in vector_rows:
+                    scores[i], rows[i] = rrf_fuse([vector_rows[i], lexical_rows], k, self.rrf_k)
+                else:
+                    # Exact matches first, then the rest of the BM25 ranking.
+                    ranked = np.concatenate([exact[i], lexical_rows[~np.isin(lexical_rows, exact[i])]])
+                    scores[i], rows[i] = rrf_fuse([ranked], k, self.rrf_k)
+        return scores, rows
+
+
+def materialize_hits(store, scores: np.ndarray, rows: np.ndarray, fields: List[str] = RESULT_FIELDS,
+                     leftover_filters: Optional[Dict] = None) -> List[Dict]:
+    """
+    Gathers `fields` for one query's hits (O(k)) and attaches scores. Filters the
+    index couldn't resolve (no posting list) are checked here on the hits.
+    """
+    leftover_filters = leftover_filters or {}
+    hits = rows >= 0
+    with span("search.materialize"):
+        records = store.records(rows[hits], list(fields) + [f for f in leftover_filters if f not in fields])
+    for record, score in zip(records, scores[hits]):
+        record["score"] = float(score)
+    if leftover_filters:
+        with span("search.post_filter"):
+            records = filter_by_exact_fields(records, leftover_filters)
+    inc("results_returned", len(records))
+    return records
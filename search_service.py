@@ -0,0 +1,271 @@
+"""
+Headless HTTP search service.
+
+    python search_service.py --port 8080
+
+POST /search  {"query": "...", "k": 20, "filters": {"finish": ["Flat"]}, "fields": ["title", "hex"]}
+POST /facets  {"filters": {"finish": ["Flat"]}, "fields": ["family_name"]} -> per-value counts
+GET  /stats   queue depth, batch sizes, request counts, resident partitions
+GET  /metrics  per-stage timings and counters, Prometheus text (/metrics.json for JSON)
+GET  /healthz
+
+Requests arriving within a short window are embedded in one API call and
+searched as one query matrix. Results fuse BM25 and vector rankings; queries
+equal to a sku, hex or title are answered lexically without embedding.
+New index builds are picked up without a restart (see live_index.py).
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+import faiss
+from aiohttp import web
+from dotenv import load_dotenv
+
+from embeddings.embedder import get_embeddings
+from filters import normalize_filters
+from live_index import LiveIndex
+from metrics import METRICS, count_buckets, span
+from query_cache import QueryCache, normalize_query, freeze_filters
+from search import RESULT_FIELDS, materialize_hits
+
+load_dotenv()
+
+SEARCH_BATCH_WINDOW_MS = float(os.getenv("SEARCH_BATCH_WINDOW_MS", "5"))
+SEARCH_MAX_BATCH = int(os.getenv("SEARCH_MAX_BATCH", "64"))
+SEARCH_MAX_K = 200
+
+
+class _Pending:
+    __slots__ = ("query", "k", "filters", "future")
+
+    def __init__(self, query: str, k: int, filters: Optional[Dict], future: asyncio.Future):
+        self.query = query
+        self.k = k
+        self.filters = filters
+        self.future = future
+
+
+class MicroBatcher:
+    """
+    Collects requests for up to `window_ms` (or `max_batch` requests), embeds the
+    uncached queries in one call, then runs one search per distinct filter set
+    over the stacked query vectors. Blocking work runs in the default executor.
+    Each batch runs against one snapshot of `live`, returned with its results,
+    and its queries are embedded with that snapshot's model unless `embed_fn`
+    (texts -> vectors) is given.
+    """
+
+    def __init__(self, live: LiveIndex, embed_fn=None,
+                 window_ms: float = SEARCH_BATCH_WINDOW_MS, max_batch: int = SEARCH_MAX_BATCH,
+                 query_cache: Optional[QueryCache] = None):
+        self.live = live
+        self.embed_fn = embed_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.size_buckets = count_buckets(max_batch)
+        self.query_cache = query_cache or QueryCache()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.batch_sizes = Counter()
+        self.requests = 0
+        self.batches = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def submit(self, query: str, k: int, filters: Optional[Dict]):
+        fut = asyncio.get_running_loop().create_future()
+        self.requests += 1
+        await self.queue.put(_Pending(query, k, filters, fut))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.batches += 1
+            self.batch_sizes[len(batch)] += 1
+            METRICS.observe("batch_size", len(batch), buckets=self.size_buckets)
+            try:
+                results = await loop.run_in_executor(None, self._execute, batch)
+            except Exception as e:
+                results = [e] * len(batch)
+            for p, r in zip(batch, results):
+                if p.future.done():
+                    continue
+                if isinstance(r, Exception):
+                    p.future.set_exception(r)
+                else:
+                    p.future.set_result(r)
+
+    def _embed(self, queries: List[str], model: str) -> np.ndarray:
+        cache = self.query_cache.embeddings
+        # Keyed by model too: snapshots built with different models can be live one after another.
+        keys = [(model, normalize_query(q)) for q in queries]
+        known = {k: cache.get(k) for k in set(keys)}
+        missing = [k for k, v in known.items() if v is None]
+        if missing:
+            # Normalized text is only the cache key; embed the first query seen for it.
+            originals = {}
+            for key, q in zip(keys, queries):
+                originals.setdefault(key, q)
+            texts = [originals[key] for key in missing]
+            vecs = self.embed_fn(texts) if self.embed_fn else get_embeddings(texts, model=model)
+            for key, vec in zip(missing, vecs):
+                cache.put(key, vec)
+                known[key] = vec
+        vecs = np.stack([known[k] for k in keys]).astype(np.float32)
+        faiss.normalize_L2(vecs)
+        return vecs
+
+    @span("service.batch")
+    def _execute(self, batch: List[_Pending]):
+        snapshot = self.live.current
+        searcher = snapshot.searcher
+        # One embedding call for the whole batch; exact-term queries don't need one.
+        semantic = list(dict.fromkeys(p.query for p in batch if not len(searcher.lexical.exact(p.query))))
+        vectors = dict(zip(semantic, self._embed(semantic, snapshot.embed_model))) if semantic else {}
+
+        def lookup(texts: List[str]) -> np.ndarray:
+            # Exact matches outside a group's filters are embedded after all.
+            missing = [t for t in dict.fromkeys(texts) if t not in vectors]
+            if missing:
+                vectors.update(zip(missing, self._embed(missing, snapshot.embed_model)))
+            return np.stack([vectors[t] for t in texts])
+
+        results = [None] * len(batch)
+        groups: Dict[tuple, List[int]] = {}
+        for i, p in enumerate(batch):
+            groups.setdefault(freeze_filters(p.filters), []).append(i)
+        for members in groups.values():
+            k = max(batch[i].k for i in members)
+            filters = batch[members[0]].filters
+            try:
+                D, I = searcher.search([batch[i].query for i in members], k, filters, embed_fn=lookup)
+            except Exception as e:
+                # Only this filter group's requests fail.
+                for i in members:
+                    results[i] = e
+                continue
+            for j, i in enumerate(members):
+                results[i] = (D[j, :batch[i].k], I[j, :batch[i].k], snapshot)
+        return results
+
+    def stats(self) -> Dict:
+        total = sum(s * c for s, c in self.batch_sizes.items())
+        return {
+            "queue_depth": self.queue.qsize(),
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": total / self.batches if self.batches else 0.0,
+            "max_batch_size": max(self.batch_sizes, default=0),
+            "skipped_embeddings": getattr(self.live.current.searcher, "skipped_embeddings", 0),
+            "batch_sizes": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+        }
+
+
+def create_app(live: LiveIndex, embed_fn=None,
+               window_ms: float = SEARCH_BATCH_WINDOW_MS, max_batch: int = SEARCH_MAX_BATCH) -> web.Application:
+    batcher = MicroBatcher(live, embed_fn, window_ms, max_batch)
+    app = web.Application()
+    app["batcher"] = batcher
+
+    async def on_startup(app):
+        batcher.start()
+
+    async def on_cleanup(app):
+        await batcher.stop()
+
+    async def search(request: web.Request):
+        try:
+            body = await request.json()
+            query = str(body["query"])
+            k = max(1, min(int(body.get("k", 20)), SEARCH_MAX_K))
+            filters = normalize_filters(body.get("filters") or None)
+            fields = body.get("fields") or RESULT_FIELDS
+        except (ValueError, KeyError, TypeError) as e:
+            return web.json_response({"error": f"bad request: {e}"}, status=400)
+        start = time.perf_counter()
+        with span("service.request"):
+            scores, rows, snapshot = await batcher.submit(query, k, filters)
+            fidx = snapshot.searcher.filter_index
+            leftover = fidx.unindexed(filters) if (filters and fidx) else {}
+            results = materialize_hits(snapshot.store, scores, rows, fields, leftover)
+        return web.json_response({
+            "query": query,
+            "results": results,
+            "took_ms": round((time.perf_counter() - start) * 1000, 2),
+        }, dumps=lambda obj: json.dumps(obj, default=str))
+
+    async def facets(request: web.Request):
+        try:
+            body = await request.json() if request.can_read_body else {}
+            filters = normalize_filters(body.get("filters") or None) or {}
+            fields = body.get("fields") or None
+        except (ValueError, AttributeError) as e:
+            return web.json_response({"error": f"bad request: {e}"}, status=400)
+        fidx = live.current.searcher.filter_index
+        return web.json_response({
+            "total": fidx.count(filters),
+            "facets": fidx.facet_counts(filters, fields),
+        }, dumps=lambda obj: json.dumps(obj, default=str))
+
+    async def stats(request: web.Request):
+        # HybridSearcher -> PartitionedSearcher for builds with partitions.
+        registry = getattr(getattr(live.current.searcher, "searcher", None), "registry", None)
+        return web.json_response({**batcher.stats(), "index_version": live.current.version, "index_swaps": live.swaps,
+                                  "partitions": registry.stats() if registry is not None else None})
+
+    async def metrics(request: web.Request):
+        return web.Response(text=METRICS.to_prometheus(), content_type="text/plain", charset="utf-8")
+
+    async def metrics_json(request: web.Request):
+        return web.json_response(METRICS.to_dict(), dumps=lambda obj: json.dumps(obj, default=str))
+
+    async def healthz(request: web.Request):
+        return web.json_response({"ok": True, "materials": live.current.searcher.ntotal,
+                                  "index_version": live.current.version})
+
+    app.router.add_post("/search", search)
+    app.router.add_post("/facets", facets)
+    app.router.add_get("/stats", stats)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/metrics.json", metrics_json)
+    app.router.add_get("/healthz", healthz)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Material search HTTP service")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--window-ms", type=float, default=SEARCH_BATCH_WINDOW_MS)
+    parser.add_argument("--max-batch", type=int, default=SEARCH_MAX_BATCH)
+    args = parser.parse_args()
+
+    print("▶️  Loading index and metadata...")
+    live = LiveIndex().start()
+    print(f"   {live.current.searcher.ntotal} materials, index version {live.current.version}.")
+    web.run_app(create_app(live, window_ms=args.window_ms, max_batch=args.max_batch),
+                host=args.host, port=args.port)
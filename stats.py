@@ -1,30 +1,80 @@
 import os
-from pymongo import MongoClient
+import time
+import threading
 from dotenv import load_dotenv
 
+from mongo_client import get_client
+
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("MONGO_DB") or os.getenv("DB_NAME")  # fallback for alt var name
 COL_SRC = "materials"
 COL_DST = "materials_new"
+STATS_TTL_SECONDS = float(os.getenv("STATS_TTL_SECONDS", "60"))
 
-def get_material_stats():
-    if not MONGO_URI or not DB_NAME:
-        return {"total": 0, "transferred": 0, "pending": 0}
+_EMPTY = {"total": 0, "transferred": 0, "pending": 0, "by_category": {}, "by_brand": {}}
+_cache = {"at": 0.0, "stats": None}
+_lock = threading.Lock()
 
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
 
-    try:
-        total = db[COL_SRC].count_documents({})
-        transferred = db[COL_SRC].count_documents({"extracted": True})
-        pending = total - transferred
-    except Exception:
-        total, transferred, pending = 0, 0, 0
+def _count_fields():
+    return {
+        "total": {"$sum": 1},
+        "transferred": {"$sum": {"$cond": [{"$eq": ["$extracted", True]}, 1, 0]}},
+    }
+
+
+def _breakdown(rows):
+    return {
+        str(r["_id"]): {
+            "total": r["total"],
+            "transferred": r["transferred"],
+            "pending": r["total"] - r["transferred"],
+        }
+        for r in rows
+    }
+
 
+def compute_material_stats(col):
+    """
+    Totals plus per-category and per-brand counts in one $facet aggregation,
+    i.e. a single pass over the collection.
+    """
+    pipeline = [{"$facet": {
+        "totals": [{"$group": {"_id": None, **_count_fields()}}],
+        "by_category": [{"$group": {"_id": "$material_category_id", **_count_fields()}}],
+        "by_brand": [{"$group": {"_id": "$material_brand_id", **_count_fields()}}],
+    }}]
+    result = next(col.aggregate(pipeline), {})
+    totals = (result.get("totals") or [{"total": 0, "transferred": 0}])[0]
     return {
-        "total": total,
-        "transferred": transferred,
-        "pending": pending
-    }
\ No newline at end of file
+        "total": totals["total"],
+        "transferred": totals["transferred"],
+        "pending": totals["total"] - totals["transferred"],
+        "by_category": _breakdown(result.get("by_category", [])),
+        "by_brand": _breakdown(result.get("by_brand", [])),
+    }
+
+
+def get_material_stats(force_refresh=False):
+    """
+    Cached for STATS_TTL_SECONDS; call invalidate_material_stats() after writes.
+    """
+    if not MONGO_URI or not DB_NAME:
+        return dict(_EMPTY)
+
+    with _lock:
+        if not force_refresh and _cache["stats"] is not None and time.monotonic() - _cache["at"] < STATS_TTL_SECONDS:
+            return _cache["stats"]
+        try:
+            stats = compute_material_stats(get_client(MONGO_URI)[DB_NAME][COL_SRC])
+        except Exception:
+            return dict(_EMPTY)
+        _cache["stats"], _cache["at"] = stats, time.monotonic()
+        return stats
+
+
+def invalidate_material_stats():
+    with _lock:
+        _cache["stats"] = None
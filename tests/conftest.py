@@ -0,0 +1,127 @@
+import os
+import sys
+
+# Modules read their settings from the environment at import time.
+os.environ["EMBED_CACHE_PATH"] = ""
+os.environ.setdefault("OPENAI_API_KEY", "fake")
+os.environ.setdefault("MONGO_DB", "test")
+os.environ.setdefault("MONGO_COLL", "materials")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+
+import mongomock
+import pytest
+
+
+@pytest.fixture
+def db():
+    """
+    In-process Mongo stand-in with the reference collections and 25 pending materials.
+    """
+    db = mongomock.MongoClient().dzinly_db_ai
+    db.material_categories.insert_many([{"_id": 1, "title": "Exterior Paint"}, {"_id": 2, "title": "Roofing"}])
+    db.material_brands.insert_many([{"_id": 10, "title": "Behr"}, {"_id": 11, "title": "GAF"}])
+    db.material_brand_styles.insert_many([{"_id": 20, "title": "Classic"}])
+    db.segments.insert_many([{"name": "Wall", "short_code": "WL"}, {"name": "Roof", "short_code": "RF"}])
+    db.materials.insert_many([{
+        "_id": f"m{i:03d}",
+        "title": f"Material {i}",
+        "description": f"Description {i}",
+        "material_category_id": 1 if i % 2 else 2,
+        "material_brand_id": 10 if i % 2 else 11,
+        "material_brand_style_id": 20,
+        "segment": ["Wall"] if i % 2 else ["Roof"],
+        "style": ["matte"],
+    } for i in range(25)])
+    return db
+
+
+class Counting:
+    """
+    Collection wrapper that counts find() calls.
+    """
+
+    def __init__(self, col):
+        self.col = col
+        self.finds = 0
+
+    def find(self, *args, **kwargs):
+        self.finds += 1
+        return self.col.find(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.col, name)
+
+
+@pytest.fixture
+def counting():
+    """
+    The Counting wrapper, for tests that count the queries a path makes.
+    """
+    return Counting
+
+
+FAMILIES = ["Neutral Gray", "White", "Blue", "Green", "Beige"]
+FINISHES = ["Flat", "Satin", "Gloss"]
+CATEGORIES = ["Exterior Paint", "Interior Paint", "Roofing", "Siding"]
+BRANDS = ["Benjamin Moore", "Sherwin-Williams", "Behr", "GAF"]
+SEGMENTS = ["WL", "RF", "TR", "DR"]
+TAGS = ["exterior", "gray", "premium", "zero-voc", "matte", "durable"]
+
+
+def material_doc(i: int, updated_at: str = "2025-06-06T00:00:00") -> dict:
+    """
+    A materials document in the Mongo shape build_index reads, deterministic per i.
+    """
+    r = random.Random(i)
+    family = r.choice(FAMILIES)
+    return {
+        "_id": f"id{i:06d}",
+        "title": f"{family} {r.choice(['Shield', 'Coat', 'Guard', 'Shake'])} {i}",
+        "material_category_name": r.choice(CATEGORIES),
+        "material_brand_name": r.choice(BRANDS),
+        "material_style_name": "Classic",
+        "sku": f"SKU-{i}",
+        "color": {"hex": "#%06X" % r.randrange(1 << 24),
+                  "lab": [r.uniform(0, 100), r.uniform(-60, 60), r.uniform(-60, 60)], "family_name": family},
+        "finish": r.choice(FINISHES),
+        "tags": r.sample(TAGS, 2),
+        "segment_types": r.sample(SEGMENTS, r.randint(1, 2)),
+        "performance": {"voc_level": r.randint(0, 50)},
+        "pricing": {"per_sqft": round(r.uniform(0.1, 2), 2)},
+        "description": f"{family.lower()} {r.choice(FINISHES).lower()} finish for {r.choice(TAGS)} use",
+        "audit": {"updated_at": updated_at},
+    }
+
+
+def offline_config(**overrides) -> dict:
+    """
+    build_index config for small offline builds: hashed n-gram embeddings
+    (no API), small chunks, no partitions.
+    """
+    import build_index
+
+    config = build_index.load_env()
+    config.update(EMBED_MODEL="hashing:char3-5-64", INDEX_SPEC="Flat", CHUNK_SIZE=256, TRAIN_SIZE=1000,
+                  TRUNCATE_DIM=0, RESCORE=0, SHARD_SIZE=0, PARTITION_FIELDS=[], PARTITION_MIN_ROWS=1)
+    config.update(overrides)
+    return config
+
+
+@pytest.fixture
+def build_config():
+    return offline_config()
+
+
+@pytest.fixture(scope="session")
+def catalog(tmp_path_factory):
+    """
+    INDEX_DIR of a published 600-material offline build, shared by read-only tests.
+    """
+    import build_index
+
+    base = str(tmp_path_factory.mktemp("catalog"))
+    build_index.full_build(offline_config(), docs=[material_doc(i) for i in range(600)], base_dir=base)
+    return base
@@ -0,0 +1,50 @@
+"""
+batch_search input parsing and runs over an offline build.
+"""
+import io
+import json
+
+import pytest
+
+from batch_search import BatchRunner, read_queries, run
+from index_store import current_snapshot
+from live_index import open_snapshot
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"finish": ["Flat", "Satin"]}, {"finish": ["Flat", "Satin"]}),
+    ({"finish": "Flat"}, {"finish": ["Flat"]}),
+    ({}, None),
+    (None, None),
+])
+def test_read_queries_accepts_filter_lists(filters, expected):
+    [q] = read_queries([json.dumps({"query": "gray", "filters": filters})], 20, ["title"])
+
+    assert q["filters"] == expected
+
+
+@pytest.mark.parametrize("filters", [{"finish": 5}, {"finish": {"$ne": "Flat"}}, ["finish"], {"finish": [["Flat"]]}])
+def test_read_queries_rejects_malformed_filters(filters):
+    [q] = read_queries([json.dumps({"id": "q1", "query": "gray", "filters": filters})], 20, ["title"])
+
+    assert q["id"] == "q1" and "error" in q and "filter" in q["error"]
+
+
+def test_bad_line_does_not_abort_the_run(catalog):
+    snapshot = open_snapshot(current_snapshot(catalog))
+    lines = [
+        json.dumps({"id": "a", "query": "gray siding", "k": 5}),
+        json.dumps({"id": "b", "query": "gray siding", "filters": {"finish": 5}}),
+        "not json",
+        json.dumps({"id": "c", "query": "gray siding", "k": 5, "filters": {"finish": "Flat"}}),
+    ]
+    out = io.StringIO()
+
+    stats = run(lines, out, BatchRunner(snapshot), k=5, log=io.StringIO())
+
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["id"] for r in records] == ["a", "b", 3, "c"]
+    assert (stats["queries"], stats["errors"]) == (4, 2)
+    assert len(records[0]["results"]) == 5
+    assert records[3]["results"] and all(r["finish"] == "Flat" for r in records[3]["results"])
+    snapshot.searcher.close()
@@ -0,0 +1,105 @@
+"""
+Delta-E formulas against published reference data, and ColorIndex queries
+against a brute-force scan.
+"""
+import numpy as np
+import pytest
+
+from color_index import ColorIndex, delta_e_76, delta_e_2000, hex_to_lab
+from filters import apply_color_threshold
+
+# Sharma, Wu & Dalal (2005), "The CIEDE2000 color-difference formula:
+# implementation notes, supplementary test data, and mathematical observations",
+# Table 1: (LAB 1, LAB 2, dE00).
+SHARMA = [
+    ((50.0000, 2.6772, -79.7751), (50.0000, 0.0000, -82.7485), 2.0425),
+    ((50.0000, 3.1571, -77.2803), (50.0000, 0.0000, -82.7485), 2.8615),
+    ((50.0000, 2.8361, -74.0200), (50.0000, 0.0000, -82.7485), 3.4412),
+    ((50.0000, -1.3802, -84.2814), (50.0000, 0.0000, -82.7485), 1.0000),
+    ((50.0000, -1.1848, -84.8006), (50.0000, 0.0000, -82.7485), 1.0000),
+    ((50.0000, -0.9009, -85.5211), (50.0000, 0.0000, -82.7485), 1.0000),
+    ((50.0000, 0.0000, 0.0000), (50.0000, -1.0000, 2.0000), 2.3669),
+    ((50.0000, -1.0000, 2.0000), (50.0000, 0.0000, 0.0000), 2.3669),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0009), 7.1792),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0010), 7.1792),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0011), 7.2195),
+    ((50.0000, 2.4900, -0.0010), (50.0000, -2.4900, 0.0012), 7.2195),
+    ((50.0000, -0.0010, 2.4900), (50.0000, 0.0009, -2.4900), 4.8045),
+    ((50.0000, -0.0010, 2.4900), (50.0000, 0.0010, -2.4900), 4.8045),
+    ((50.0000, -0.0010, 2.4900), (50.0000, 0.0011, -2.4900), 4.7461),
+    ((50.0000, 2.5000, 0.0000), (50.0000, 0.0000, -2.5000), 4.3065),
+    ((50.0000, 2.5000, 0.0000), (73.0000, 25.0000, -18.0000), 27.1492),
+    ((50.0000, 2.5000, 0.0000), (61.0000, -5.0000, 29.0000), 22.8977),
+    ((50.0000, 2.5000, 0.0000), (56.0000, -27.0000, -3.0000), 31.9030),
+    ((50.0000, 2.5000, 0.0000), (58.0000, 24.0000, 15.0000), 19.4535),
+    ((50.0000, 2.5000, 0.0000), (50.0000, 3.1736, 0.5854), 1.0000),
+    ((50.0000, 2.5000, 0.0000), (50.0000, 3.2972, 0.0000), 1.0000),
+    ((50.0000, 2.5000, 0.0000), (50.0000, 1.8634, 0.5757), 1.0000),
+    ((50.0000, 2.5000, 0.0000), (50.0000, 3.2592, 0.3350), 1.0000),
+    ((60.2574, -34.0099, 36.2677), (60.4626, -34.1751, 39.4387), 1.2644),
+    ((63.0109, -31.0961, -5.8663), (62.8187, -29.7946, -4.0864), 1.2630),
+    ((61.2901, 3.7196, -5.3901), (61.4292, 2.2480, -4.9620), 1.8731),
+    ((35.0831, -44.1164, 3.7933), (35.0232, -40.0716, 1.5901), 1.8645),
+    ((22.7233, 20.0904, -46.6940), (23.0331, 14.9730, -42.5619), 2.0373),
+    ((36.4612, 47.8580, 18.3852), (36.2715, 50.5065, 21.2231), 1.4146),
+    ((90.8027, -2.0831, 1.4410), (91.1528, -1.6435, 0.0447), 1.4441),
+    ((90.9257, -0.5406, -0.9208), (88.6381, -0.8985, -0.7239), 1.5381),
+    ((6.7747, -0.2908, -2.4247), (5.8714, -0.0985, -2.2286), 0.6377),
+    ((2.0776, 0.0795, -1.1350), (0.9033, -0.0636, -0.5514), 0.9082),
+]
+
+
+def test_ciede2000_reference_pairs():
+    lab1 = np.array([a for a, _, _ in SHARMA])
+    lab2 = np.array([b for _, b, _ in SHARMA])
+    expected = np.array([d for _, _, d in SHARMA])
+
+    np.testing.assert_allclose(delta_e_2000(lab1, lab2), expected, atol=1e-4)
+    # Symmetric, and zero for identical colors.
+    np.testing.assert_allclose(delta_e_2000(lab2, lab1), expected, atol=1e-4)
+    np.testing.assert_allclose(delta_e_2000(lab1, lab1), 0, atol=1e-9)
+
+
+def test_delta_e_broadcasts_against_one_color():
+    labs = np.array([a for a, _, _ in SHARMA])
+
+    np.testing.assert_allclose(delta_e_76(labs, labs[0]), np.linalg.norm(labs - labs[0], axis=1))
+    np.testing.assert_allclose(delta_e_2000(labs, labs[0]), [delta_e_2000(l, labs[0]) for l in labs])
+
+
+def test_hex_to_lab_reference_colors():
+    np.testing.assert_allclose(hex_to_lab("#FFFFFF"), [100, 0, 0], atol=0.01)
+    np.testing.assert_allclose(hex_to_lab("#000"), [0, 0, 0], atol=0.01)
+    np.testing.assert_allclose(hex_to_lab(["#FF0000"])[0], [53.24, 80.09, 67.20], atol=0.01)
+
+
+@pytest.fixture(scope="module")
+def catalog_labs():
+    r = np.random.default_rng(3)
+    return np.column_stack([r.uniform(0, 100, 3000), r.uniform(-80, 80, 3000), r.uniform(-80, 80, 3000)])
+
+
+@pytest.mark.parametrize("metric, fn", [("76", delta_e_76), ("2000", delta_e_2000)])
+def test_index_queries_match_brute_force(catalog_labs, metric, fn):
+    rows = np.arange(len(catalog_labs)) * 3
+    index = ColorIndex(catalog_labs, rows)
+    labs32 = catalog_labs.astype(np.float32).astype(np.float64)
+
+    for query in ([50, 10, -20], [95, -1, 2], [20, 40, 40]):
+        dist = fn(labs32, np.array(query, dtype=np.float32))
+        got, got_dist = index.within(query, 12, metric)
+        assert sorted(got.tolist()) == sorted(rows[dist <= 12].tolist())
+        assert np.all(np.diff(got_dist) >= 0)
+
+        got, got_dist = index.nearest(query, 15, metric)
+        np.testing.assert_allclose(got_dist, np.sort(dist)[:15], rtol=1e-5)
+
+
+def test_apply_color_threshold_with_ciede2000():
+    base = SHARMA[16][0]
+    candidates = [{"id": i, "lab": list(b)} for i, (_, b, _) in enumerate(SHARMA[16:24])]
+
+    kept = apply_color_threshold(base, candidates, threshold=5, metric="2000")
+
+    assert [c["id"] for c in kept] == [4, 5, 6, 7]
+    assert all(c["delta_e"] == 1.0 for c in kept)
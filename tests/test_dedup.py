@@ -0,0 +1,87 @@
+"""
+Near-duplicate clustering: MinHash/LSH text pairs, embedding range pairs,
+the color veto, union-find and the write-back to Mongo.
+"""
+import mongomock
+import numpy as np
+
+from dedup import (DEDUP_FIELD, cluster_keys, cluster_labels, dedup_collection, embedding_pairs, find_duplicates,
+                   minhash_signatures, write_clusters)
+
+GRAY = [60.0, -1.0, 2.0]
+BLUE = [45.0, -5.0, -40.0]
+DOCS = [
+    # 0-2: one product spelled three ways.
+    ("Agreeable Gray Exterior Satin", "a warm gray for siding and trim", GRAY),
+    ("agreeable  gray exterior satin", "A warm gray, for siding and trim.", GRAY),
+    ("Agreeable Grey Exterior Satin", "a warm gray for siding and trim", [60.5, -1.0, 2.2]),
+    # 3: same line, different color.
+    ("Agreeable Gray Exterior Satin", "a warm gray for siding and trim", BLUE),
+    # 4-5: duplicates without a known color.
+    ("Timberline HDZ Shingles Charcoal", "architectural roofing shingle", None),
+    ("Timberline HDZ Shingles  Charcoal", "architectural roofing shingle", None),
+    # 6-7: unrelated.
+    ("Cedar Shake Siding", "natural cedar shakes", [50.0, 10.0, 20.0]),
+    ("Pure White Interior Flat", "bright white ceiling paint", [95.0, 0.0, 1.0]),
+]
+
+
+def labs():
+    return np.array([lab if lab else [np.nan] * 3 for _, _, lab in DOCS])
+
+
+def test_cluster_labels_join_transitively():
+    labels = cluster_labels(7, np.array([[1, 2], [0, 1], [4, 5]]))
+
+    assert labels.tolist() == [0, 0, 0, -1, 4, 4, -1]
+
+
+def test_minhash_estimates_jaccard():
+    a = np.arange(0, 400, dtype=np.uint64)
+    b = np.arange(200, 600, dtype=np.uint64)
+    sigs = minhash_signatures([a, b, np.empty(0, dtype=np.uint64)])
+
+    # True Jaccard is 200 / 600.
+    assert abs((sigs[0] == sigs[1]).mean() - 1 / 3) < 0.15
+    assert (sigs[2] == np.iinfo(np.uint64).max).all()
+
+
+def test_text_duplicates_cluster_and_colors_veto():
+    labels, counts = find_duplicates([t for t, _, _ in DOCS], [d for _, d, _ in DOCS], labs=labs(), jaccard=0.6)
+
+    assert labels.tolist() == [0, 0, 0, -1, 4, 4, -1, -1]
+    assert counts["clusters"] == 2 and counts["duplicates"] == 5 and counts["color_rejected"] >= 3
+
+
+def test_embedding_pairs_match_brute_force():
+    r = np.random.default_rng(5)
+    x = r.standard_normal((300, 16)).astype(np.float32)
+    x[100:110] = x[:10] + 0.05 * r.standard_normal((10, 16)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    sims = x @ x.T
+    i, j = np.nonzero(np.triu(sims >= 0.97, 1))
+
+    pairs = embedding_pairs(x, 0.97)
+
+    assert sorted(map(tuple, pairs.tolist())) == sorted(zip(i.tolist(), j.tolist()))
+    assert len(pairs) >= 10
+
+
+def test_cluster_keys_are_the_smallest_id():
+    keys = cluster_keys(["m9", "m3", "m5", "m1"], np.array([0, 0, -1, 0]))
+
+    assert keys == {"m9": "m1", "m3": "m1", "m1": "m1"}
+
+
+def test_collection_round_trip():
+    col = mongomock.MongoClient().dzinly_db_ai.materials
+    col.insert_many([{"_id": f"m{i}", "title": t, "description": d, **({"color": {"lab": lab}} if lab else {})}
+                     for i, (t, d, lab) in enumerate(DOCS)])
+    col.update_one({"_id": "m7"}, {"$set": {DEDUP_FIELD: "stale"}})
+
+    ids, keys, counts = dedup_collection(col, jaccard=0.6)
+    flagged = write_clusters(col, ids, keys)
+
+    assert flagged == 5
+    got = {d["_id"]: d.get(DEDUP_FIELD) for d in col.find({}, {DEDUP_FIELD: 1})}
+    assert got == {"m0": "m0", "m1": "m0", "m2": "m0", "m3": None, "m4": "m4", "m5": "m4", "m6": None, "m7": None}
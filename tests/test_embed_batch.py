@@ -0,0 +1,122 @@
+"""
+embeddings.batch.embed_texts against embeddings.fake_server, over HTTP
+through the OpenAI client.
+"""
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import openai
+import pytest
+
+from embeddings.batch import TokenBucket, embed_texts
+from embeddings.fake_server import fake_vector, make_handler
+
+MODEL = "text-embedding-3-small"
+DIM = 32
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    """
+    Starts a fake embeddings server on an ephemeral port and points the
+    OpenAI client at it; returns start(**make_handler kwargs) -> request log.
+    """
+    servers = []
+
+    def start(fail_first=0, fail_rate=0.0):
+        log = []
+        base = make_handler(DIM, 0.0, fail_rate, fail_first)
+
+        class Recording(base):
+            def _reply(self, status, payload):
+                log.append((time.monotonic(), status, len(payload.get("data", []))))
+                super()._reply(status, payload)
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Recording)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        url = f"http://127.0.0.1:{server.server_address[1]}/v1/"
+        monkeypatch.setenv("OPENAI_BASE_URL", url)
+        monkeypatch.setattr(openai, "base_url", url)
+        monkeypatch.setattr(openai, "api_key", "fake")
+        # Retries are embed_texts' job; the client's own would hide them.
+        monkeypatch.setattr(openai, "max_retries", 0)
+        return log
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_batches_and_keeps_order(fake_server):
+    log = fake_server()
+    texts = [f"material {i}" for i in range(23)] + ["material 3"]
+
+    vecs = embed_texts(texts, model=MODEL, batch_size=5, max_workers=4, requests_per_sec=0, verbose=False)
+
+    expected = np.stack([fake_vector(t, MODEL, DIM) for t in texts])
+    assert vecs.shape == (24, DIM) and vecs.dtype == np.float32
+    np.testing.assert_allclose(vecs, expected, atol=1e-6)
+    # The repeated text is sent once.
+    assert sorted(n for _, _, n in log) == [3, 5, 5, 5, 5]
+
+
+def test_retries_injected_failures_with_backoff(fake_server):
+    log = fake_server(fail_first=2)
+
+    vecs = embed_texts(["a", "b"], model=MODEL, max_workers=1, requests_per_sec=0,
+                       max_retries=3, backoff=0.05, verbose=False)
+
+    np.testing.assert_allclose(vecs[1], fake_vector("b", MODEL, DIM), atol=1e-6)
+    assert [status for _, status, _ in log] == [503, 503, 200]
+    (t0, _, _), (t1, _, _), (t2, _, _) = log
+    # Exponential backoff: at least backoff, then 2 * backoff.
+    assert t1 - t0 >= 0.05
+    assert t2 - t1 >= 0.1
+
+
+def test_gives_up_after_max_retries(fake_server):
+    log = fake_server(fail_first=10)
+
+    with pytest.raises(openai.APIStatusError):
+        embed_texts(["a"], model=MODEL, requests_per_sec=0, max_retries=2, backoff=0.01, verbose=False)
+    assert len(log) == 3
+
+
+def test_respects_token_bucket(fake_server):
+    log = fake_server()
+    rate = 20.0
+    start = time.monotonic()
+
+    embed_texts([f"t{i}" for i in range(30)], model=MODEL, batch_size=1, max_workers=8,
+                requests_per_sec=rate, verbose=False)
+
+    stamps = sorted(t for t, _, _ in log)
+    assert len(stamps) == 30
+    # A full bucket covers the first `rate` requests; the rest arrive at `rate` per second.
+    for i, t in enumerate(stamps):
+        assert t - start >= (i + 1 - rate) / rate - 0.005
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 5 / 50 - 0.01
+
+
+def test_progress_counts_completed_batches(capsys):
+    def slow_first(batch, model):
+        # Early batches finish last, so batch positions and completions disagree.
+        time.sleep(0.02 if batch[0] < "t010" else 0)
+        return np.ones((len(batch), 4), dtype=np.float32)
+
+    embed_texts([f"t{i:03d}" for i in range(46)], model=MODEL, batch_size=2, max_workers=8,
+                requests_per_sec=0, embed_fn=slow_first, cache=None)
+
+    progress = [line for line in capsys.readouterr().out.splitlines() if "texts embedded" in line]
+    assert [line.split()[1] for line in progress] == ["10/46", "20/46", "30/46", "40/46", "46/46"]
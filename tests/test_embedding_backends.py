@@ -0,0 +1,70 @@
+"""
+Local embedding backends: the hashing backend must give the same vectors for
+the same text in any batch, thread or process, since the index is built and
+queried in different ones.
+"""
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from embeddings import backends
+from embeddings.backends import EmbeddingBackend, HashingBackend, get_backend, model_id, split_model_id
+
+TEXTS = ["Agreeable Gray SW-7029", "cedar shake siding", "屋根 shingle", "", "#D1CBC1", "a"]
+
+
+def test_same_text_same_vector_in_any_batch():
+    backend = HashingBackend("char3-5-64")
+
+    alone = np.vstack([backend.embed([t]) for t in TEXTS])
+    together = backend.embed(TEXTS)
+    reversed_ = backend.embed(TEXTS[::-1])[::-1]
+
+    np.testing.assert_array_equal(together, alone)
+    np.testing.assert_array_equal(reversed_, alone)
+    np.testing.assert_array_equal(HashingBackend("char3-5-64").embed(TEXTS), alone)
+
+
+def test_thread_pool_batches_match_inline(monkeypatch):
+    texts = [f"material {i} gray satin" for i in range(50)]
+    inline = HashingBackend("char3-5-64").embed(texts)
+    monkeypatch.setattr(backends, "EMBED_LOCAL_BATCH", 7)
+    monkeypatch.setattr(backends, "EMBED_LOCAL_THREADS", 4)
+
+    np.testing.assert_array_equal(HashingBackend("char3-5-64").embed(texts), inline)
+
+
+def test_same_vectors_in_another_process(tmp_path):
+    out = tmp_path / "vecs.npy"
+    code = ("import sys, numpy as np; sys.path.insert(0, sys.argv[1]); "
+            "from embeddings.backends import HashingBackend; "
+            f"np.save(sys.argv[2], HashingBackend('char3-5-64').embed({TEXTS!r}))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code, root, str(out)], check=True,
+                   env={**os.environ, "PYTHONHASHSEED": "12345"})
+
+    np.testing.assert_array_equal(np.load(out), HashingBackend("char3-5-64").embed(TEXTS))
+
+
+def test_vectors_are_unit_rows_and_case_insensitive():
+    vecs = HashingBackend("char3-5-64").embed(["Cool  GRAY paint", "cool gray paint", ""])
+
+    assert vecs.shape == (3, 64) and vecs.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(vecs[:2], axis=1), 1, rtol=1e-6)
+    np.testing.assert_array_equal(vecs[0], vecs[1])
+    assert not vecs[2].any()
+
+
+def test_model_ids():
+    assert model_id("hashing", "char3-5-64") == "hashing:char3-5-64"
+    assert model_id("openai") == "text-embedding-3-small"
+    assert split_model_id("hashing:char3-5-64") == ("hashing", "char3-5-64")
+    assert split_model_id("text-embedding-3-large") == ("openai", "text-embedding-3-large")
+    assert get_backend("hashing:char3-5-64") is get_backend("hashing:char3-5-64")
+    with pytest.raises(ValueError):
+        HashingBackend("char3-5")
+    with pytest.raises(TypeError):
+        EmbeddingBackend("x")
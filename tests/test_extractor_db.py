@@ -0,0 +1,71 @@
+"""
+extractor_db reference maps and preview query against mongomock.
+"""
+import extractor_db
+from extractor_db import ReferenceMaps, build_preview_query
+
+
+class CountingDB:
+    def __init__(self, db, counting):
+        self.db = db
+        self.counting = counting
+        self.cols = {}
+
+    def __getattr__(self, name):
+        return self.cols.setdefault(name, self.counting(self.db[name]))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_reference_maps_resolve_ids_and_titles(db):
+    refs = ReferenceMaps(db)
+
+    assert refs.categories == ["Exterior Paint", "Roofing"]
+    assert refs.brands == ["Behr", "GAF"]
+    assert refs.styles == ["Classic"]
+    assert refs.segment_names == ["Wall", "Roof"]
+    assert refs.category_titles[1] == "Exterior Paint" and refs.category_ids["Roofing"] == 2
+    assert refs.brand_titles[11] == "GAF" and refs.style_ids["Classic"] == 20
+    assert refs.segment_map == {"Wall": "WL", "Roof": "RF"}
+
+
+def test_reference_maps_reload_only_after_ttl(db, monkeypatch, counting):
+    clock = Clock()
+    monkeypatch.setattr(extractor_db, "time", clock)
+    counting_db = CountingDB(db, counting)
+    refs = ReferenceMaps(counting_db, ttl=60)
+
+    refs.categories, refs.brands, refs.styles
+    # One query per reference collection, however many lookups.
+    assert {name: col.finds for name, col in counting_db.cols.items()} == {
+        "material_categories": 1, "material_brands": 1, "material_brand_styles": 1, "segments": 1}
+
+    db.material_categories.insert_one({"_id": 3, "title": "Siding"})
+    clock.now += 30
+    assert "Siding" not in refs.categories
+    clock.now += 31
+    assert "Siding" in refs.categories
+    assert counting_db.cols["material_categories"].finds == 2
+
+
+def test_preview_query_from_titles(db):
+    refs = ReferenceMaps(db)
+
+    assert build_preview_query(refs) == {"extracted": {"$ne": True}}
+    q = build_preview_query(refs, cat="Roofing", brand="GAF", style="Classic", seg="Roof")
+    assert q == {
+        "extracted": {"$ne": True},
+        "material_category_id": 2,
+        "material_brand_id": 11,
+        "material_brand_style_id": 20,
+        "segment": {"$in": ["Roof"]},
+    }
+    # Unknown titles don't filter.
+    assert build_preview_query(refs, cat="Nope") == {"extracted": {"$ne": True}}
+    assert db.materials.count_documents(q) == 13
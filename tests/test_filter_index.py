@@ -0,0 +1,104 @@
+"""
+FilterIndex bitmaps against filters.filter_by_exact_fields, and filtered search.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from conftest import FAMILIES, FINISHES, SEGMENTS, TAGS
+from embeddings.backends import get_backend
+from filter_index import FilterIndex
+from filters import filter_by_exact_fields
+from index_store import load_searcher
+from metadata_store import MetadataStore
+
+# 1003 rows: not a whole number of bytes, and "Rare" stays a row array while
+# the other values become bitmaps.
+N = 1003
+
+
+def make_records(n=N):
+    r = random.Random(7)
+    return [{
+        "vector_id": i,
+        "family_name": "Rare" if i % 97 == 0 else r.choice(FAMILIES),
+        "finish": r.choice(FINISHES),
+        "segment_types": r.sample(SEGMENTS, r.randint(0, 2)),
+        "tags": r.sample(TAGS, 2),
+    } for i in range(n)]
+
+
+RECORDS = make_records()
+FILTER_SETS = [
+    {},
+    {"finish": ["Flat"]},
+    {"family_name": ["Rare"]},
+    {"family_name": ["Rare", "Blue"], "finish": ["Satin", "Gloss"]},
+    {"segment_types": ["WL", "DR"], "tags": ["premium"]},
+    {"finish": ["Flat"], "family_name": ["No such family"]},
+]
+
+
+@pytest.fixture(scope="module")
+def fidx():
+    return FilterIndex.build(MetadataStore.from_records(RECORDS))
+
+
+def test_both_posting_forms_are_used(fidx):
+    assert fidx.postings["family_name"]["Rare"].dtype == np.int32
+    assert fidx.postings["finish"]["Flat"].dtype == np.uint8
+
+
+@pytest.mark.parametrize("filters", FILTER_SETS)
+def test_mask_matches_exact_field_filter(fidx, filters):
+    expected = [r["vector_id"] for r in filter_by_exact_fields(RECORDS, filters)]
+
+    mask = fidx.mask(filters)
+
+    got = list(range(N)) if mask is None else np.flatnonzero(mask).tolist()
+    assert got == expected
+    assert fidx.count(filters) == len(expected)
+
+
+def test_save_and_load(fidx, tmp_path):
+    fidx.save(str(tmp_path / "filters.pkl"))
+    loaded = FilterIndex.load(str(tmp_path / "filters.pkl"))
+
+    for filters in FILTER_SETS:
+        assert loaded.count(filters) == fidx.count(filters)
+
+
+@pytest.mark.parametrize("filters", [{"family_name": ["Blue"], "finish": ["Gloss"]},
+                                     {"material_category_name": ["Siding"], "tags": ["zero-voc"]}])
+def test_filtered_search_returns_k_matches(catalog, filters):
+    searcher, store, _ = load_searcher(catalog)
+    q_vecs = get_backend("hashing:char3-5-64").embed(["gray exterior paint", "white roofing shake"])
+    matching = searcher.filter_index.count(filters)
+
+    D, I = searcher.search(q_vecs, 30, filters)
+
+    assert 0 < matching
+    for row in I:
+        hits = row[row >= 0]
+        assert len(hits) == min(30, matching)
+        assert filter_by_exact_fields(store.records(hits), filters) == store.records(hits)
+    searcher.close()
+
+
+@pytest.mark.parametrize("filters", FILTER_SETS)
+def test_facet_counts_leave_out_the_fields_own_selection(fidx, filters):
+    counts = fidx.facet_counts(filters, ["family_name", "finish", "segment_types", "tags"])
+
+    for field, by_value in counts.items():
+        others = filter_by_exact_fields(RECORDS, {f: v for f, v in filters.items() if f != field})
+        expected = {}
+        for r in others:
+            for v in (r[field] if isinstance(r[field], list) else [r[field]]):
+                expected[v] = expected.get(v, 0) + 1
+        assert {v: c for v, c in by_value.items() if c} == expected
+
+
+def test_facet_counts_skip_unknown_fields(fidx):
+    assert set(fidx.facet_counts({"finish": ["Flat"]}, ["finish", "nope"])) == {"finish"}
+    assert set(fidx.facet_counts()) == {"family_name", "finish", "segment_types", "tags"}
@@ -0,0 +1,75 @@
+"""
+Incremental builds keep index positions, metadata rows and vectors aligned.
+"""
+import mongomock
+import numpy as np
+import pytest
+
+import api.query_engine
+import build_index
+from build_index import build_search_text, embed_records
+from conftest import material_doc, offline_config
+from index_store import current_snapshot, load_searcher, read_manifest, vector_id_for
+
+
+@pytest.fixture
+def coll(monkeypatch):
+    coll = mongomock.MongoClient().dzinly_db_ai.materials
+    coll.insert_many([material_doc(i) for i in range(300)])
+    monkeypatch.setattr(api.query_engine, "coll", coll)
+    return coll
+
+
+def edit(coll):
+    """
+    5 retitled, 3 soft-deleted and 4 new materials, all after the first build.
+    """
+    later = {"audit": {"updated_at": "2025-07-01T00:00:00"}}
+    for i in (3, 50, 120, 121, 299):
+        coll.update_one({"_id": f"id{i:06d}"}, {"$set": {"title": f"Retitled {i}", **later}})
+    for i in (0, 77, 200):
+        coll.update_one({"_id": f"id{i:06d}"}, {"$set": {"is_deleted": True, **later}})
+    coll.insert_many([material_doc(i, updated_at="2025-07-02T00:00:00") for i in range(300, 304)])
+
+
+@pytest.mark.parametrize("config", [{}, {"SHARD_SIZE": 101, "RESCORE": 2}], ids=["flat", "sharded-rescore"])
+def test_rows_stay_aligned_after_updates(coll, tmp_path, config):
+    config = offline_config(**config)
+    base = str(tmp_path)
+    build_index.full_build(config, base_dir=base)
+    edit(coll)
+
+    build_index.incremental_build(config, base_dir=base)
+
+    searcher, store, _ = load_searcher(base)
+    records = store.records(range(len(store)))
+    ids = [r["mongo_id"] for r in records]
+    assert len(ids) == len(set(ids)) == 300 - 3 + 4
+    assert not {"id000000", "id000077", "id000200"} & set(ids)
+    assert {f"id{i:06d}" for i in range(300, 304)} <= set(ids)
+    assert {r["title"] for r in records if r["mongo_id"] == "id000050"} == {"Retitled 50"}
+    np.testing.assert_array_equal(store.vector_ids, [vector_id_for(i) for i in ids])
+    # Each row's own text finds that row first: index position i holds row i's vector.
+    for r in records:
+        r.pop("search_text", None)
+    D, I = searcher.search(embed_records(records, config, verbose=False), 1)
+    np.testing.assert_array_equal(I[:, 0], np.arange(len(records)))
+    assert read_manifest(current_snapshot(base))["watermark"] == "2025-07-02T00:00:00"
+    searcher.close()
+
+
+def test_only_changed_materials_are_reembedded(coll, tmp_path, monkeypatch):
+    config = offline_config()
+    base = str(tmp_path)
+    coll.delete_many({})
+    coll.insert_many([material_doc(i, updated_at=f"2025-06-06T00:{i // 60:02d}:{i % 60:02d}") for i in range(300)])
+    build_index.full_build(config, base_dir=base)
+    coll.update_one({"_id": "id000010"}, {"$set": {"title": "Retitled", "audit": {"updated_at": "2025-07-01"}}})
+    embedded = []
+    embed = build_index.embed_records
+    monkeypatch.setattr(build_index, "embed_records", lambda records, *a, **kw: embedded.extend(records) or embed(records, *a, **kw))
+
+    build_index.incremental_build(config, base_dir=base)
+
+    # Documents stamped exactly at the watermark are re-read too.
+    assert sorted(r["mongo_id"] for r in embedded) == ["id000010", "id000299"]
@@ -0,0 +1,114 @@
+"""
+BM25 scoring against a direct implementation of the formula, exact-key
+lookups, reciprocal rank fusion and the hybrid searcher's lexical shortcut.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from index_store import current_snapshot
+from lexical_index import LexicalIndex, tokenize
+from live_index import open_snapshot
+from metadata_store import MetadataStore
+from search import rrf_fuse
+
+RECORDS = [
+    {"title": "Agreeable Gray", "sku": "SW-7029", "hex": "#D1CBC1", "finish": "Flat", "tags": ["gray", "interior"]},
+    {"title": "Repose Gray", "sku": "SW-7015", "hex": "#CCC9C0", "finish": "Satin", "tags": ["gray"]},
+    {"title": "Timberline Shake", "sku": "GAF-100", "hex": "#6B5B4B", "finish": "", "tags": ["roof", "shake"]},
+    {"title": "Gray Shake Siding", "sku": "CT-22", "hex": "#8A8A8A", "finish": "Flat", "tags": ["siding", "gray"]},
+    {"title": "Pure White", "sku": "SW-7005", "hex": "#EDECE6", "finish": "Flat", "tags": []},
+]
+FIELDS = ["title", "sku", "hex", "finish", "tags"]
+
+
+@pytest.fixture(scope="module")
+def lexical():
+    return LexicalIndex.build(MetadataStore.from_records(RECORDS), FIELDS)
+
+
+def bm25(query, k1=1.2, b=0.75):
+    docs = []
+    for r in RECORDS:
+        toks = []
+        for f in FIELDS:
+            for v in (r[f] if isinstance(r[f], list) else [r[f]]):
+                toks.extend(tokenize(v))
+        docs.append(toks)
+    avgdl = sum(map(len, docs)) / len(docs)
+    scores = {}
+    for t in dict.fromkeys(tokenize(query)):
+        df = sum(t in d for d in docs)
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for row, d in enumerate(docs):
+            tf = d.count(t)
+            if tf:
+                norm = k1 * (1 - b + b * len(d) / avgdl)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+    return scores
+
+
+def test_tokenize_keeps_compounds_and_parts():
+    assert tokenize("SW-7015 #CCC9C0 Gray") == ["sw-7015", "sw", "7015", "#ccc9c0", "ccc9c0", "gray"]
+
+
+@pytest.mark.parametrize("query", ["gray shake", "flat gray siding", "7015", "nothing here"])
+def test_bm25_matches_formula(lexical, query):
+    expected = bm25(query)
+
+    scores, rows = lexical.search(query, 10)
+
+    assert sorted(rows.tolist()) == sorted(expected)
+    np.testing.assert_allclose(scores, [expected[r] for r in rows.tolist()], rtol=1e-5)
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_bm25_mask_and_k(lexical):
+    mask = np.array([True, False, True, True, True])
+
+    _, rows = lexical.search("gray", 10, mask)
+    _, top = lexical.search("gray", 1)
+
+    assert 1 not in rows.tolist() and sorted(rows.tolist()) == [0, 3]
+    assert len(top) == 1
+
+
+def test_exact_keys(lexical):
+    assert lexical.exact("  repose   GRAY ").tolist() == [1]
+    assert lexical.exact("sw-7005").tolist() == [4]
+    assert lexical.exact("#6b5b4b").tolist() == lexical.exact("6B5B4B").tolist() == [2]
+    assert lexical.exact("gray").tolist() == []
+    assert lexical.exact("Repose Gray", np.array([True, False, True, True, True])).tolist() == []
+
+
+def test_save_and_load(lexical, tmp_path):
+    lexical.save(str(tmp_path / "lexical"))
+    loaded = LexicalIndex.load(str(tmp_path / "lexical"))
+
+    for query in ["gray shake", "sw-7029"]:
+        np.testing.assert_array_equal(loaded.search(query, 5)[1], lexical.search(query, 5)[1])
+    assert loaded.exact("Pure White").tolist() == [4]
+
+
+def test_rrf_fuse():
+    scores, rows = rrf_fuse([np.array([3, 1, -1, 7]), np.array([1, 9])], 5, rrf_k=60)
+
+    # Row 1 is in both lists; 3 and 9 tie at rank 1 and break by row.
+    assert rows.tolist() == [1, 3, 9, 7, -1]
+    np.testing.assert_allclose(scores[:4], [1 / 62 + 1 / 61, 1 / 61, 1 / 62, 1 / 64], rtol=1e-6)
+    assert np.isinf(scores[4])
+
+
+def test_exact_query_skips_embedding(catalog):
+    snapshot = open_snapshot(current_snapshot(catalog))
+    searcher = snapshot.searcher
+
+    def embed(texts):
+        raise AssertionError(f"embedded {texts}")
+
+    D, I = searcher.search(["sku-42", "SKU-7"], 5, embed_fn=embed)
+
+    assert snapshot.store.records(I[:, 0], ["sku"]) == [{"sku": "SKU-42"}, {"sku": "SKU-7"}]
+    assert searcher.skipped_embeddings == 2
+    searcher.close()
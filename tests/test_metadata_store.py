@@ -0,0 +1,78 @@
+"""
+Columnar metadata store: what MetadataWriter writes, MetadataStore reads back.
+"""
+import numpy as np
+import pytest
+
+from metadata_store import MetadataStore, MetadataWriter
+
+
+def rows(n=50):
+    return [{
+        "vector_id": 1000 + 7 * i,
+        "mongo_id": f"id{i}",
+        "title": ["Gris clair é", "", "屋根 Shake", "Plain"][i % 4] + f" {i}",
+        "tags": [["a", "b"], [], None][i % 3],
+        "lab": [i * 0.5, -1.25, 3.0] if i % 5 else None,
+        "price_per_sqft": None if i % 4 == 1 else i / 8,
+        "in_stock": [True, False, None][i % 3],
+        "segment_types": ["WL"] if i % 2 else ["RF", "DR"],
+    } for i in range(n)]
+
+
+def write(path, records, chunk=16):
+    with MetadataWriter(str(path)) as w:
+        for i in range(0, len(records), chunk):
+            w.append(records[i:i + chunk])
+    return MetadataStore(str(path))
+
+
+@pytest.fixture(params=["disk", "memory"])
+def stored(request, tmp_path):
+    records = rows()
+    store = write(tmp_path / "meta", records) if request.param == "disk" else MetadataStore.from_records(records)
+    return records, store
+
+
+def test_round_trip(stored):
+    records, store = stored
+
+    assert len(store) == len(records)
+    assert store.records(range(len(records))) == records
+    assert [r for chunk in store.iter_records(chunk_size=7) for r in chunk] == records
+
+
+def test_gather_picks_rows_and_columns_in_order(stored):
+    records, store = stored
+
+    got = store.gather([9, 2, 2, 40], ["title", "lab", "missing"])
+
+    assert got == {"title": [records[i]["title"] for i in (9, 2, 2, 40)],
+                   "lab": [records[i]["lab"] for i in (9, 2, 2, 40)]}
+
+
+def test_rows_for_ids(stored):
+    records, store = stored
+
+    found = store.rows_for_ids([1000 + 7 * 12, 5, 1000, 1000 + 7 * 49])
+
+    np.testing.assert_array_equal(found, [12, -1, 0, 49])
+
+
+def test_column_added_in_a_later_chunk_is_backfilled(tmp_path):
+    first = [{"vector_id": i, "title": f"t{i}"} for i in range(3)]
+    later = [{"vector_id": 3, "title": "t3", "finish": "Flat", "lrv": 61.5}]
+
+    store = write(tmp_path / "meta", first + later, chunk=3)
+
+    assert store.values("finish") == ["", "", "", "Flat"]
+    assert store.values("lrv") == [None, None, None, 61.5]
+
+
+def test_empty_store(tmp_path):
+    with MetadataWriter(str(tmp_path / "meta"), schema={"vector_id": "int64", "title": "str"}):
+        pass
+    store = MetadataStore(str(tmp_path / "meta"))
+
+    assert len(store) == 0 and store.records([]) == []
+    assert store.rows_for_ids([1]).tolist() == [-1]
@@ -0,0 +1,28 @@
+"""
+Histogram bounds and Prometheus export.
+"""
+from metrics import DEFAULT_BUCKETS, Metrics, count_buckets
+
+
+def test_count_buckets():
+    assert count_buckets(64) == (1, 2, 4, 8, 16, 32, 64)
+    assert count_buckets(48) == (1, 2, 4, 8, 16, 32, 48)
+    assert count_buckets(1) == (1,)
+
+
+def test_series_keep_their_own_bounds():
+    m = Metrics(enabled=True)
+    for size in (1, 3, 3, 64):
+        m.observe("batch_size", size, buckets=count_buckets(64))
+    m.observe("stage_seconds", 0.003, stage="search")
+
+    text = m.to_prometheus()
+
+    assert 'material_bot_batch_size_bucket{le="1"} 1' in text
+    assert 'material_bot_batch_size_bucket{le="4"} 3' in text
+    assert 'material_bot_batch_size_bucket{le="32"} 3' in text
+    assert 'material_bot_batch_size_bucket{le="64"} 4' in text
+    assert "material_bot_batch_size_sum 71.000000" in text
+    assert 'le="0.0001"' not in text.split("# TYPE material_bot_stage_seconds")[0]
+    assert m.histograms["stage_seconds"][(("stage", "search"),)].bounds == DEFAULT_BUCKETS
+    assert m.to_dict()["histograms"]["batch_size"][0]["p50_le"] == 4
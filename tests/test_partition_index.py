@@ -0,0 +1,64 @@
+"""
+Partition indexes against the main index they were cut from.
+"""
+import numpy as np
+import pytest
+
+import build_index
+import partition_index
+from conftest import material_doc, offline_config
+from embeddings.backends import get_backend
+from index_store import load_searcher
+from partition_index import PartitionedSearcher
+
+QUERIES = ["pale brown flat roofing for wood", "exterior paint matte", "gray siding", "interior paint satin",
+           "durable shake", "blue coat"]
+
+
+@pytest.fixture(scope="module")
+def partitioned(tmp_path_factory):
+    base = str(tmp_path_factory.mktemp("partitions"))
+    config = offline_config(PARTITION_FIELDS=["material_category_name", "segment_types"], PARTITION_MIN_ROWS=50)
+    build_index.full_build(config, docs=[material_doc(i) for i in range(1500)], base_dir=base)
+    searcher, store, manifest = load_searcher(base)
+    assert isinstance(searcher, PartitionedSearcher) and manifest["partitions"]
+    q_vecs = get_backend(config["EMBED_MODEL"]).embed(QUERIES)
+    yield searcher, q_vecs
+    searcher.close()
+
+
+def test_unfiltered_queries_search_the_main_index(partitioned):
+    searcher, q_vecs = partitioned
+
+    scores, rows = searcher.search(q_vecs, 20, queries=QUERIES)
+    main_scores, main_rows = searcher.searcher.search(q_vecs, 20)
+
+    # Naming a category in the query text doesn't narrow the results to it.
+    np.testing.assert_array_equal(rows, main_rows)
+    np.testing.assert_allclose(scores, main_scores, rtol=1e-6)
+
+
+@pytest.mark.parametrize("filters", [
+    {"material_category_name": ["Roofing"]},
+    {"material_category_name": ["Roofing", "Siding"], "finish": ["Flat"]},
+    {"segment_types": ["RF", "WL"]},
+])
+def test_filtered_queries_match_the_main_index(partitioned, filters):
+    searcher, q_vecs = partitioned
+
+    keys, exact = searcher.registry.route(filters)
+    scores, rows = searcher.search(q_vecs, 20, filters=filters, queries=QUERIES)
+    main_scores, main_rows = searcher.searcher.search(q_vecs, 20, filters=filters)
+
+    assert keys and exact
+    np.testing.assert_array_equal(rows, main_rows)
+    np.testing.assert_allclose(scores, main_scores, rtol=1e-6)
+
+
+def test_query_routing_is_opt_in(partitioned, monkeypatch):
+    searcher, _ = partitioned
+
+    monkeypatch.setattr(partition_index, "ROUTE_QUERIES", False)
+    assert searcher.registry.route(None, "pale brown flat roofing") == ([], False)
+    monkeypatch.setattr(partition_index, "ROUTE_QUERIES", True)
+    assert searcher.registry.route(None, "pale brown flat roofing") == ([("material_category_name", "Roofing")], False)
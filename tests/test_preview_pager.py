@@ -0,0 +1,53 @@
+"""
+extractor_db.PreviewPager against mongomock.
+"""
+import pytest
+
+from extractor_db import PreviewPager, ReferenceMaps, build_preview_query
+
+
+def test_pager_reads_one_query_per_page(db, counting):
+    refs = ReferenceMaps(db)
+    col = counting(db.materials)
+    pager = PreviewPager(col, refs, build_preview_query(refs), page_size=10)
+
+    assert (pager.total, pager.pages) == (25, 3)
+    pages = [pager.page(n) for n in range(pager.pages)]
+
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert [r["_id"] for p in pages for r in p] == [f"m{i:03d}" for i in range(25)]
+    # Page n + 1 is prefetched while page n is shown, so each page is read once.
+    assert col.finds == 3
+    row = pages[0][1]
+    assert (row["material_category_name"], row["material_brand_name"], row["material_style_name"]) == \
+        ("Exterior Paint", "Behr", "Classic")
+    assert row["segment_types"] == ["WL"] and row["original_id"] == "m001"
+
+    # Cached pages are served without a query.
+    pager.page(0)
+    assert col.finds == 3
+    assert pager.page(5) == []
+
+
+@pytest.mark.parametrize("page_size", [3, 10])
+def test_pager_jumps_straight_to_a_late_page(db, page_size):
+    refs = ReferenceMaps(db)
+    pager = PreviewPager(db.materials, refs, build_preview_query(refs), page_size=page_size)
+    last = pager.pages - 1
+
+    rows = pager.page(last)
+
+    expected = [f"m{i:03d}" for i in range(25)][last * page_size:]
+    assert [r["_id"] for r in rows] == expected
+
+
+def test_pager_reset_drops_transferred_rows(db):
+    refs = ReferenceMaps(db)
+    pager = PreviewPager(db.materials, refs, build_preview_query(refs), page_size=10)
+    pager.page(0)
+
+    db.materials.update_many({"_id": {"$lt": "m010"}}, {"$set": {"extracted": True}})
+    pager.reset()
+
+    assert pager.total == 15
+    assert pager.page(0)[0]["_id"] == "m010"
@@ -0,0 +1,59 @@
+"""
+QueryCache keys and the query embedding paths that share its normalization.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from batch_search import BatchRunner
+from query_cache import QueryCache
+from search_service import MicroBatcher
+
+
+class Recorder:
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts, model=None):
+        self.texts.extend(texts)
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+def test_embedding_uses_typed_text_and_normalized_key():
+    cache, seen = QueryCache(), []
+    embed = lambda text: seen.append(text) or np.ones(4, dtype=np.float32)
+
+    cache.embedding("  Cool GRAY  paint", embed)
+    cache.embedding("cool gray paint", embed)
+
+    assert seen == ["  Cool GRAY  paint"]
+
+
+def test_results_are_keyed_by_the_callers_version():
+    cache = QueryCache()
+    cache.bind(2)
+    scores, rows = np.zeros((1, 3)), np.arange(3)[None]
+
+    # A reader still on version 1 stores and finds its rows under version 1 only.
+    cache.put_results("Gray", {"finish": ["Flat"]}, 20, 1, scores, rows)
+
+    assert cache.get_results("gray ", {"finish": ["Flat"]}, 20, 2) is None
+    assert cache.get_results("gray ", {"finish": ["Flat"]}, 20, 1)[1] is rows
+
+
+def test_service_embeds_typed_text():
+    record = Recorder()
+    batcher = MicroBatcher(live=None, embed_fn=record)
+
+    vecs = batcher._embed(["Cool  Gray", "cool gray", "Blue"], "m")
+
+    assert sorted(record.texts) == ["Blue", "Cool  Gray"] and vecs.shape == (3, 4)
+
+
+def test_batch_runner_embeds_typed_text():
+    record = Recorder()
+    runner = BatchRunner(SimpleNamespace(searcher=None, embed_model="m"), embed_fn=record)
+
+    vectors = runner._embed(["Cool  Gray", "cool gray", "Blue"])
+
+    assert record.texts == ["Cool  Gray", "Blue"] and sorted(vectors) == ["blue", "cool gray"]
@@ -0,0 +1,46 @@
+"""
+Exact rescoring of compressed-index shortlists.
+"""
+import faiss
+import numpy as np
+import pytest
+
+import search
+from search import Searcher
+
+
+def unit(n, d, seed):
+    x = np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+    faiss.normalize_L2(x)
+    return x
+
+
+@pytest.mark.parametrize("block", [1, 7, search.RESCORE_BLOCK])
+def test_rescore_matches_exact_search(monkeypatch, block):
+    monkeypatch.setattr(search, "RESCORE_BLOCK", block)
+    vectors, queries = unit(500, 32, 0), unit(50, 32, 1)
+    flat = faiss.IndexFlatIP(32)
+    flat.add(vectors)
+    sq8 = faiss.index_factory(32, "SQ8", faiss.METRIC_INNER_PRODUCT)
+    sq8.train(vectors)
+    sq8.add(vectors)
+    exact, rescored = Searcher(flat), Searcher(sq8, search_params={"rescore": 8}, vectors=vectors)
+
+    D, I = exact.search(queries, 10)
+    D2, I2 = rescored.search(queries, 10)
+
+    np.testing.assert_array_equal(I2, I)
+    np.testing.assert_allclose(D2, D, rtol=1e-5)
+    exact.close()
+    rescored.close()
+
+
+def test_rescore_keeps_missing_slots_last():
+    vectors = unit(6, 8, 2)
+    s = Searcher(faiss.IndexFlatIP(8), vectors=vectors)
+    rows = np.array([[3, -1, 0, 5], [-1, -1, -1, -1]])
+
+    D, I = s._rescore(unit(2, 8, 3), rows, 3)
+
+    assert sorted(I[0]) == [0, 3, 5] and (I[1] == -1).all() and np.isinf(D[1]).all()
+    s.close()
@@ -0,0 +1,91 @@
+"""
+search_service request validation and micro-batch error isolation.
+"""
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from embeddings.backends import get_backend
+from live_index import LiveIndex
+from search_service import create_app
+
+
+@pytest.fixture(scope="module")
+def live(catalog):
+    live = LiveIndex(catalog, interval=0)
+    yield live
+    live.current.searcher.close()
+
+
+def call(app, requests):
+    """
+    Sends (path, body) requests concurrently; returns (status, json) per request.
+    """
+    async def go():
+        async with TestClient(TestServer(app)) as client:
+            async def one(path, body):
+                resp = await client.post(path, json=body)
+                if resp.content_type != "application/json":
+                    return resp.status, await resp.text()
+                return resp.status, await resp.json()
+            return await asyncio.gather(*(one(path, body) for path, body in requests))
+    return asyncio.run(go())
+
+
+@pytest.mark.parametrize("filters", [{"finish": 5}, {"finish": {"$ne": "Flat"}}, ["finish"], {"finish": [["Flat"]]}])
+def test_malformed_filters_are_rejected(live, filters):
+    [(status, body), (fstatus, _)] = call(create_app(live), [
+        ("/search", {"query": "gray", "filters": filters}),
+        ("/facets", {"filters": filters}),
+    ])
+
+    assert status == 400 and "filter" in body["error"]
+    assert fstatus == 400
+
+
+def test_string_filter_value_is_one_value(live):
+    [(status, as_str), (_, as_list)] = call(create_app(live), [
+        ("/search", {"query": "gray", "k": 10, "filters": {"finish": "Flat"}}),
+        ("/search", {"query": "gray", "k": 10, "filters": {"finish": ["Flat"]}}),
+    ])
+
+    assert status == 200
+    assert as_str["results"] and all(r["finish"] == "Flat" for r in as_str["results"])
+    assert as_str["results"] == as_list["results"]
+
+
+def test_failing_filter_group_fails_only_its_requests(live, monkeypatch):
+    searcher = live.current.searcher
+    search = searcher.search
+
+    def flaky(queries, k, filters=None, **kwargs):
+        if filters and filters.get("finish") == ["Gloss"]:
+            raise RuntimeError("boom")
+        return search(queries, k, filters, **kwargs)
+
+    monkeypatch.setattr(searcher, "search", flaky)
+    # A wide window so all three land in one batch.
+    responses = call(create_app(live, window_ms=200), [
+        ("/search", {"query": "gray", "k": 5}),
+        ("/search", {"query": "blue", "k": 5, "filters": {"finish": ["Gloss"]}}),
+        ("/search", {"query": "green", "k": 5, "filters": {"finish": ["Satin"]}}),
+    ])
+
+    assert [status for status, _ in responses] == [200, 500, 200]
+    assert len(responses[0][1]["results"]) == 5
+    assert all(r["finish"] == "Satin" for r in responses[2][1]["results"])
+
+
+def test_batch_embeds_once_across_filter_groups(live):
+    calls = []
+    embed = lambda texts: calls.append(list(texts)) or get_backend(live.current.embed_model).embed(texts)
+
+    responses = call(create_app(live, embed_fn=embed, window_ms=200), [
+        ("/search", {"query": "weathered cedar", "k": 5}),
+        ("/search", {"query": "stormy blue", "k": 5, "filters": {"finish": ["Gloss"]}}),
+        ("/search", {"query": "SKU-12", "k": 5, "filters": {"finish": ["Satin"]}}),
+    ])
+
+    assert [status for status, _ in responses] == [200, 200, 200]
+    assert [sorted(c) for c in calls] == [["stormy blue", "weathered cedar"]]
@@ -0,0 +1,46 @@
+"""
+Sharded indexes return the same rows as one index over all rows, including
+with shard boundaries that don't fall on a byte of the filter bitmap.
+"""
+import numpy as np
+import pytest
+
+import build_index
+from conftest import material_doc, offline_config
+from embeddings.backends import get_backend
+from index_store import load_searcher
+
+QUERIES = ["gray flat siding paint", "white roofing shake", "durable blue coat", "SKU-42", "beige satin guard"]
+FILTERS = [None, {"finish": ["Flat"]}, {"material_category_name": ["Roofing"], "segment_types": ["WL", "RF"]}]
+
+
+def build(tmp_path_factory, name, **config):
+    base = str(tmp_path_factory.mktemp(name))
+    build_index.full_build(offline_config(**config), docs=[material_doc(i) for i in range(1000)], base_dir=base)
+    searcher, store, _ = load_searcher(base)
+    return searcher
+
+
+@pytest.fixture(scope="module", params=[{"INDEX_SPEC": "Flat"}, {"INDEX_SPEC": "SQ8", "RESCORE": 4}],
+                ids=["flat", "sq8-rescore"])
+def pair(request, tmp_path_factory):
+    whole = build(tmp_path_factory, "whole", **request.param)
+    # 301 rows per shard: every boundary after the first is mid-byte.
+    sharded = build(tmp_path_factory, "sharded", SHARD_SIZE=301, **request.param)
+    assert len(sharded.bases) == 4
+    yield whole, sharded
+    whole.close()
+    sharded.close()
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_sharded_rows_match_unsharded(pair, filters):
+    whole, sharded = pair
+    q_vecs = get_backend("hashing:char3-5-64").embed(QUERIES)
+
+    D, I = whole.search(q_vecs, 25, filters)
+    D2, I2 = sharded.search(q_vecs, 25, filters)
+
+    assert (I >= 0).any()
+    np.testing.assert_array_equal(I2, I)
+    np.testing.assert_allclose(D2, D, rtol=1e-5)
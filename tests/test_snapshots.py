@@ -0,0 +1,97 @@
+"""
+Snapshot publishing, verification and LiveIndex hot swaps.
+"""
+import os
+
+import pytest
+
+import build_index
+from conftest import material_doc, offline_config
+from embeddings.backends import get_backend
+from index_store import SNAPSHOTS_DIR, current_snapshot, read_manifest, verify_snapshot
+from live_index import LiveIndex, open_snapshot
+
+
+def build(base, n=200, title=None):
+    docs = [material_doc(i) for i in range(n)]
+    if title:
+        docs[0]["title"] = title
+    build_index.full_build(offline_config(), docs=docs, base_dir=base)
+    return current_snapshot(base)
+
+
+def corrupt(snapshot, same_size=False):
+    path = os.path.join(snapshot, "materials_metadata", "title.data")
+    with open(path, "r+b") as f:
+        if same_size:
+            byte = f.read(1)
+            f.seek(0)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        else:
+            f.truncate(os.path.getsize(path) - 1)
+
+
+def test_publish_moves_current_and_keeps_recent_snapshots(tmp_path):
+    base = str(tmp_path)
+    paths, versions = [], []
+    for _ in range(4):
+        paths.append(build(base))
+        versions.append(read_manifest(paths[-1])["version"])
+
+    assert versions == [1, 2, 3, 4]
+    assert current_snapshot(base) == paths[-1]
+    # Three snapshots are kept and no staging directories are left behind.
+    assert sorted(os.listdir(os.path.join(base, SNAPSHOTS_DIR))) == ["v000002", "v000003", "v000004"]
+    assert verify_snapshot(paths[-1], deep=True) == []
+
+
+def test_verify_finds_damaged_files(tmp_path):
+    snapshot = build(str(tmp_path))
+
+    corrupt(snapshot, same_size=True)
+    assert verify_snapshot(snapshot) == []
+    assert verify_snapshot(snapshot, deep=True) == ["materials_metadata/title.data: checksum mismatch"]
+
+    corrupt(snapshot)
+    assert verify_snapshot(snapshot)[0].startswith("materials_metadata/title.data: ")
+
+
+def test_reader_keeps_its_snapshot_after_it_is_deleted(tmp_path):
+    base = str(tmp_path)
+    old = open_snapshot(build(base, title="Old Title"))
+    embed = lambda texts: get_backend(old.embed_model).embed(texts)
+
+    def first_title():
+        _, rows = old.searcher.search(["title old"], 3, embed_fn=embed)
+        return old.store.records(rows[0][:1], ["title"])
+
+    assert first_title() == [{"title": "Old Title"}]
+    for _ in range(3):
+        build(base)
+
+    assert not os.path.exists(old.path)
+    # Files the reader has open or mapped stay readable until it lets go of them.
+    assert first_title() == [{"title": "Old Title"}]
+    old.searcher.close()
+
+
+def test_live_index_swaps_and_skips_damaged_builds(tmp_path):
+    base = str(tmp_path)
+    build(base)
+    live = LiveIndex(base, interval=0)
+    seen = []
+    live.listeners.append(lambda snapshot: seen.append(snapshot.version))
+    first = live.current
+
+    assert not live.refresh()
+
+    damaged = build(base, title="Damaged")
+    corrupt(damaged)
+    assert not live.refresh() and not live.refresh()
+    assert live.current is first
+
+    build(base, n=250)
+    assert live.refresh()
+    assert (live.current.version, live.current.searcher.ntotal, live.swaps, seen) == (3, 250, 1, [3])
+    first.searcher.close()
+    live.current.searcher.close()
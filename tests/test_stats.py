@@ -0,0 +1,29 @@
+"""
+stats.compute_material_stats against mongomock.
+"""
+from stats import compute_material_stats
+
+
+def test_counts_totals_and_breakdowns_in_one_pass(db):
+    db.materials.update_many({"_id": {"$in": ["m001", "m002", "m003"]}}, {"$set": {"extracted": True}})
+
+    stats = compute_material_stats(db.materials)
+
+    assert (stats["total"], stats["transferred"], stats["pending"]) == (25, 3, 22)
+    # Odd materials are category 1 / brand 10, even ones category 2 / brand 11.
+    assert stats["by_category"] == {
+        "1": {"total": 12, "transferred": 2, "pending": 10},
+        "2": {"total": 13, "transferred": 1, "pending": 12},
+    }
+    assert stats["by_brand"] == {
+        "10": {"total": 12, "transferred": 2, "pending": 10},
+        "11": {"total": 13, "transferred": 1, "pending": 12},
+    }
+
+
+def test_empty_collection(db):
+    db.materials.delete_many({})
+
+    stats = compute_material_stats(db.materials)
+
+    assert stats == {"total": 0, "transferred": 0, "pending": 0, "by_category": {}, "by_brand": {}}
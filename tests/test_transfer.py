@@ -0,0 +1,101 @@
+"""
+transfer jobs against mongomock: staging, resuming and duplicate-key idempotency.
+"""
+import pytest
+
+import transfer
+from extractor_db import ReferenceMaps, build_preview_query, preview_row
+from transfer import CHUNKS_COL, JOBS_COL, apply_chunk, create_job, get_job, resumable_jobs, run_job
+
+
+@pytest.fixture
+def rows(db):
+    refs = ReferenceMaps(db)
+    rows = [preview_row(mat, refs) for mat in db.materials.find(build_preview_query(refs)).sort("_id", 1)]
+    rows[0]["transfer"] = False
+    return rows
+
+
+def test_job_transfers_every_ticked_row(db, rows):
+    job_id = create_job(db, rows, chunk_size=10)
+    job = get_job(db, job_id)
+    assert (job["status"], job["total"], job["skipped"], job["chunks"]) == ("pending", 24, 1, 3)
+    assert db.materials_new.count_documents({}) == 0
+
+    job = run_job(db, job_id)
+
+    assert (job["status"], job["done"], job["inserted"], job["existing"]) == ("done", 24, 24, 0)
+    assert db.materials_new.count_documents({}) == 24
+    assert db.materials.count_documents({"extracted": True}) == 24
+    assert db.materials.find_one({"_id": "m000"}).get("extracted") is None
+    doc = db.materials_new.find_one({"_id": "m001"})
+    assert (doc["title"], doc["material_brand_name"], doc["segment_types"]) == ("Material 1", "Behr", ["WL"])
+    assert db[CHUNKS_COL].count_documents({}) == 0
+    with pytest.raises(RuntimeError):
+        run_job(db, job_id)
+
+
+def test_failed_job_resumes_from_the_first_unfinished_chunk(db, rows, monkeypatch):
+    job_id = create_job(db, rows, chunk_size=5)
+    calls = []
+
+    def flaky(db, docs):
+        calls.append(docs[0]["_id"])
+        if len(calls) == 3:
+            raise ConnectionError("network down")
+        return apply_chunk(db, docs)
+
+    monkeypatch.setattr(transfer, "apply_chunk", flaky)
+    with pytest.raises(ConnectionError):
+        run_job(db, job_id)
+    job = get_job(db, job_id)
+    assert (job["status"], job["done"]) == ("failed", 10)
+    assert [j["_id"] for j in resumable_jobs(db)] == [job_id]
+
+    job = run_job(db, job_id)
+    assert (job["status"], job["done"], job["inserted"]) == ("done", 24, 24)
+    # Only the unfinished chunks were run again.
+    assert calls == ["m001", "m006", "m011", "m011", "m016", "m021"]
+    assert resumable_jobs(db) == []
+
+    # A second resume finds nothing left to do.
+    with pytest.raises(RuntimeError):
+        run_job(db, job_id)
+    assert db.materials_new.count_documents({}) == 24
+
+
+def test_rows_already_transferred_are_not_duplicated(db, rows):
+    docs = [transfer.transfer_doc(r) for r in rows[1:6]]
+    assert apply_chunk(db, docs[:2]) == 2
+    assert apply_chunk(db, docs) == 3
+    assert apply_chunk(db, docs) == 0
+
+    job = run_job(db, create_job(db, rows, chunk_size=10))
+
+    assert (job["inserted"], job["existing"]) == (19, 5)
+    assert db.materials_new.count_documents({}) == 24
+
+
+def test_running_job_is_not_resumable(db, rows):
+    job_id = create_job(db, rows)
+    db[JOBS_COL].update_one({"_id": job_id}, {"$set": {"lease_until": 2e9}})
+
+    assert resumable_jobs(db) == []
+    with pytest.raises(RuntimeError):
+        run_job(db, job_id)
+
+
+def test_rows_are_staged_one_document_each(db, rows):
+    for row in rows:
+        row["description"] = "x" * 100_000
+    job_id = create_job(db, rows, chunk_size=10)
+
+    staged = list(db[CHUNKS_COL].find({"job": job_id}))
+    # 24 rows of 100 kB would be one 2.4 MB document per chunk; per-row documents stay small.
+    assert len(staged) == 24
+    assert sorted({s["seq"] for s in staged}) == [0, 1, 2]
+    assert [len([s for s in staged if s["seq"] == seq]) for seq in range(3)] == [10, 10, 4]
+
+    job = run_job(db, job_id)
+    assert (job["done"], job["inserted"]) == (24, 24)
+    assert len(db.materials_new.find_one({"_id": "m001"})["description"]) == 100_000
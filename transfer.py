@@ -0,0 +1,257 @@
+"""
+Bulk, resumable transfer of reviewed materials into materials_new.
+
+    job_id = create_job(db, rows)            # stages the documents, returns at once
+    worker = TransferWorker(db, job_id).start()
+    worker.progress()                        # {"done": ..., "total": ..., "rate": ...}
+
+Rows are staged one document each in transfer_chunks, tagged with their
+chunk number, so staging never approaches Mongo's 16 MB document limit
+however long the descriptions are.
+
+Each materials_new document takes the _id of the material it came from, so
+re-running a chunk can't create duplicates: the unordered insert_many simply
+reports those ids as already present. A chunk is one insert_many plus one
+update_many for the `extracted` flags, and is recorded in the job document
+(one atomic update that also bumps the counters) once both have gone through.
+A job whose worker died is picked up again from the first chunk not recorded;
+the lease keeps two workers from running the same job at once.
+"""
+import os
+import time
+import itertools
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from metrics import span, inc
+
+load_dotenv()
+
+TRANSFER_CHUNK_SIZE = int(os.getenv("TRANSFER_CHUNK_SIZE", "1000"))
+TRANSFER_LEASE_SECONDS = float(os.getenv("TRANSFER_LEASE_SECONDS", "60"))
+DUPLICATE_KEY = 11000
+
+JOBS_COL = "transfer_jobs"
+CHUNKS_COL = "transfer_chunks"
+
+
+def _now() -> str:
+    # Same naive-UTC ISO format the audit fields have always used.
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def transfer_doc(row: Dict, now: Optional[str] = None) -> Dict:
+    """
+    materials_new document for one review-table row.
+    """
+    now = now or _now()
+    return {
+        "_id": row["original_id"],
+        "title": row["title"],
+        "slug": row["slug"],
+        "material_category_name": row["material_category_name"],
+        "material_brand_name": row["material_brand_name"],
+        "material_style_name": row["material_style_name"],
+        "sku": "AUTO-GEN",
+        "color": {
+            "hex": row.get("color_hex", "#FFFFFF"),
+            "rgb": [255, 255, 255],
+            "lab": [100, 0, 0],
+            "lrv": 85,
+            "family_id": 1,
+            "family_name": "White",
+            "primary_undertone": "Neutral",
+            "secondary_undertone": "Neutral",
+            "warmth_score": 0
+        },
+        "finish": row["finish"],
+        "description": row["description"],
+        "segment_types": list(row["segment_types"]),
+        "tags": list(row["tags"]),
+        "profile_strength": row["profile_strength"],
+        "audit": {
+            "created_at": now,
+            "updated_at": now
+        }
+    }
+
+
+def create_job(db, rows: Iterable[Dict], chunk_size: int = TRANSFER_CHUNK_SIZE) -> ObjectId:
+    """
+    Stages the document for every row ticked for transfer, one staged document
+    per row, and records the job. Nothing is written to materials_new yet.
+    """
+    now = _now()
+    docs, skipped = [], 0
+    for row in rows:
+        if not row.get("transfer", True):
+            skipped += 1
+            continue
+        docs.append(transfer_doc(row, now))
+
+    job_id = ObjectId()
+    staged = [{"job": job_id, "seq": i // chunk_size, "doc": doc} for i, doc in enumerate(docs)]
+    chunks = -(-len(docs) // chunk_size)
+    with span("transfer.stage"):
+        if staged:
+            db[CHUNKS_COL].create_index([("job", 1), ("seq", 1)])
+            db[CHUNKS_COL].insert_many(staged)
+        db[JOBS_COL].insert_one({
+            "_id": job_id,
+            "status": "pending",
+            "total": len(docs),
+            "skipped": skipped,
+            "chunks": chunks,
+            "done_chunks": [],
+            "done": 0,
+            "inserted": 0,
+            "existing": 0,
+            "lease_until": 0.0,
+            "created_at": now,
+            "updated_at": now,
+        })
+    return job_id
+
+
+def get_job(db, job_id) -> Optional[Dict]:
+    return db[JOBS_COL].find_one({"_id": job_id}, {"done_chunks": 0})
+
+
+def resumable_jobs(db) -> List[Dict]:
+    """
+    Unfinished jobs that no worker currently holds, oldest first.
+    """
+    q = {"status": {"$ne": "done"}, "lease_until": {"$lt": time.time()}}
+    return list(db[JOBS_COL].find(q, {"done_chunks": 0}).sort("_id", 1))
+
+
+def apply_chunk(db, docs: List[Dict]) -> int:
+    """
+    Writes one chunk and flags its source materials; returns how many
+    documents were new. Safe to repeat.
+    """
+    try:
+        inserted = len(db.materials_new.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        if any(err["code"] != DUPLICATE_KEY for err in e.details["writeErrors"]):
+            raise
+        inserted = e.details["nInserted"]
+    db.materials.update_many({"_id": {"$in": [d["_id"] for d in docs]}}, {"$set": {"extracted": True}})
+    return inserted
+
+
+def run_job(db, job_id, on_progress: Optional[Callable[[Dict], None]] = None,
+            lease: float = TRANSFER_LEASE_SECONDS) -> Dict:
+    """
+    Runs (or resumes) a job to completion and returns the final job document.
+    Raises RuntimeError if the job is finished or another worker holds it.
+    """
+    jobs = db[JOBS_COL]
+    job = jobs.find_one_and_update(
+        {"_id": job_id, "status": {"$ne": "done"}, "lease_until": {"$lt": time.time()}},
+        {"$set": {"status": "running", "lease_until": time.time() + lease, "updated_at": _now()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is None:
+        raise RuntimeError(f"Transfer job {job_id} is finished or already running")
+
+    print(f"▶️  Transfer {job_id}: {job['done']}/{job['total']} already done, {job['chunks']} chunks.")
+    try:
+        pending = (db[CHUNKS_COL].find({"job": job_id, "seq": {"$nin": job["done_chunks"]}})
+                   .sort([("seq", 1), ("_id", 1)]))
+        for seq, staged in itertools.groupby(pending, key=lambda s: s["seq"]):
+            docs = [s["doc"] for s in staged]
+            with span("transfer.chunk"):
+                inserted = apply_chunk(db, docs)
+            n = len(docs)
+            updated = jobs.find_one_and_update(
+                {"_id": job_id, "done_chunks": {"$ne": seq}},
+                {"$addToSet": {"done_chunks": seq},
+                 "$inc": {"done": n, "inserted": inserted, "existing": n - inserted},
+                 "$set": {"lease_until": time.time() + lease, "updated_at": _now()}},
+                projection={"done_chunks": 0},
+                return_document=ReturnDocument.AFTER,
+            )
+            inc("transfer_docs", inserted, result="inserted")
+            inc("transfer_docs", n - inserted, result="existing")
+            if updated is not None:
+                job = updated
+                if on_progress:
+                    on_progress(job)
+    except Exception as e:
+        jobs.update_one({"_id": job_id}, {"$set": {"status": "failed", "error": f"{e.__class__.__name__}: {e}",
+                                                   "lease_until": 0.0, "updated_at": _now()}})
+        inc("transfer_errors")
+        raise
+
+    job = jobs.find_one_and_update(
+        {"_id": job_id},
+        {"$set": {"status": "done", "lease_until": 0.0, "updated_at": _now()}, "$unset": {"error": ""}},
+        projection={"done_chunks": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    db[CHUNKS_COL].delete_many({"job": job_id})
+    print(f"✅  Transfer {job_id}: {job['inserted']} inserted, {job['existing']} already present, "
+          f"{job['skipped']} skipped.")
+    return job
+
+
+class TransferWorker:
+    """
+    Runs one job on a daemon thread and keeps its latest progress in memory,
+    so the UI can poll it without querying Mongo.
+    """
+
+    def __init__(self, db, job_id, lease: float = TRANSFER_LEASE_SECONDS):
+        self.db = db
+        self.job_id = job_id
+        self.lease = lease
+        self.job: Optional[Dict] = get_job(db, job_id)
+        self.error: Optional[str] = None
+        self._started = 0.0
+        self._start_done = 0
+        self._thread = threading.Thread(target=self._run, name=f"transfer-{job_id}", daemon=True)
+
+    def _update(self, job: Dict):
+        self.job = job
+
+    def _run(self):
+        try:
+            self.job = run_job(self.db, self.job_id, on_progress=self._update, lease=self.lease)
+        except Exception as e:
+            self.error = f"{e.__class__.__name__}: {e}"
+            self.job = get_job(self.db, self.job_id)
+
+    def start(self) -> "TransferWorker":
+        self._started = time.monotonic()
+        self._start_done = (self.job or {}).get("done", 0)
+        self._thread.start()
+        return self
+
+    def is_alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def join(self, timeout: Optional[float] = None):
+        self._thread.join(timeout)
+
+    def progress(self) -> Dict:
+        """
+        done / total / fraction, plus documents per second for this run.
+        """
+        job = self.job or {}
+        done, total = job.get("done", 0), job.get("total", 0)
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        return {
+            "status": job.get("status", "pending"),
+            "done": done,
+            "total": total,
+            "fraction": done / total if total else 1.0,
+            "rate": (done - self._start_done) / elapsed if elapsed > 0 else 0.0,
+            "error": self.error,
+        }
@@ -42,6 +42,7 @@ def generate_hint(row):
     if is_dummy_color(row.get("color_hex")): hints.append("Default Color")
     if is_dummy_tags(row.get("tags", [])): hints.append("Generic Tags")
     if row.get("profile_strength", 100) < 60: hints.append("Low Strength")
+    if row.get("duplicate_cluster"): hints.append("Possible Duplicate")
     return ", ".join(hints)
 
 ## ---- Dummy Checkup End ====